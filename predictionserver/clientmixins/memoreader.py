@@ -1,12 +1,15 @@
 from predictionserver.clientmixins.basereader import BaseReader
 from predictionserver.futureconventions.keyconventions import KeyConventions
+from predictionserver.futureconventions.settlementconventions import (
+    SettlementConventions
+)
 from predictionserver.futureconventions.memoconventions import (
     MemoConventions, MemoCategory
 )
 from typing import Union
 
 
-class MemoReader(BaseReader, MemoConventions, KeyConventions):
+class MemoReader(BaseReader, MemoConventions, KeyConventions, SettlementConventions):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -72,7 +75,12 @@ class MemoReader(BaseReader, MemoConventions, KeyConventions):
 
     def get_transactions(self, write_key=None):
         write_key = write_key or self.own_write_key()
-        return self.get_memos(category=MemoCategory.transaction, write_key=write_key)
+        transactions = self.get_memos(
+            category=MemoCategory.transaction, write_key=write_key
+        )
+        return [
+            self.expand_transaction(t) if isinstance(t, dict) else t for t in transactions
+        ]
 
 
 if __name__ == '__main__':
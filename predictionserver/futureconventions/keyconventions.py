@@ -2,8 +2,16 @@ import muid
 import time
 from muid.mining import mine_once
 from predictionserver.futureconventions.activityconventions import Activity
+from collections import OrderedDict
+from functools import lru_cache
 import logging
 
+# Hashing and validating a key are slow, and the same few thousand keys recur, so
+# results are cached for the life of the process. Every entry is a pure function of its
+# argument, so the caches never go stale. (Spirit animals are cached by the server, see
+# BaseServer.animal_cache.)
+KEY_CACHE_SIZE = 100000
+
 
 class KeyConventions:
 
@@ -24,7 +32,39 @@ class KeyConventions:
     @staticmethod
     def is_valid_key(write_key):
         """ Check if key is hash-memorable """
-        return isinstance(write_key, str) and muid.validate(write_key)
+        return isinstance(write_key, str) and KeyConventions._validate(write_key)
+
+    @staticmethod
+    @lru_cache(maxsize=KEY_CACHE_SIZE)
+    def _validate(write_key):
+        return muid.validate(write_key)
+
+    @staticmethod
+    def key_cache_stats():
+        """ Hits and misses for the caches behind shash, is_valid_key etc """
+        stats = OrderedDict()
+        for name, method in KeyConventions._key_caches().items():
+            info = method.cache_info()
+            lookups = info.hits + info.misses
+            stats[name] = OrderedDict([
+                ('size', info.currsize),
+                ('hits', info.hits),
+                ('misses', info.misses),
+                ('hit_rate', info.hits / lookups if lookups else 0.)
+            ])
+        return stats
+
+    @staticmethod
+    def clear_key_caches():
+        for method in KeyConventions._key_caches().values():
+            method.cache_clear()
+
+    @staticmethod
+    def _key_caches():
+        return OrderedDict([
+            ('shash', KeyConventions.shash),
+            ('is_valid_key', KeyConventions._validate)
+        ])
 
     # ------------------------------------------------------------------------------- #
     #   Creating keys, interpreting keys  (public and private identities)             #
@@ -57,10 +97,11 @@ class KeyConventions:
         """
         A measure of key rarity, the difficulty is the length of the memorable part
         """
-        nml = muid.animal(write_key)
+        nml = KeyConventions.animal_from_key(write_key)
         return 0 if nml is None else len(nml.replace(' ', ''))
 
     @staticmethod
+    @lru_cache(maxsize=KEY_CACHE_SIZE)
     def shash(write_key):
         """ Uses SHA-256 hash to create public identity from private key"""
         # Expects a string not binary
@@ -1,16 +1,81 @@
 from predictionserver.futureconventions.sepconventions import SepConventions
+from predictionserver.futureconventions.typeconventions import StrEnum
+from typing import Union
+import struct
+import numpy as np
+
+
+class RollupResolution(StrEnum):
+    """ Widths of the buckets that values are rolled up into, in seconds """
+    minute = 60
+    hour = 3600
+    day = 86400
 
 
 class LaggedConventions:
 
+    # Packed lags are little endian float64 (time, value) records, oldest first
+    LAGGED_RECORD = struct.Struct('<dd')
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.LAGGED = "lagged" + SepConventions.sep()
         self.LAGGED_VALUES = "lagged_values" + SepConventions.sep()
         self.LAGGED_TIMES = "lagged_times" + SepConventions.sep()
+        self.LAGGED_PACKED = "lagged_packed" + SepConventions.sep()
+        self.ROLLUP = "rollup" + SepConventions.sep()
+        self.SKETCH = "sketch" + SepConventions.sep()
 
     def lagged_values_name(self, name):
         return self.LAGGED_VALUES + name
 
     def lagged_times_name(self, name):
         return self.LAGGED_TIMES + name
+
+    def lagged_packed_name(self, name):
+        return self.LAGGED_PACKED + name
+
+    def rollup_name(self, name, resolution: Union[RollupResolution, str]):
+        resolution = RollupResolution[str(resolution)]
+        return self.ROLLUP + str(resolution) + SepConventions.sep() + name
+
+    def sketch_name(self, name, generation=0):
+        """ Generation 0 is the sketch being added to, 1 the one before """
+        return self.SKETCH + str(generation) + SepConventions.sep() + name
+
+    @classmethod
+    def pack_lag(cls, t, value):
+        return cls.LAGGED_RECORD.pack(float(t), float(value))
+
+    @classmethod
+    def lagged_packed_range(cls, start, end):
+        """ Byte offsets of lags start..end (0 is the most recent) for GETRANGE """
+        size = cls.LAGGED_RECORD.size
+        return -size * (end + 1), -size * start - 1
+
+    @classmethod
+    def unpack_lags(cls, raw):
+        """ times, values  as read-only float64 views of raw, most recent first """
+        num = len(raw or b'') // cls.LAGGED_RECORD.size
+        records = np.frombuffer(raw or b'', dtype='<f8', count=2 * num).reshape(num, 2)
+        return records[::-1, 0], records[::-1, 1]
+
+    @staticmethod
+    def merge_lags(times, values, raw_times, raw_values):
+        """ Packed lags and those in the lists as one history, most recent first
+              times, values           from unpack_lags()
+              raw_times, raw_values   strings from the lists
+            :returns  times, values   as lists, with floats from the packed lags
+        """
+        def as_time(raw_time):
+            try:
+                return float(raw_time)
+            except (ValueError, TypeError):
+                return float('-inf')
+
+        lags = sorted(
+            list(zip(times.tolist(), values.tolist())) +
+            [(as_time(t), v) for t, v in zip(raw_times, raw_values)],
+            key=lambda lag: -lag[0]
+        )
+        return [t for t, _ in lags], [v for _, v in lags]
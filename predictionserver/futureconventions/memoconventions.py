@@ -6,10 +6,12 @@ from predictionserver.futureconventions.metricconventions import MetricType
 from predictionserver.futureconventions.hashconventions import HashType
 from predictionserver.futureconventions.activityconventions import Activity, ActivityContext
 from predictionserver.futureconventions.sortedsetconventions import SortedSetType
-from collections import OrderedDict
+from collections.abc import MutableMapping
+from enum import Enum
+from functools import lru_cache
 import datetime
+import json
 import time
-from copy import deepcopy
 import uuid
 
 
@@ -36,20 +38,33 @@ class MemoGranularity(GranularityEnum):
     name_and_delay = 3   # e.g. Transactions for a stream
 
 
-class Memo(OrderedDict):
-    _ENUM_FIELDS = [
+class Memo(MutableMapping):
+    """ A fixed set of fields, read and written like a dict
+          Fields cannot be added, and once set cannot change type
+    """
+    _FIELDS = (
+        'memo_id', 'activity', 'public_actor', 'private_actor', 'context', 'attribute',
+        'metric', 'hash_type', 'sortedset_type', 'granularity', 'genus', 'memory',
+        'epoch_time', 'timestr', 'write_key', 'counterparty', 'counterparty_code',
+        'name', 'value', 'delay', 'success', 'code', 'execution', 'url', 'text', 'index',
+        'count', 'allowed', 'message', 'host', 'data', 'low', 'high', 'near', 'avg_near'
+    )
+    __slots__ = _FIELDS
+    _FIELD_SET = frozenset(_FIELDS)
+    _ENUM_FIELDS = frozenset([
         'activity',
         'public_actor',
         'private_actor',
         'context',
         'attribute',
+        'metric',
         'category',
         'granularity',
         'genus',
         'hash_type',
         'sortedset_type',
         'memory',
-    ]
+    ])
     _SANITIZE_FIELDS = {'write_key': 'code', 'counterparty': 'counterparty_code'}
 
     def __init__(
@@ -90,57 +105,125 @@ class Memo(OrderedDict):
             host: str = None,
             data: dict = None
     ):
-        self._initialized = False
-        super().__init__(
-            memo_id=memo_id, activity=activity, public_actor=public_actor,
-            private_actor=private_actor, context=context, attribute=attribute,
-            metric=metric, hash_type=hash_type, sortedset_type=sortedset_type,
-            granularity=granularity, genus=genus, memory=memory, epoch=epoch_time,
-            timestr=timestr, write_key=write_key, counterparty=counterparty_write_key,
-            counterparty_code=counterparty_code, name=name, value=value, delay=delay,
-            success=success, code=code, execution=execution, url=url, text=text,
-            index=index, count=count, allowed=allowed, message=message, host=host,
-            data=data, low=low, high=high, near=near, avg_near=avg_near,
-        )
-        if self.get('epoch_time') is None:
-            self['epoch_time'] = time.time()
-        if self.get('timestr') is None:
-            self['timestr'] = str(datetime.datetime.now())
-        if self.get('memo_id') is None:
-            self['memo_id'] = str(uuid.uuid4())
-        self._initialized = True
+        self.memo_id = str(uuid.uuid4()) if memo_id is None else memo_id
+        self.activity = activity
+        self.public_actor = public_actor
+        self.private_actor = private_actor
+        self.context = context
+        self.attribute = attribute
+        self.metric = metric
+        self.hash_type = hash_type
+        self.sortedset_type = sortedset_type
+        self.granularity = granularity
+        self.genus = genus
+        self.memory = memory
+        self.epoch_time = time.time() if epoch_time is None else epoch_time
+        self.timestr = str(datetime.datetime.now()) if timestr is None else timestr
+        self.write_key = write_key
+        self.counterparty = counterparty_write_key
+        self.counterparty_code = counterparty_code
+        self.name = name
+        self.value = value
+        self.delay = delay
+        self.success = success
+        self.code = code
+        self.execution = execution
+        self.url = url
+        self.text = text
+        self.index = index
+        self.count = count
+        self.allowed = allowed
+        self.message = message
+        self.host = host
+        self.data = data
+        self.low = low
+        self.high = high
+        self.near = near
+        self.avg_near = avg_near
+
+    def __getitem__(self, key):
+        if key not in self._FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
 
     def __setitem__(self, key, value):
-        if self._initialized:
-            if key not in self.keys():
-                raise Exception(key + ' is not a valid memo field')
-            else:
-                existing_value = self[key]
-                if existing_value is None or type(value) == type(existing_value):
-                    super().__setitem__(key, value)
-                else:
-                    raise Exception(
-                        key + ' is supposed to be type ' + str(type(existing_value))
-                    )
+        if key not in self._FIELD_SET:
+            raise Exception(key + ' is not a valid memo field')
+        existing_value = getattr(self, key)
+        if existing_value is None or type(value) is type(existing_value):
+            setattr(self, key, value)
         else:
-            super().__setitem__(key, value)
+            raise Exception(key + ' is supposed to be type ' + str(type(existing_value)))
+
+    def __delitem__(self, key):
+        # Fields can be cleared, but not removed
+        if key not in self._FIELD_SET:
+            raise KeyError(key)
+        setattr(self, key, None)
+
+    def __iter__(self):
+        return iter(self._FIELDS)
+
+    def __len__(self):
+        return len(self._FIELDS)
+
+    def __repr__(self):
+        return 'Memo(' + repr(self.as_dict(cast_to_str=False)) + ')'
 
     def as_dict(self, cast_to_str=True, leave_out_none=True, flatten_data=True):
-        d = OrderedDict([
-            (k, v) for k, v in dict(self).items() if v is not None
-        ]) if leave_out_none else OrderedDict(self)
-        if cast_to_str:
-            for k in self._ENUM_FIELDS:
-                if k in d:
-                    d[k] = str(d[k])
-        if flatten_data and d.get('data') is not None:
-            if isinstance(d.get('data'), dict):
-                data = deepcopy(d['data'])
-                del (d['data'])
-                d.update(data)
-                return d
+        d = dict()
+        for k in self._FIELDS:
+            v = getattr(self, k)
+            if v is None:
+                if not leave_out_none:
+                    d[k] = v
+            elif cast_to_str and k in self._ENUM_FIELDS:
+                d[k] = _enum_str(v) if isinstance(v, Enum) else str(v)
+            else:
+                d[k] = v
+        if flatten_data and isinstance(self.data, dict):
+            del d['data']
+            d.update(self.data)
         return d
 
+    def as_bytes(self, code_from_key=None):
+        """ Serialized log entry: as_dict(), with keys replaced by codes
+              code_from_key   Function mapping write_key to code (see _SANITIZE_FIELDS)
+        """
+        d = self.as_dict()
+        if code_from_key is not None:
+            for f1, f2 in self._SANITIZE_FIELDS.items():
+                if d.get(f1) is not None:
+                    d[f2] = code_from_key(d.pop(f1))
+        return _json_bytes_function()(d)
+
+
+def _enum_str(e):
+    """ str() of enum members, which is slow, computed once """
+    try:
+        return _ENUM_STRINGS[e]
+    except KeyError:
+        return _ENUM_STRINGS.setdefault(e, str(e))
+
+
+_ENUM_STRINGS = dict()
+
+
+@lru_cache()
+def _json_bytes_function():
+    """ Serializer for memos, which are written on almost every call """
+    try:
+        import orjson
+
+        def dumps(d):
+            try:
+                return orjson.dumps(d, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                return json.dumps(d).encode()
+        return dumps
+    except ImportError:
+        return lambda d: json.dumps(d).encode()
+
 
 class MemoConventions:
 
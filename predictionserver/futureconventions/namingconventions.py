@@ -26,6 +26,7 @@ class NamingConventions:
         self.BUDGETS = "budget" + SepConventions.sep()
         self.VOLUMES = "volumes" + SepConventions.sep()
         self.SUMMARY = "summary" + SepConventions.sep()
+        self.NOTIFICATIONS = "notifications" + SepConventions.sep()
 
     def history_name(self, name):
         return self.HISTORY + name
@@ -64,6 +65,10 @@ class NamingConventions:
     def messages_name(self, name):
         return self.MESSAGES + name
 
+    def notifications_channel(self, name):
+        """ Pub/sub channel announcing changes to a value or mailbox """
+        return self.NOTIFICATIONS + name
+
     @staticmethod
     def is_plain_name(name: str):
         return NamingConventions.is_valid_name(name) and "~" not in name
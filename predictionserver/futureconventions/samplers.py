@@ -1,7 +1,8 @@
-import random
-import bisect
 import numpy as np
 
+# Samplers take an optional rng (np.random.Generator). Without one they draw from
+# numpy's global state, so np.random.seed() makes them reproducible.
+
 
 # --------------------------------------------------------------------------
 #          Recency bootstrappy things
@@ -9,43 +10,63 @@ import numpy as np
 # Easy to understand benchmarks. Feel free to contribute more.
 
 
-def exponential_bootstrap(lagged, decay, num, as_process=None):
+def exponential_bootstrap(lagged, decay, num, as_process=None, rng=None):
     as_process = as_process or is_process(lagged)
     return differenced_bootstrap(
         lagged=lagged,
         decay=decay,
-        num=num) if as_process else independent_bootstrap(
+        num=num,
+        rng=rng) if as_process else independent_bootstrap(
         lagged=lagged,
         decay=decay,
         num=num,
+        rng=rng
     )
 
 
-def independent_bootstrap(lagged, decay, num):
+def exponential_bootstrap_many(lagged, decay, num, size, as_process=None, rng=None):
+    """ Independent exponential bootstraps of the same lagged values, in one go
+          size     int          Number of samples, e.g. one per horizon
+           :returns  np.ndarray  shape (size, num)
+    """
+    as_process = as_process or is_process(lagged)
+    if as_process:
+        safe_diff_lagged = np.diff(list(lagged) + [0., 0.])
+        return lagged[0] + _jiggled_sample(
+            lagged=safe_diff_lagged, decay=decay, shape=(size, num), rng=rng
+        )
+    return _jiggled_sample(lagged=lagged, decay=decay, shape=(size, num), rng=rng)
+
+
+def independent_bootstrap(lagged, decay, num, rng=None):
     """ One parameter jiggled bootstrap favouring more recent observations
           lagged  [ float ]     List most recent observation first
           decay    float        Coefficient in exp(-a k) that weights samples
           num      int          Number of scenarios requested
+          rng      np.random.Generator, optional
            :returns  [ float ]  Statistical sample
     """
-    weights = list(np.exp([-decay * k for k in range(len(lagged))]))
-    empirical_sample = weighted_random_sample(
-        population=lagged, weights=weights, num=num
-    )
-    noise = np.random.randn(num)
-    return [x + decay * eps for x, eps in zip(empirical_sample, noise)]
+    return list(_jiggled_sample(lagged=lagged, decay=decay, shape=num, rng=rng))
 
 
-def differenced_bootstrap(lagged, decay, num):
+def differenced_bootstrap(lagged, decay, num, rng=None):
     """
     One parameter jiggled bootstrap favouring more recent observations
     (applied to differences processes)
     """
     safe_diff_lagged = np.diff(list(lagged) + [0., 0.])
-    diff_samples = independent_bootstrap(
-        lagged=safe_diff_lagged, decay=decay, num=num
+    diff_samples = _jiggled_sample(
+        lagged=safe_diff_lagged, decay=decay, shape=num, rng=rng
     )
-    return [lagged[0] + dx for dx in diff_samples]
+    return list(lagged[0] + diff_samples)
+
+
+def _jiggled_sample(lagged, decay, shape, rng=None):
+    rng = np.random if rng is None else rng
+    weights = np.exp(-decay * np.arange(len(lagged)))
+    ndx = _weighted_random_indexes(weights=weights, shape=shape, rng=rng)
+    empirical_sample = np.asarray(lagged, dtype=float)[ndx]
+    return empirical_sample + decay * rng.standard_normal(shape)
 
 
 # --------------------------------------------------------------------------
@@ -53,9 +74,9 @@ def differenced_bootstrap(lagged, decay, num):
 # --------------------------------------------------------------------------
 
 def sign_changes(lagged):
-    return np.nansum([
-        abs(d) > 1.5 for d in np.diff(np.sign(list(lagged) + [0., 0.]))
-    ])
+    return np.count_nonzero(
+        np.abs(np.diff(np.sign(list(lagged) + [0., 0.]))) > 1.5
+    )
 
 
 def is_process(lagged):
@@ -110,25 +131,33 @@ def _norminv_function():
 # --------------------------------------------------------------------------
 
 
-def weighted_random_sample(weights, num, population=None):
-    """ Weighted version of random.sample()  """
-    wrg = WeightedRandomGenerator(weights)
-    ndx = [wrg() for _ in range(num)]
-    return ndx if population is None else [population[k] for k in ndx]
+def weighted_random_sample(weights, num, population=None, rng=None):
+    """ Weighted version of random.sample(), with replacement
+          :returns  [int] indexes, or [members of population]
+    """
+    ndx = _weighted_random_indexes(weights=weights, shape=num, rng=rng)
+    return ndx.tolist() if population is None else [population[k] for k in ndx]
+
+
+def _weighted_random_indexes(weights, shape, rng=None):
+    """ np.ndarray of indexes drawn with probability proportional to weights """
+    rng = np.random if rng is None else rng
+    totals = np.cumsum(weights, dtype=float)
+    ndx = np.searchsorted(totals, rng.random(shape) * totals[-1], side='right')
+    return np.minimum(ndx, len(totals) - 1)
 
 
 class WeightedRandomGenerator(object):
-    def __init__(self, weights):
-        self.totals = []
-        running_total = 0
+    """ Draws indexes one at a time. Prefer weighted_random_sample() for many """
 
-        for w in weights:
-            running_total += w
-            self.totals.append(running_total)
+    def __init__(self, weights, rng=None):
+        self.totals = np.cumsum(weights, dtype=float)
+        self.rng = np.random if rng is None else rng
 
     def next(self):
-        rnd = random.random() * self.totals[-1]
-        return bisect.bisect_right(self.totals, rnd)
+        rnd = self.rng.random() * self.totals[-1]
+        return min(int(np.searchsorted(self.totals, rnd, side='right')),
+                   len(self.totals) - 1)
 
     def __call__(self):
         return self.next()
@@ -0,0 +1,188 @@
+import json
+import numpy as np
+from predictionserver.futureconventions.statsconventions import StatsConventions
+
+
+# Settlement is the process of comparing quarantined scenarios against a newly
+# arrived data point and paying those whose scenarios landed close to the truth.
+#
+# The rules here operate on whole batches at once. Every horizon being settled
+# is assigned a row index h, and scenario tickets, participants and winners are
+# represented as flat arrays carrying that row index alongside an integer owner
+# index. This lets a single mset() settle hundreds of horizons with a handful
+# of array operations rather than nested Python loops.
+
+
+class SettlementConventions:
+
+    # Fields of a settlement transaction record. A compact record holds their values,
+    # in this order, as a single JSON array.
+    TRANSACTION_FIELDS = (
+        'settlement_time', 'amount', 'budget', 'stream', 'delay', 'value', 'window',
+        'mass', 'density', 'average', 'reliable', 'submissions_count',
+        'submissions_close', 'stream_owner_code', 'recipient_code'
+    )
+    COMPACT_TRANSACTION = 'compact'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+    @classmethod
+    def compact_transaction(cls, record: dict):
+        """ Stream fields holding record as one JSON array (see TRANSACTION_FIELDS) """
+        return {cls.COMPACT_TRANSACTION: json.dumps(
+            [record[field] for field in cls.TRANSACTION_FIELDS], separators=(',', ':')
+        )}
+
+    @classmethod
+    def expand_transaction(cls, fields: dict):
+        """ Transaction record from stream fields, whether compact or not """
+        if cls.COMPACT_TRANSACTION not in fields:
+            return fields
+        values = json.loads(fields[cls.COMPACT_TRANSACTION])
+        return dict(zip(cls.TRANSACTION_FIELDS, values))
+
+    @staticmethod
+    def first_sufficient_window(counts, minimum: int):
+        """ Zoom out until a window holds enough tickets
+
+              counts    [[int]]  Number of tickets found, one row per horizon and one
+                                 column per window (narrowest first)
+              minimum   int      Number of tickets considered sufficient
+              :returns  [int]    Index of the first sufficient window, or the widest
+                                 window if none are sufficient
+        """
+        counts = np.atleast_2d(np.asarray(counts))
+        sufficient = counts >= minimum
+        return np.where(
+            sufficient.any(axis=1), sufficient.argmax(axis=1), counts.shape[1] - 1
+        )
+
+    @staticmethod
+    def segment_zmean_percentiles(
+            segments, owners, percentiles, num_segments: int, default=0.5
+    ):
+        """ Average the z-scores of percentiles within each segment
+
+              segments      [int]    Segment (horizon) each ticket belongs to
+              owners        [int]    Owner index of each ticket
+              percentiles   [float]  Percentile implied by each ticket
+              :returns      [float]  One community implied percentile per segment
+
+            Tickets with percentile at or above one are discarded (legacy submissions),
+            and only the last ticket seen for each owner within a segment is counted.
+        """
+        segments = np.asarray(segments, dtype=int)
+        owners = np.asarray(owners, dtype=int)
+        percentiles = np.asarray(percentiles, dtype=float)
+        keep = percentiles < 1
+        segments, owners, percentiles = segments[keep], owners[keep], percentiles[keep]
+
+        # Last ticket per (segment, owner) wins
+        pairs = segments * (int(owners.max()) + 1 if len(owners) else 1) + owners
+        _, reversed_first = np.unique(pairs[::-1], return_index=True)
+        last = len(pairs) - 1 - reversed_first
+        return StatsConventions.segment_zmean_percentile(
+            segments=segments[last],
+            ps=percentiles[last],
+            num_segments=num_segments,
+            default=default
+        )
+
+    @staticmethod
+    def game_payments(
+            pools,
+            participant_horizons,
+            participant_owners,
+            winner_horizons,
+            winner_owners,
+            carryover,
+            reserve: int,
+            num_predictions: int,
+            leakage_tolerance: float = 0.1
+    ):
+        """ Zero-sum payments for a batch of horizons
+
+              pools                  [int]    Number of scenarios in play, per horizon
+              participant_horizons   [int]    Horizon of each (unique) participant
+              participant_owners     [int]    Owner index of each participant
+              winner_horizons        [int]    Horizon of each rewarded ticket
+              winner_owners          [int]    Owner index of each rewarded ticket
+              carryover              [bool]   Whether a horizon with no winners pays the
+                                              reserve, per horizon
+              reserve                int      Owner index standing in for the reserve
+
+            Every participant pays one unit, and the pot is divided equally amongst
+            rewarded tickets. When nobody wins, participants occasionally pay into the
+            reserve instead. If a horizon does not sum to zero (owners out of sync with
+            the scenarios) everybody's payment is zeroed.
+
+              :returns  horizons, owners, amounts, leaked
+                        One aggregated payment per (horizon, owner), and a boolean mask
+                        of horizons that leaked
+        """
+        pools = np.asarray(pools, dtype=float)
+        num_horizons = len(pools)
+        participant_horizons = np.asarray(participant_horizons, dtype=int)
+        participant_owners = np.asarray(participant_owners, dtype=int)
+        winner_horizons = np.asarray(winner_horizons, dtype=int)
+        winner_owners = np.asarray(winner_owners, dtype=int)
+        carryover = np.asarray(carryover, dtype=bool)
+
+        num_winners = np.bincount(winner_horizons, minlength=num_horizons)
+        has_winners = num_winners > 0
+        in_play = has_winners | carryover
+        pot = pools / num_predictions
+        reward = np.divide(
+            pot, num_winners, out=np.zeros(num_horizons), where=has_winners
+        )
+
+        paying = in_play[participant_horizons]
+        carried = np.flatnonzero(carryover & ~has_winners)
+        horizons = np.concatenate([
+            participant_horizons[paying], winner_horizons, carried
+        ])
+        owners = np.concatenate([
+            participant_owners[paying],
+            winner_owners,
+            np.full(len(carried), reserve, dtype=int)
+        ])
+        amounts = np.concatenate([
+            -np.ones(int(paying.sum())), reward[winner_horizons], pot[carried]
+        ])
+
+        leaked = np.abs(
+            np.bincount(horizons, weights=amounts, minlength=num_horizons)
+        ) > leakage_tolerance
+        if leaked.any():
+            # Leaky horizons pay nothing, to participants only
+            sound = ~leaked[horizons]
+            zeroed = leaked[participant_horizons]
+            horizons = np.concatenate([horizons[sound], participant_horizons[zeroed]])
+            owners = np.concatenate([owners[sound], participant_owners[zeroed]])
+            amounts = np.concatenate([amounts[sound], np.zeros(int(zeroed.sum()))])
+
+        horizons, owners, amounts = SettlementConventions.aggregate(
+            horizons, owners, amounts
+        )
+        return horizons, owners, amounts, leaked
+
+    @staticmethod
+    def aggregate(rows, columns, amounts):
+        """ Sum amounts sharing the same (row, column), e.g. (horizon, owner)
+
+              :returns  rows, columns, totals     with one entry per distinct pair
+        """
+        rows = np.asarray(rows, dtype=int)
+        columns = np.asarray(columns, dtype=int)
+        if not len(rows):
+            return rows, columns, np.zeros(0)
+        width = int(columns.max()) + 1
+        pairs, inverse = np.unique(rows * width + columns, return_inverse=True)
+        totals = np.bincount(inverse.ravel(), weights=amounts, minlength=len(pairs))
+        return pairs // width, pairs % width, totals
+
+
+first_sufficient_window = SettlementConventions.first_sufficient_window
+segment_zmean_percentiles = SettlementConventions.segment_zmean_percentiles
+game_payments = SettlementConventions.game_payments
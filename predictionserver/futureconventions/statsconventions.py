@@ -1,10 +1,15 @@
 import numpy as np
 from tdigest import TDigest
 import math
+from functools import lru_cache
 
 
 class StatsConventions:
 
+    # Sketches bucket x by ceil(log|x| / log SKETCH_GAMMA), a relative error of 1%
+    SKETCH_GAMMA = 1.02
+    SKETCH_ZERO = 1e-9  # Smaller magnitudes share one bucket
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.num_predictions = 225
@@ -20,22 +25,26 @@ class StatsConventions:
         return f(p)
 
     @staticmethod
+    @lru_cache()
     def _norminv_function():
+        """ Inverse normal cdf accepting floats or arrays """
         try:
-            from statistics import NormalDist
-            return NormalDist(mu=0, sigma=1.0).inv_cdf
+            from scipy.special import ndtri
+            return ndtri
         except ImportError:
-            from scipy.stats import norm
-            return norm.ppf
+            from statistics import NormalDist
+            return np.vectorize(NormalDist(mu=0, sigma=1.0).inv_cdf, otypes=[float])
 
     @staticmethod
+    @lru_cache()
     def _normcdf_function():
+        """ Normal cdf accepting floats or arrays """
         try:
-            from statistics import NormalDist
-            return NormalDist(mu=0, sigma=1.0).cdf
+            from scipy.special import ndtr
+            return ndtr
         except ImportError:
-            from scipy.stats import norm
-            return norm.cdf
+            from statistics import NormalDist
+            return np.vectorize(NormalDist(mu=0, sigma=1.0).cdf, otypes=[float])
 
     @staticmethod
     def zmean_percentile(ps):
@@ -46,12 +55,33 @@ class StatsConventions:
         # TODO: Make more robust when there are 0's and 1's
 
         if len(ps):
-            zscores = [StatsConventions.norminv(p) for p in ps]
+            zscores = StatsConventions.norminv(np.asarray(ps, dtype=float))
             avg_zscore = np.nanmean(zscores)
-            return StatsConventions.normcdf(avg_zscore)
+            return float(StatsConventions.normcdf(avg_zscore))
         else:
             return 0.5
 
+    @staticmethod
+    def segment_zmean_percentile(segments, ps, num_segments: int, default=0.5):
+        """ zmean_percentile applied to many groups of percentiles at once
+
+              segments   [int]    Group each percentile belongs to, in range(num_segments)
+              ps         [float]  values in (0,1)
+              :returns   [float]  One summary per segment, or default if a segment is empty
+        """
+        segments = np.asarray(segments, dtype=int)
+        zscores = StatsConventions.norminv(np.asarray(ps, dtype=float))
+        valid = ~np.isnan(zscores)
+        totals = np.bincount(
+            segments[valid], weights=zscores[valid], minlength=num_segments
+        )
+        counts = np.bincount(segments[valid], minlength=num_segments)
+        present = np.bincount(segments, minlength=num_segments) > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            zmean = totals / counts
+        prctls = StatsConventions.normcdf(zmean)
+        return np.where(present, prctls, default)
+
     @staticmethod
     def percentile_abscissa():
         """ Default x-values for cdf """
@@ -147,6 +177,69 @@ class StatsConventions:
         return unique_x if not as_process else [
             chronological_values[-1] + x for x in unique_x]
 
+    @staticmethod
+    def sketch_cdf_values(sketches, num, ndigits=2):
+        """ Approximates cdf_values() from sketches of a stream, rather than its lags
+
+                sketches   [{field:str}]  Hashes maintained by SketchServer, oldest
+                                          generation first
+                :returns   [float], or None if nothing has been sketched
+
+            Sketch fields are counts of levels 'L' and changes 'D' by signed bucket,
+            e.g. 'L+12', 'D-3', 'L0', distinct levels 'U' and changes 'W' by value
+            while there are few, and 'n', 'last', 'last_diff', 'level_flips',
+            'diff_flips', 'distinct_levels' and 'distinct_diffs'.
+        """
+        sketches = [sketch for sketch in sketches if sketch and 'last' in sketch]
+        if not sketches:
+            return None
+
+        def total(field):
+            return sum(int(sketch.get(field, 0)) for sketch in sketches)
+
+        as_process = total('diff_flips') > 2 * total('level_flips')
+        prefix = 'D' if as_process else 'L'
+
+        def distinct(num_distinct, distinct_prefix):
+            # Listed in full only while every generation has seen few values
+            if all(int(sketch.get(num_distinct, 0)) <= num for sketch in sketches):
+                return set(
+                    float(field[1:]) for sketch in sketches for field in sketch
+                    if field[0] == distinct_prefix
+                )
+
+        levels = distinct('distinct_levels', 'U')
+        if levels is not None and len(levels) <= num:
+            xs = distinct('distinct_diffs', 'W') if as_process else levels
+            if xs is not None:
+                return StatsConventions.quantize(list(xs), num=num, ndigits=6)
+
+        counts = dict()
+        for sketch in sketches:
+            for field, count in sketch.items():
+                if field[0] == prefix:
+                    counts[field[1:]] = counts.get(field[1:], 0) + int(count)
+        buckets = list(counts)
+        gamma = StatsConventions.SKETCH_GAMMA
+
+        def representative(bucket):
+            if bucket == '0':
+                return 0.
+            x = 2 * gamma ** int(bucket[1:]) / (gamma + 1)
+            return x if bucket[0] == '+' else -x
+
+        xs = np.array([representative(bucket) for bucket in buckets])
+        order = np.argsort(xs)
+        xs = xs[order]
+        cumulative = np.cumsum(np.array([counts[bucket] for bucket in buckets])[order])
+        ps = np.asarray(StatsConventions.evenly_spaced_percentiles(num=num))
+        sample_x = xs[np.searchsorted(cumulative, ps * cumulative[-1])]
+        unique_x = list(set(round(float(x), ndigits) for x in sample_x))
+        if as_process:
+            last = float(sketches[-1]['last'])
+            return [last + x for x in unique_x]
+        return unique_x
+
     @staticmethod
     def _cdf_discrete_values(lagged_values: [float], num: int = 26, ndigits=6):
         chronological_values = list(reversed(lagged_values))
@@ -190,6 +283,24 @@ class StatsConventions:
         ys = [p[1] for p in pairs]
         return {'x': xs, 'y': ys}
 
+    @staticmethod
+    def monotone_envelopes(ys):
+        """ Make many CDFs monotone at once, using the average of running max and min
+
+               ys   [[float]]  One row of cumulative probabilities per CDF. Missing
+                               entries are np.nan and are skipped.
+               :returns        Array of the same shape with np.nan left in place
+
+        """
+        ys = np.atleast_2d(np.asarray(ys, dtype=float))
+        missing = np.isnan(ys)
+        running_max = np.maximum.accumulate(np.where(missing, -np.inf, ys), axis=1)
+        running_min = np.minimum.accumulate(
+            np.where(missing, np.inf, ys)[:, ::-1], axis=1
+        )[:, ::-1]
+        with np.errstate(invalid='ignore'):
+            return np.where(missing, np.nan, 0.5 * (running_max + running_min))
+
     @staticmethod
     def quantize(xs, num: int, ndigits: int = 12):
         """ Round until there are less than or equal to num items
@@ -241,9 +352,13 @@ nudged = StatsConventions.nudged
 is_discrete = StatsConventions.is_discrete
 evenly_spaced_percentiles = StatsConventions.evenly_spaced_percentiles
 cdf_values = StatsConventions.cdf_values
+sketch_cdf_values = StatsConventions.sketch_cdf_values
 quantize = StatsConventions.quantize
 discrete_pdf = StatsConventions.discrete_pdf
 discrete_cdf = StatsConventions.discrete_cdf
+monotone_envelopes = StatsConventions.monotone_envelopes
+zmean_percentile = StatsConventions.zmean_percentile
+segment_zmean_percentile = StatsConventions.segment_zmean_percentile
 is_process = StatsConventions.is_process
 sign_changes = StatsConventions.sign_changes
 
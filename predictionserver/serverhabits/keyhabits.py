@@ -6,3 +6,7 @@ class KeyHabits(KeyConventions, ObscurityHabits):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+
+    def _ANIMALS(self):
+        # Hash from code (public identity) to spirit animal, shared by all servers
+        return self.obscurity() + "animals"
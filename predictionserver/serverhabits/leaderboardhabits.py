@@ -2,14 +2,15 @@ from predictionserver.futureconventions.leaderboardconventions import (
     LeaderboardConventions, LeaderboardGranularity, LeaderboardMemoryDescription
 )
 from predictionserver.futureconventions.typeconventions import Genus
+from predictionserver.futureconventions.sepconventions import SepConventions
 from predictionserver.serverhabits.obscurityhabits import ObscurityHabits
 from pprint import pprint
 
 # Remark: Most leaderboard conventions are public
 #         (So see leaderboardconventions to understand the enumeration of leaderboards.)
 #
-# Leaderboards are shrunk stochastically by a daemon every now and then.
-# The daemon reads from the shrink queue
+# Leaderboards are shrunk stochastically every now and then, by adjusting a scale
+# factor kept for each leaderboard (see LeaderboardScaleServer)
 
 
 class LeaderboardHabits(LeaderboardConventions, ObscurityHabits):
@@ -19,11 +20,9 @@ class LeaderboardHabits(LeaderboardConventions, ObscurityHabits):
         # How long to keep leaderboards for inactive streams
         self._LEADERBOARD_TTL = 14 * 24 * 60 * 60
 
-    def _SHRINK_QUEUE(self):
-        raise Exception('You want shink_queue_location() ')
-
-    def shrink_queue_location(self):
-        return self.obscurity() + "shrink_queue"
+    def _LEADERBOARD_SCALES(self):
+        # Hash of log scale factors for stored leaderboard scores, keyed by leaderboard
+        return self.obscurity() + "leaderboard_scales"
 
     def leaderboard_names_to_update(self, name, code, delay):
         """ Leaderboards that update when data arrives """
@@ -46,6 +45,39 @@ class LeaderboardHabits(LeaderboardConventions, ObscurityHabits):
         ]
         return sorted(list(set(stream_boards + memory_boards)))
 
+    # ---------------------------- #
+    #    Backward compatibility    #
+    # ---------------------------- #
+
+    @staticmethod
+    def old_lb_cat(name=None):
+        if name is not None:
+            if 'z1~' in name:
+                return 'zscores_univariate'
+            elif 'z2~' in name:
+                return 'zcurves_bivariate'
+            elif 'z3~' in name:
+                return 'zcurves_trivariate'
+            else:
+                return 'regular'
+        else:
+            return 'all_streams'
+
+    def old_custom_leaderboard_name(self, sponsor, name=None, dt=None):
+        """ Names for leaderboards with a given sponsor
+        :param sponsor:  str
+        :param name:     str
+        :param dt:       datetime
+        :return:
+        """
+
+        def lb_month(dt=None):
+            return dt.isoformat()[:7] if dt is not None else 'all_time'
+
+        sponsor = sponsor or 'overall'
+        return SepConventions.sep().join([self.CUSTOM_LEADERBOARD[:-2], sponsor,
+                                          self.old_lb_cat(name), lb_month(dt)]) + '.json'
+
 
 if __name__ == '__main__':
     lbh = LeaderboardHabits()
@@ -1,4 +1,6 @@
-from predictionserver.futureconventions.namingconventions import NamingConventions
+from predictionserver.futureconventions.namingconventions import (
+    NamingConventions, LegacyNamingConventions
+)
 from predictionserver.serverhabits.obscurityhabits import ObscurityHabits
 
 # Random stuff here until it find a better place
@@ -18,7 +20,15 @@ DEFAULT_TESTING_CONVENTIONS = {
 }
 
 
-class NamingHabits(NamingConventions, ObscurityHabits):
+class NamingHabits(NamingConventions, LegacyNamingConventions, ObscurityHabits):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+
+    def transactions_name(self, write_key=None, name=None, delay=None):
+        """ Streams of settlement transactions, overall or by owner, stream and delay """
+        return self.legacy_transactions_name(write_key=write_key, name=name, delay=delay)
+
+    def errors_name(self, write_key):
+        """ List of recent errors reported to the owner of write_key """
+        return self.legacy_errors_name(write_key=write_key)
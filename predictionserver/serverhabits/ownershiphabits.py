@@ -23,3 +23,7 @@ class OwnershipHabits(ObscurityHabits):
         # Location of redundant set of all stream names (needed for random
         # sampling when collecting garbage)
         return self.obscurity() + "names"
+
+    def _GARBAGE_SWEEP(self):
+        # Hash recording progress of GarbageDaemon through _NAMES (SSCAN cursor etc)
+        return self.obscurity() + "garbage_sweep"
@@ -1,12 +1,19 @@
 import os
 import uuid
+import zlib
+import numpy as np
 from predictionserver.futureconventions.sepconventions import SepConventions
 from predictionserver.futureconventions.scenarioconventions import ScenarioConventions
+from predictionserver.futureconventions.settlementconventions import (
+    SettlementConventions
+)
 from predictionserver.serverhabits.obscurityhabits import ObscurityHabits
 from predictionserver.futureconventions.zcurveconventions import ZCurveConventions
 
 
-class ScenarioHabits(ScenarioConventions, ObscurityHabits, ZCurveConventions):
+class ScenarioHabits(
+    ScenarioConventions, SettlementConventions, ObscurityHabits, ZCurveConventions
+):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -19,6 +26,7 @@ class ScenarioHabits(ScenarioConventions, ObscurityHabits, ZCurveConventions):
         self.NUM_WINNERS = 10  # Maximum number of winning tickets
         self.SHRINKAGE = 0.1  # How much to shrink leaderboards
         self._WINDOWS = [1e-3, 1e-2, 1e-1, 1, 10]
+        self._PROMISE_SHARDS = 8  # Number of time-wheel promise queues
 
     def NOISE(self):
         raise Exception('You want TRUTH_NOISE or SAMPLE_NOISE')
@@ -33,9 +41,10 @@ class ScenarioHabits(ScenarioConventions, ObscurityHabits, ZCurveConventions):
 
     def _PROMISED(self):
         # Prefixes temporary values referenced by the promise queue
-        return "promised" + self.SEP
+        return "promised" + SepConventions.sep()
 
     def _PROMISES(self):
+        # Prefixes sorted sets of promises scored by the time they fall due
         return self.obscurity() + "promises" + SepConventions.sep()
 
     def _CANCELLATIONS(self):
@@ -51,28 +60,47 @@ class ScenarioHabits(ScenarioConventions, ObscurityHabits, ZCurveConventions):
         # Prefix to delayed predictions by horizon. Contain write_keys !
         return self.obscurity() + self.SAMPLES
 
+    def _SCENARIO_VERSIONS(self):
+        # Hash of counters bumped whenever predictions or samples sorted sets are
+        # modified, keyed by the name of the sorted set
+        return self.obscurity() + "scenario_versions"
+
     def _random_promised_name(self, name):
         name_stem = os.path.splitext(name)[0]
-        return self._PROMISED + \
+        return self._PROMISED() + \
             str(uuid.uuid4())[:8] + SepConventions.sep() + name_stem + '.json'
 
     def _copy_promise(self, source, destination):
         return source + self.COPY_SEP + destination
 
     def _cancellation_queue_name(self, epoch_seconds):
-        return self._CANCELLATIONS + str(int(epoch_seconds))
+        return self._CANCELLATIONS() + str(int(epoch_seconds))
+
+    def _promise_queue_name(self, shard):
+        return self._PROMISES() + str(int(shard))
+
+    def _legacy_promise_queue_name(self, epoch_seconds):
+        # Sets of promises due at epoch_seconds, as queued before sharding
+        return self._PROMISES() + str(int(epoch_seconds))
+
+    def _promise_shard(self, destination):
+        """ Promises for the same destination always share a queue, so that later
+            promises can override earlier ones
+        """
+        return zlib.crc32(destination.encode()) % self._PROMISE_SHARDS
 
-    def _promise_queue_name(self, epoch_seconds):
-        return self._PROMISES + str(int(epoch_seconds))
+    def _promise_queue_ttl(self):
+        # Queues are long lived, but vanish if nothing is promised for a while
+        return max(self.DELAYS) + self._DELAY_GRACE + 5 * 60
 
     def _sample_owners_name(self, name, delay):
-        return self._OWNERS + self._samples_name(name=name, delay=delay)
+        return self._OWNERS() + self._samples_name(name=name, delay=delay)
 
     def _predictions_name(self, name, delay):
-        return self._PREDICTIONS + str(delay) + SepConventions.sep() + name
+        return self._PREDICTIONS() + str(delay) + SepConventions.sep() + name
 
     def _samples_name(self, name, delay):
-        return self._SAMPLES + str(delay) + SepConventions.sep() + name
+        return self._SAMPLES() + str(delay) + SepConventions.sep() + name
 
     def _format_scenario(self, write_key, k):
         """
@@ -88,12 +116,28 @@ class ScenarioHabits(ScenarioConventions, ObscurityHabits, ZCurveConventions):
     def _scenario_percentile(self, scenario):
         """ Extract scenario percentile from scenario string """
         return (0.5 + float(
-            scenario.split(SepConventions.sep())[0]
+            scenario.partition(SepConventions.sep())[0]
         )) / self.num_predictions
 
     def _scenario_owner(self, scenario):
         """ Extract owner of a scenario from scenario string """
-        return scenario.split(SepConventions.sep())[1]
+        return scenario.partition(SepConventions.sep())[2]
+
+    def _decode_tickets(self, scenarios):
+        """ Bulk split of scenario strings
+              :returns  (ks, owners)   as numpy arrays
+        """
+        if not len(scenarios):
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=str)
+        parts = np.char.partition(np.asarray(scenarios, dtype=str), SepConventions.sep())
+        return parts[:, 0].astype(int), parts[:, 2]
+
+    def _decode_scenarios(self, scenarios):
+        """ Bulk version of _scenario_percentile and _scenario_owner
+              :returns  (percentiles, owners)   as numpy arrays
+        """
+        ks, owners = self._decode_tickets(scenarios)
+        return (0.5 + ks) / self.num_predictions, owners
 
     def _prediction_promise(self, target, delay, predictions_name):
         """
@@ -1,3 +1,6 @@
+from predictionserver.futureconventions.laggedconventions import RollupResolution
+
+
 class SummarizingHabits:
 
     def __init__(self, **kwargs):
@@ -38,6 +41,18 @@ class SummarizingHabits:
                     method_name + self.SEP + str(delay): method(name=name, delay=delay)
                 }
                 references.update(item)
+        for generation in (0, 1):
+            references.update({
+                "sketch" + self.SEP + str(generation): self.sketch_name(
+                    name=name, generation=generation
+                )
+            })
+        for resolution in RollupResolution:
+            references.update({
+                "rollup" + self.SEP + str(resolution): self.rollup_name(
+                    name=name, resolution=resolution
+                )
+            })
         return references
 
     def _nullary_methods(self):
@@ -45,6 +60,7 @@ class SummarizingHabits:
             "name": self.identity,
             "lagged": self.lagged_values_name,
             "lagged_times": self.lagged_times_name,
+            "lagged_packed": self.lagged_packed_name,
             "backlinks": self.backlinks_name,
             "subscribers": self.subscribers_name,
             "subscriptions": self.subscriptions_name,
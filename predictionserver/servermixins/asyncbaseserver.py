@@ -0,0 +1,247 @@
+from predictionserver.servermixins.laggedserver import LaggedServer
+from predictionserver.servermixins.scenarioserver import ScenarioServer
+from predictionserver.servermixins.notificationserver import NotificationServer
+from predictionserver.servermixins.sketchserver import SketchServer
+from predictionserver.futureconventions.leaderboardconventions import (
+    LeaderboardGranularity
+)
+from predictionserver.futureconventions.sepconventions import SepConventions
+from typing import Union
+from collections import OrderedDict
+import redis.asyncio
+import fakeredis
+import json
+
+# Read paths for asyncio web applications. The synchronous self.client is kept
+# for everything inherited, while get(), get_lagged(), get_leaderboard() and
+# get_cdf() are coroutines using self.aclient, as is alisten() for notifications.
+# Pipelines are built and parsed by the same methods the synchronous servers use.
+#
+# An asyncio connection pool belongs to the event loop that first uses it, so
+# create one AsyncBaseServer per loop (e.g. per worker) and share it between
+# requests. Call aclose() when the loop shuts down.
+
+
+class AsyncBaseServer(LaggedServer, ScenarioServer, NotificationServer, SketchServer):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.async_client_factory = None  # See set_async_client_factory()
+        self.client, self.aclient = self._make_fake_clients()
+
+    def connect(self, **kwargs):
+        """ Establish both clients to real or fake redis database """
+        super().connect(**kwargs)
+        self.aclient = self._make_async_redis_client(**kwargs)
+        if self.aclient is None:
+            if not isinstance(self.client, fakeredis.FakeStrictRedis):
+                raise ValueError('No asynchronous client to match ' + repr(self.client))
+            self.client, self.aclient = self._make_fake_clients()
+            self.capabilities = None
+
+    def set_async_client_factory(self, async_client_factory=None):
+        """ Use async_client_factory(**redis_kwargs) to create self.aclient in connect()
+              None reverts to async_pooled_client()
+        """
+        self.async_client_factory = async_client_factory
+
+    async def aclose(self):
+        await self.aclient.aclose()
+
+    @staticmethod
+    async def aexecute_steps(steps):
+        """ Like execute_steps(), for steps that use self.aclient """
+        execution = None
+        try:
+            while True:
+                execution = await steps.send(execution).execute()
+        except StopIteration as done:
+            return done.value
+
+    def _make_fake_clients(self):
+        """ Synchronous and asynchronous clients to the same fake redis """
+        server = fakeredis.FakeServer()
+        return (
+            fakeredis.FakeStrictRedis(server=server, decode_responses=True),
+            fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        )
+
+    def _make_async_redis_client(self, **kwargs):
+        """ None unless connecting to a real redis """
+        connection_pool = kwargs.pop('connection_pool', None)
+        if connection_pool is not None:
+            # Synchronous pools won't do, but an async pool can be configured alike
+            kwargs = dict(self._redis_kwargs_from_pool(connection_pool), **kwargs)
+        kwargs["decode_responses"] = True
+        if not any(k in kwargs for k in ('host', 'unix_socket_path')):
+            return None
+        redis_kwargs = dict([
+            (k, kwargs[k]) for k in self._PY_REDIS_ARGS
+            if k in kwargs and k != 'connection_pool'
+        ])
+        async_client_factory = self.async_client_factory or self.async_pooled_client
+        return async_client_factory(**redis_kwargs)
+
+    @staticmethod
+    def _redis_kwargs_from_pool(connection_pool):
+        """ redis.StrictRedis style arguments that would recreate a synchronous pool """
+        redis_kwargs = dict(connection_pool.connection_kwargs)
+        connection_class = getattr(connection_pool, 'connection_class', None)
+        if connection_class is None:
+            raise ValueError('Cannot connect asynchronously like ' + repr(connection_pool))
+        if issubclass(connection_class, redis.UnixDomainSocketConnection):
+            redis_kwargs['unix_socket_path'] = redis_kwargs.pop('path')
+        elif issubclass(connection_class, redis.SSLConnection):
+            redis_kwargs['ssl'] = True
+        elif 'host' not in redis_kwargs:
+            raise ValueError('Cannot connect asynchronously like ' + repr(connection_pool))
+        redis_kwargs['max_connections'] = connection_pool.max_connections
+        return redis_kwargs
+
+    @classmethod
+    def async_pooled_client(cls, **redis_kwargs):
+        """ Default async client factory: redis.asyncio.StrictRedis with its own pool,
+            sized and configured like the shared synchronous pools
+        """
+        single_connection_client = redis_kwargs.pop('single_connection_client', False)
+        pool_kwargs = cls._connection_pool_kwargs(
+            ssl_connection=redis.asyncio.SSLConnection,
+            unix_connection=redis.asyncio.UnixDomainSocketConnection,
+            **redis_kwargs
+        )
+        return redis.asyncio.StrictRedis(
+            connection_pool=redis.asyncio.ConnectionPool(**pool_kwargs),
+            single_connection_client=single_connection_client
+        )
+
+    # --------------- #
+    #   Read paths    #
+    # --------------- #
+
+    async def get(self, name, as_json=False):
+        """ Unified getter. Prefixed names other than lagged, cdf and delayed are not
+            supported and return None
+        """
+        parts = name.split(SepConventions.sep())
+        if len(parts) == 1:
+            data = await self.aclient.get(name=name)
+        else:
+            data = await self._get_prefixed_implementation(prefixed_name=name)
+        return json.dumps(data) if as_json else data
+
+    async def get_lagged(self, name, start=0, end=None, count: int = None, to_float=True):
+        """ [(time, value)] most recent first """
+        times, values = await self._aget_lagged_implementation(
+            name=name, start=start, end=end, count=count, to_float=to_float
+        )
+        return list(zip(times, values))
+
+    async def get_lagged_values(
+            self, name, start=0, end=None, count: int = None, to_float=True
+    ):
+        _, values = await self._aget_lagged_implementation(
+            name=name, start=start, end=end, count=count, to_float=to_float
+        )
+        return values
+
+    async def get_leaderboard(
+            self,
+            granularity: Union[LeaderboardGranularity, str],
+            count=1200,
+            readable=True,
+            **kwargs
+    ):
+        leaderboard_name = self.leaderboard_name(granularity=granularity, **kwargs)
+        read_pipe = self.aclient.pipeline(transaction=True)
+        read_pipe.zrange(name=leaderboard_name, start=-count, end=-1, withscores=True)
+        self._pipe_leaderboard_scales(pipe=read_pipe, leaderboard_names=[leaderboard_name])
+        stored, log_scales = await read_pipe.execute()
+        scale = self._leaderboard_scales_from_execution(log_scales)[0]
+        leaderboard = [(code, scale * score) for code, score in reversed(stored)]
+        if readable:
+            animals = await self.aexecute_steps(self._animal_steps(
+                client=self.aclient, codes=[code for code, _ in leaderboard]
+            ))
+            return OrderedDict([
+                (animal, score) for animal, (_, score) in zip(animals, leaderboard)
+            ])
+        return OrderedDict(leaderboard)
+
+    async def get_cdf(
+            self,
+            name: str,
+            delay,
+            values: [float] = None,
+            top=10,
+            min_balance=-50000000
+    ):
+        """ Retrieve 'x' and 'y' values representing an approximate CDF
+        :return:  {'x':[float],'y':[float]}
+        """
+        delay = int(delay)
+        if values is None and self.sketches:
+            sketch_pipe = self._pipe_sketch_reads(
+                pipe=self.aclient.pipeline(transaction=False), name=name
+            )
+            values = self._sketch_values_from_execution(
+                await sketch_pipe.execute(), num=20
+            )[0]
+        if values is None:
+            lagged_values = await self.get_lagged_values(name=name)
+            values = self.cdf_values(lagged_values=lagged_values, num=20, as_discrete=None)
+        horizon = self.horizon_name(name=name, delay=delay)
+        cdfs = await self._get_cdfs_implementation(
+            horizons=[horizon], values={horizon: values}, top=top, min_balance=min_balance
+        )
+        return cdfs[horizon]
+
+    # ------------------- #
+    #   Implementation    #
+    # ------------------- #
+
+    async def _get_prefixed_implementation(self, prefixed_name):
+        parts = prefixed_name.split(SepConventions.sep())
+        ps = (parts[0] + SepConventions.sep()).lower()
+        if len(parts) == 2:
+            if ps == self.LAGGED:
+                return await self.get_lagged(name=parts[-1])
+            elif ps == self.LAGGED_VALUES:
+                return await self.get_lagged_values(name=parts[-1])
+            elif ps == self.LAGGED_TIMES:
+                times, _ = await self._aget_lagged_implementation(name=parts[-1])
+                return times
+        elif len(parts) == 3:
+            if ps == self.CDF:
+                return await self.get_cdf(name=parts[-1], delay=int(parts[1]))
+            elif ps == self.DELAYED:
+                delayed = await self.aclient.get(
+                    name=self.delayed_name(name=parts[-1], delay=int(parts[1]))
+                )
+                try:
+                    return self.to_float(delayed)
+                except BaseException:
+                    return delayed
+        return None
+
+    async def _aget_lagged_implementation(
+            self, name, start=0, end=None, count: int = None, to_float=True
+    ):
+        """ times, values  most recent first, like get_lagged_times_and_values() """
+        count = count or self._DEFAULT_LAGGED_COUNT
+        end = end or start + count - 1
+        get_pipe = self._pipe_lagged(
+            pipe=self.aclient.pipeline(transaction=False), name=name, end=end
+        )
+        raw_times, raw_values = self._lagged_from_execution(
+            await get_pipe.execute(), start=start, end=end
+        )
+        return self._lagged_lists(
+            raw_times=raw_times, raw_values=raw_values, to_float=to_float
+        )
+
+    async def _get_cdfs_implementation(self, horizons, values, top, min_balance):
+        """ values   {horizon:[float]} """
+        return await self.aexecute_steps(self._cdf_steps(
+            client=self.aclient, horizons=horizons, values=values, top=top,
+            min_balance=min_balance
+        ))
@@ -5,12 +5,13 @@ import time
 import sys
 import math
 from collections import OrderedDict
-from predictionserver.futureconventions.samplers import exponential_bootstrap
+from predictionserver.futureconventions.samplers import exponential_bootstrap_many
 from itertools import zip_longest
 from predictionserver.futureconventions.typeconventions import (
     NameList, Optional, ValueList, KeyList
 )
 from predictionserver.futureconventions.sepconventions import SepConventions
+from predictionserver.utilities.lrucache import LruCache
 from typing import Any, List
 from redis.client import list_or_args
 import numpy as np
@@ -46,12 +47,25 @@ class BaseServer(Habits):
         'client_name'
     )
     _FAKE_REDIS_ARGS = ('decode_responses',)
+    # Defaults for pooled connections to a real redis, overridden by connect() args
+    _POOL_DEFAULTS = OrderedDict([
+        ('max_connections', 50),
+        ('health_check_interval', 30),
+        ('retry_on_timeout', True),
+        ('socket_keepalive', True)
+    ])
+    _SHARED_POOLS = dict()  # Shared by every server in the process with the same args
+    _CAPABILITY_PROBE = 'e5312d16-dc87-46d7-a2e5-f6a6225e63a5'  # Throwaway key prefix
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # Creates fake redis instance on initialization.
         # Use connect() to modify
+        self.client_factory = None  # See set_client_factory()
         self.client = self._make_redis_client(decode_responses=True)
+        self.capabilities = None  # Detected on connect(), or on first use
+        self.animal_cache = LruCache(maxsize=100000)  # ('code' or 'key', str) -> animal
+        self.redis_animals = False  # See enable_redis_animals()
         # Other implementation config
         self._DEFAULT_MODEL_STD = 1.0  # Noise added for self-prediction
         self._MAX_TTL = 96 * 60 * 60  # Maximum TTL, useful for testing
@@ -67,23 +81,80 @@ class BaseServer(Habits):
         """ Establish client to real or fake redis database """
         # Also activate self.obscurity() by supplying a password
         self.client = self._make_redis_client(**kwargs)
+        try:
+            self.capabilities = self._detect_capabilities()
+        except redis.exceptions.ConnectionError:
+            self.capabilities = None
         obscurity = kwargs.get('obscurity')
         if obscurity:
             self.set_obscurity(secret=obscurity)
 
+    def set_client_factory(self, client_factory=None):
+        """ Use client_factory(**redis_kwargs) to create clients in connect()
+              None reverts to pooled_client()
+        """
+        self.client_factory = client_factory
+
     def _make_redis_client(self, **kwargs):
         kwargs["decode_responses"] = True  # Very important in this implementation
-        is_real = "host" in kwargs
+        is_real = any(k in kwargs for k in ('host', 'unix_socket_path', 'connection_pool'))
         KWARGS = self._PY_REDIS_ARGS if is_real else self._FAKE_REDIS_ARGS
         redis_kwargs = dict()
         for k in KWARGS:
             if k in kwargs:
                 redis_kwargs[k] = kwargs[k]
         if is_real:
-            return redis.StrictRedis(**redis_kwargs)
+            client_factory = self.client_factory or self.pooled_client
+            return client_factory(**redis_kwargs)
         else:
             return fakeredis.FakeStrictRedis(**redis_kwargs)
 
+    @classmethod
+    def pooled_client(cls, **redis_kwargs):
+        """ Default client factory: redis.StrictRedis drawing on a shared pool """
+        single_connection_client = redis_kwargs.pop('single_connection_client', False)
+        connection_pool = redis_kwargs.pop('connection_pool', None) or \
+            cls.shared_connection_pool(**redis_kwargs)
+        return redis.StrictRedis(
+            connection_pool=connection_pool,
+            single_connection_client=single_connection_client
+        )
+
+    @classmethod
+    def shared_connection_pool(cls, **redis_kwargs):
+        """ One redis.ConnectionPool per distinct set of connection arguments """
+        pool_kwargs = cls._connection_pool_kwargs(
+            ssl_connection=redis.SSLConnection,
+            unix_connection=redis.UnixDomainSocketConnection,
+            **redis_kwargs
+        )
+        pool_key = tuple(sorted((k, repr(v)) for k, v in pool_kwargs.items()))
+        if pool_key not in cls._SHARED_POOLS:
+            cls._SHARED_POOLS[pool_key] = redis.ConnectionPool(**pool_kwargs)
+        return cls._SHARED_POOLS[pool_key]
+
+    @classmethod
+    def _connection_pool_kwargs(cls, ssl_connection, unix_connection, **redis_kwargs):
+        """ Translate redis.StrictRedis style arguments into ConnectionPool arguments """
+        pool_kwargs = OrderedDict(cls._POOL_DEFAULTS)
+        pool_kwargs.update(redis_kwargs)
+        for legacy, current in [('charset', 'encoding'), ('errors', 'encoding_errors')]:
+            if legacy in pool_kwargs:
+                pool_kwargs[current] = pool_kwargs.pop(legacy)
+        ssl_kwargs = [k for k in pool_kwargs if k.startswith('ssl')]
+        if pool_kwargs.get('ssl'):
+            pool_kwargs['connection_class'] = ssl_connection
+            del pool_kwargs['ssl']
+        else:
+            for k in ssl_kwargs:
+                del pool_kwargs[k]
+        if pool_kwargs.get('unix_socket_path'):
+            pool_kwargs['connection_class'] = unix_connection
+            pool_kwargs['path'] = pool_kwargs.pop('unix_socket_path')
+            for k in ['host', 'port', 'socket_keepalive', 'socket_keepalive_options']:
+                pool_kwargs.pop(k, None)
+        return pool_kwargs
+
     def execute_one(self, method, **kwargs):
         pipe = self.client.pipeline()
         pipe = method(pipe=pipe, **kwargs)
@@ -115,6 +186,19 @@ class BaseServer(Habits):
         execution = pipe.execute()
         return execution
 
+    @staticmethod
+    def execute_steps(steps):
+        """ Run a generator that yields pipelines and is sent back their execution,
+            returning what the generator returns. Reads that must also work with an
+            asyncio client are written as such steps (see AsyncBaseServer.aexecute_steps)
+        """
+        execution = None
+        try:
+            while True:
+                execution = steps.send(execution).execute()
+        except StopIteration as done:
+            return done.value
+
     @staticmethod
     def coerce_inputs(
             names: Optional[NameList] = None,
@@ -231,17 +315,105 @@ class BaseServer(Habits):
     #            Redis version/capability inference
     # --------------------------------------------------------------------------
 
-    def _streams_support(self):
-        # Returns True if redis streams are supported by the redis client
-        # (Note that streams are not supported on fakeredis)
-        try:
-            record_of_test = {"time": str(time.time())}
-            self.client.xadd(
-                name='e5312d16-dc87-46d7-a2e5-f6a6225e63a5',
-                fields=record_of_test)
-            return True
-        except BaseException:
-            return False
+    def has_capability(self, capability: str):
+        """ Whether the redis server supports a feature, e.g. 'streams'
+            (Results are cached. If you replace self.client directly, reset
+             self.capabilities to None.)
+        """
+        if self.capabilities is None:
+            self.capabilities = self._detect_capabilities()
+        return self.capabilities.get(capability, False)
+
+    def _detect_capabilities(self):
+        """ Probe the server once for optional features
+              :returns  {capability: bool}
+        """
+        probe = self._CAPABILITY_PROBE + SepConventions.sep()
+        probes = OrderedDict([
+            ('streams', lambda: self.client.xadd(
+                name=probe + 'streams', fields={"time": str(time.time())}
+            )),
+            ('memory_usage', lambda: self.client.memory_usage(probe + 'memory_usage')),
+            ('scripting', lambda: self.client.eval('return 1', 0)),
+            ('zpopmin', lambda: self.client.zpopmin(probe + 'zpopmin')),
+            ('hset_mapping', lambda: self.client.hset(
+                name=probe + 'hset_mapping', mapping={'a': 1, 'b': 2}
+            )),
+        ])
+        capabilities = OrderedDict()
+        for capability, attempt in probes.items():
+            try:
+                attempt()
+                capabilities[capability] = True
+            except redis.exceptions.ResponseError:
+                capabilities[capability] = False
+        self.client.delete(*[probe + capability for capability in probes])
+        return capabilities
+
+    # --------------------------------------------------------------------------
+    #            Spirit animals
+    # --------------------------------------------------------------------------
+    # Finding the animal for a code means a muid search, so leaderboards and lists
+    # of sponsors resolve them in bulk through a local LRU cache, and optionally a
+    # redis hash shared with other processes. Write keys never leave the process.
+
+    def enable_redis_animals(self, enable=True):
+        """ Share code -> animal resolutions through redis """
+        self.redis_animals = enable
+
+    def animals_from_codes(self, codes, with_redis=None):
+        """ [animal or None] for public identities
+              with_redis    Consult the redis hash (defaults to self.redis_animals)
+        """
+        return self.execute_steps(
+            self._animal_steps(client=self.client, codes=codes, with_redis=with_redis)
+        )
+
+    def _animal_steps(self, client, codes, with_redis=None):
+        """ animals_from_codes() as pipelines on client, see execute_steps() """
+        with_redis = self.redis_animals if with_redis is None else with_redis
+        found, missing = self._cached_animals(kind='code', items=codes)
+        if missing and with_redis:
+            missing = list(dict.fromkeys(missing))
+            read_pipe = client.pipeline(transaction=False)
+            read_pipe.hmget(self._ANIMALS(), *missing)
+            stored = (yield read_pipe)[0]
+            from_redis = dict([(c, a) for c, a in zip(missing, stored) if a is not None])
+            self._cache_animals(kind='code', animals=from_redis)
+            found.update(from_redis)
+            missing = [code for code in missing if code not in from_redis]
+        if missing:
+            computed = dict([(code, self.animal_from_code(code)) for code in missing])
+            self._cache_animals(kind='code', animals=computed)
+            found.update(computed)
+            if with_redis:
+                valid = [(code, animal) for code, animal in computed.items() if animal]
+                if valid:
+                    animal_pipe = client.pipeline(transaction=False)
+                    for code, animal in valid:
+                        animal_pipe.hset(name=self._ANIMALS(), key=code, value=animal)
+                    yield animal_pipe
+        return [found[code] for code in codes]
+
+    def animals_from_keys(self, write_keys):
+        """ [animal or None] for private identities """
+        found, missing = self._cached_animals(kind='key', items=write_keys)
+        if missing:
+            computed = dict([(key, self.animal_from_key(key)) for key in set(missing)])
+            self._cache_animals(kind='key', animals=computed)
+            found.update(computed)
+        return [found[key] for key in write_keys]
+
+    def _cached_animals(self, kind, items):
+        """ Codes and write keys share the cache, so entries are keyed by (kind, item)
+              :returns  {item:animal}, [item]  for cached and missing items
+        """
+        found, missing = self.animal_cache.lookup(keys=[(kind, item) for item in items])
+        return dict([(item, animal) for (_, item), animal in found.items()]), \
+            [item for _, item in missing]
+
+    def _cache_animals(self, kind, animals):
+        self.animal_cache.put(dict([((kind, item), a) for item, a in animals.items()]))
 
     # --------------------------------------------------------------------------
     #           Default scenario generation
@@ -249,6 +421,11 @@ class BaseServer(Habits):
     # Used by the sponsor of a stream
 
     def empirical_predictions(self, lagged_values):
-        predictions = exponential_bootstrap(
-            lagged=lagged_values, decay=0.005, num=self.NUM_PREDICTIONS)
-        return sorted(predictions)
+        return self.empirical_predictions_many(lagged_values=lagged_values, size=1)[0]
+
+    def empirical_predictions_many(self, lagged_values, size, rng=None):
+        """ Sorted predictions for size horizons, drawn together from the same lags """
+        predictions = exponential_bootstrap_many(
+            lagged=lagged_values, decay=0.005, num=self.NUM_PREDICTIONS, size=size,
+            rng=rng)
+        return np.sort(predictions, axis=1).tolist()
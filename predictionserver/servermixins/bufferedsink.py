@@ -0,0 +1,137 @@
+import atexit
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from logging import warning
+
+
+# Common ground for in-process buffers of writes (see MemoSink and MetricSink): pending
+# entries under a lock, the time the oldest arrived, and counters. A buffer is due for
+# flushing once it holds flush_size entries or its oldest has waited flush_seconds.
+#
+# Servers flush a sink when a write finds it due, optionally from a SinkFlusher thread,
+# and once more at exit. Neither the thread nor the exit hook keeps the server alive.
+
+
+class BufferedSink:
+
+    def __init__(self, flush_size, flush_seconds, counters):
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()
+        self._opened = None
+        self.counters = OrderedDict([(counter, 0) for counter in counters])
+        self.counters['flushes'] = 0
+
+    def __len__(self):
+        return self._size()
+
+    def _size(self):
+        return len(self._pending)
+
+    def _arrived(self):
+        """ Call with the lock held, as an entry arrives """
+        if self._opened is None:
+            self._opened = time.time()
+
+    def due(self):
+        with self._lock:
+            return self._due()
+
+    def _due(self):
+        return self._size() >= self.flush_size or (
+            self._opened is not None and time.time() - self._opened >= self.flush_seconds
+        )
+
+    def staleness(self):
+        """ Seconds that the oldest pending entry has waited, 0 if none """
+        with self._lock:
+            return self._staleness()
+
+    def _staleness(self):
+        return 0. if self._opened is None else time.time() - self._opened
+
+    def drain(self):
+        """ Take everything pending """
+        with self._lock:
+            pending = self._pending
+            if pending:
+                self.counters['flushes'] += 1
+                self._count_drained(pending)
+            self._pending = OrderedDict()
+            self._opened = None
+            self._reset()
+            return pending
+
+    def _count_drained(self, pending):
+        """ Call with the lock held, before pending is cleared """
+        pass
+
+    def _reset(self):
+        pass
+
+    def stats(self):
+        with self._lock:
+            stats = OrderedDict(self.counters)
+            stats['pending'] = self._size()
+            stats['staleness'] = self._staleness()
+            return stats
+
+
+class SinkFlusher:
+
+    """ Thread that flushes a sink once due, checking four times per flush window
+        (It holds the flush method weakly, and stops when the server is collected.)
+    """
+
+    def __init__(self, sink: BufferedSink, flush, description='Entries'):
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(
+            target=_flush_periodically,
+            args=(sink, weakref.WeakMethod(flush), self._stopping, description),
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+
+
+def _flush_periodically(sink, flush_ref, stopping, description):
+    while not stopping.wait(sink.flush_seconds / 4):
+        flush = flush_ref()
+        if flush is None:
+            return
+        try:
+            if sink.due():
+                flush()
+        except Exception as e:
+            warning(description + ' lost in flush: ' + str(e))
+        finally:
+            del flush
+
+
+_EXIT_FLUSHES = list()  # Weak references to flush methods, see flush_at_exit()
+
+
+def flush_at_exit(flush):
+    """ Call flush() when the interpreter exits, if its server is still around then """
+    _EXIT_FLUSHES[:] = [ref for ref in _EXIT_FLUSHES if ref() is not None]
+    if all(ref() != flush for ref in _EXIT_FLUSHES):
+        _EXIT_FLUSHES.append(weakref.WeakMethod(flush))
+
+
+def _flush_at_exit():
+    for ref in _EXIT_FLUSHES:
+        flush = ref()
+        if flush is not None:
+            try:
+                flush()
+            except Exception as e:
+                warning('Lost in flush at exit: ' + str(e))
+
+
+atexit.register(_flush_at_exit)
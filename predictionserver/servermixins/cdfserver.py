@@ -1,12 +1,15 @@
 from predictionserver.servermixins.baseserver import BaseServer
-from predictionserver.serverhabits.habits import CdfHabits
-from microconventions.leaderboard_conventions import LeaderboardVariety
+from predictionserver.futureconventions.leaderboardconventions import (
+    LeaderboardGranularity
+)
+from predictionserver.servermixins.laggedserver import LaggedServer
 from predictionserver.servermixins.leaderboardserver import LeaderboardServer
+from predictionserver.servermixins.scenarioserver import ScenarioServer
+from predictionserver.servermixins.sketchserver import SketchServer
 from pprint import pprint
-import numpy as np
 
 
-class CdfServer(CdfHabits, LeaderboardServer):
+class CdfServer(LaggedServer, LeaderboardServer, ScenarioServer, SketchServer):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -26,6 +29,8 @@ class CdfServer(CdfHabits, LeaderboardServer):
         """
         delay = int(delay)
         # TODO: Change to min_rating instead of min_balance
+        if values is None and self.sketches:
+            values = self.get_sketch_values(name=name, num=20)
         if values is None:
             lagged_values = self.get_lagged_values(name=name)
             values = self.cdf_values(lagged_values=lagged_values, num=20, as_discrete=None)
@@ -37,76 +42,67 @@ class CdfServer(CdfHabits, LeaderboardServer):
             min_balance=min_balance
         )
 
+    def get_cdfs(
+            self,
+            horizons: [str],
+            values=None,
+            top=10,
+            min_balance=-50000000
+    ):
+        """ Retrieve CDFs for many horizons in a couple of round trips
+        :param horizons: [str]  e.g. ['70::die.json', '310::die.json']
+        :param values:   Abscissa shared by all horizons, or dict of abscissa keyed by
+                         horizon ... if not supplied it will figure out something
+        :param top:      Number of top participants to use
+        :return:  {horizon:{'x':[float],'y':[float]}}
+        """
+        horizons = [
+            self.horizon_name(name=name, delay=int(delay))
+            for name, delay in map(self.split_horizon_name, horizons)
+        ]
+        if values is None:
+            names = list(dict.fromkeys(map(self.name_from_horizon, horizons)))
+            stream_values = self._sketch_values_many(names=names, num=20) \
+                if self.sketches else dict()
+            for name in names:
+                if stream_values.get(name) is None:
+                    lagged_values = self.get_lagged_values(name=name)
+                    stream_values[name] = self.cdf_values(
+                        lagged_values=lagged_values, num=20, as_discrete=None
+                    )
+            values = dict([
+                (horizon, stream_values[self.name_from_horizon(horizon)])
+                for horizon in horizons
+            ])
+        elif not isinstance(values, dict):
+            values = dict([(horizon, values) for horizon in horizons])
+        return self._get_cdfs_implementation(
+            horizons=horizons,
+            values=values,
+            top=top,
+            min_balance=min_balance
+        )
+
     # ------------------ #
     #   Implementation   #
     # ------------------ #
 
     def _get_cdf_implementation(self, name, delay, values, top, min_balance):
         """" Possibly we need to split logic into continuous and discrete cases :( """
-        assert name == self._root_name(name), "get_cdf expects root name"
-        assert delay in self.DELAYS, "delay is not a valid choice of delay"
-
-        score_pipe = self.client.pipeline()
-        num = self.client.zcard(name=self._predictions_name(name=name, delay=delay))
-        lb = self._get_leaderboard_implementation(
-            variety=LeaderboardVariety.name_and_delay,
-            name=name,
-            delay=delay,
-            readable=False,
-            count=top
-        )
-        included = [
-            write_key for write_key, balance in lb.items() if balance > min_balance
-        ]
-        if num:
-            h = min(0.1, max(5.0 / num, 0.00001)) * max(
-                [abs(v) for v in values] + [1.0]
-            )
-            for value in values:
-                score_pipe.zrevrangebyscore(
-                    name=self._predictions_name(name=name, delay=delay),
-                    max=value,
-                    min=value - h,
-                    start=0,
-                    num=5,
-                    withscores=False
-                )
-                score_pipe.zrangebyscore(
-                    name=self._predictions_name(name=name, delay=delay),
-                    min=value,
-                    max=value + h,
-                    start=0,
-                    num=5,
-                    withscores=False
-                )
-
-            execut = score_pipe.execute()
-            execut_combined = self.chunker(execut, n=len(values))
-            execut_merged = [lst[0] + lst[1] for lst in execut_combined]
-            prtcls = [
-                self._zmean_scenarios_percentile(
-                    percentile_scenarios=ex,
-                    included_codes=included) if ex else np.NaN for ex in execut_merged]
-            valid = [
-                (v, p) for v, p in zip(
-                    values, prtcls) if not np.isnan(p) and abs(
-                    p - 0.5) > 1e-6]
+        horizon = self.horizon_name(name=name, delay=delay)
+        return self._get_cdfs_implementation(
+            horizons=[horizon],
+            values={horizon: values},
+            top=top,
+            min_balance=min_balance
+        )[horizon]
 
-            # Make CDF monotone using avg of min and max envelopes running from each
-            # direction
-            ys1 = [p for v, p in valid]
-            ys2 = list(reversed([p for v, p in valid]))
-            xs = [v for v, p in valid]
-            if ys1:
-                ys_monotone_1 = list(np.maximum.accumulate(np.array(ys1)))
-                ys_monotone_2 = list(np.minimum.accumulate(np.array(ys2)))
-                ys_monotone = [0.5 * (y1 + y2)
-                               for y1, y2 in zip(ys_monotone_1, reversed(ys_monotone_2))]
-                return {"x": xs, "y": ys_monotone}
-            else:
-                return {"x": xs, "y": ys1}
-        else:
-            return {"message": "No predictions."}
+    def _get_cdfs_implementation(self, horizons, values, top, min_balance):
+        """ values   {horizon:[float]} """
+        return self.execute_steps(self._cdf_steps(
+            client=self.client, horizons=horizons, values=values, top=top,
+            min_balance=min_balance
+        ))
 
     def _get_scenarios_implementation(self, name, write_key, delay, cursor=0):
         """
@@ -135,7 +131,7 @@ if __name__ == '__main__':
 
     server = StandaloneCdfServer(**REDIZ_COLLIDER_CONFIG)
     lb = server.get_leaderboard(
-        granularity=LeaderboardVariety.name_and_delay,
+        granularity=LeaderboardGranularity.name_and_delay,
         name='die.json',
         delay=server.DELAYS[0]
     )
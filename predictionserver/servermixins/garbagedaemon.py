@@ -1,39 +1,128 @@
 from predictionserver.servermixins.memoserver import MemoServer
 from predictionserver.servermixins.ownershipserver import OwnershipServer
+from redis.exceptions import WatchError
+import math
+import time
+
+# Garbage collection walks the set of all stream names with SSCAN, one bounded batch
+# per call, and deletes streams whose value has expired (orphans). The cursor is kept
+# in redis so that successive calls, from any daemon, continue where the last left
+# off. A full pass over N names takes about N / batch calls. SSCAN can return a name
+# more than once, which is harmless here.
+#
+# A daemon claims its batch by advancing the cursor in a transaction that WATCHes the
+# sweep, so concurrent daemons examine different batches. If another daemon advances
+# the cursor first, the claim fails and the next batch is tried instead.
 
 
 class GarbageDaemon(MemoServer, OwnershipServer):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self._GARBAGE_BATCH = 500  # Names examined per call
+        self._GARBAGE_CHUNK = 100  # Names per existence check pipeline
+
+    def admin_garbage_collection(self, with_report=False, batch=None):
+        """ Examine the next batch of names, and delete those that have expired
+              :returns  number deleted, or the sweep progress with the names "deleted"
+        """
+        batch = batch or self._GARBAGE_BATCH
+        orphans, progress = self._claim_batch(batch=batch)
+        if orphans:
+            self._delete_implementation(orphans)
+        if with_report:
+            progress.update({"deleted": orphans})
+            return progress
+        return len(orphans)
+
+    def get_garbage_sweep(self):
+        """ Progress through the names, as of the last call to admin_garbage_collection """
+        return self.client.hgetall(self._GARBAGE_SWEEP())
+
+    # ------------------- #
+    #   Implementation    #
+    # ------------------- #
+
+    def _claim_batch(self, batch):
+        """ Find orphans in the next batch, and advance the cursor past it
+              :returns  [orphan], progress
+        """
+        with self.client.pipeline(transaction=True) as claim_pipe:
+            while True:
+                try:
+                    claim_pipe.watch(self._GARBAGE_SWEEP())
+                    sweep = claim_pipe.hgetall(self._GARBAGE_SWEEP())
+                    cursor, names = self._scan_names(
+                        cursor=int(sweep.get('cursor', 0)), batch=batch
+                    )
+                    orphans = self._find_orphans(names=names)
+                    progress = self._sweep_progress(
+                        sweep=sweep, cursor=cursor, num_examined=len(names),
+                        num_orphans=len(orphans)
+                    )
+                    claim_pipe.multi()
+                    for field, value in progress.items():
+                        claim_pipe.hset(name=self._GARBAGE_SWEEP(), key=field, value=value)
+                    claim_pipe.scard(self._NAMES())
+                    num_names = claim_pipe.execute()[-1]
+                    break
+                except WatchError:
+                    continue  # Another daemon took this batch
+        remaining = max(0, num_names - progress["examined"])
+        progress.update({
+            "pass_complete": cursor == 0,
+            "num_names": num_names,
+            "calls_remaining": int(math.ceil(remaining / batch))
+        })
+        return orphans, progress
+
+    def _scan_names(self, cursor, batch):
+        """ :returns  next cursor (0 at the end of a pass), [name] """
+        names = list()
+        while True:
+            cursor, found = self.client.sscan(
+                name=self._NAMES(), cursor=cursor, count=batch - len(names)
+            )
+            names.extend(found)
+            if cursor == 0 or len(names) >= batch:
+                return cursor, list(dict.fromkeys(names))
+
+    def _find_orphans(self, names):
+        """ Streams that are listed, but whose value has expired """
+        orphans = list()
+        for start in range(0, len(names), self._GARBAGE_CHUNK):
+            chunk = names[start:start + self._GARBAGE_CHUNK]
+            exists_pipe = self.client.pipeline(transaction=False)
+            for name in chunk:
+                exists_pipe.exists(name)
+            orphans.extend([
+                name for name, exists in zip(chunk, exists_pipe.execute()) if not exists
+            ])
+        return orphans
 
-    def admin_garbage_collection(self, fraction=0.1, with_report=False):
-        """ Randomized search and destroy for expired streams """
-        num_keys = self.client.scard(self._NAMES)
-        num_survey = min(100, max(20, int(fraction * num_keys)))
-        orphans = self._randomly_find_orphans(num=num_survey)
-        if orphans is not None:
-            self._delete_implementation(*orphans)
-            return len(orphans) if not with_report else {"ophans": orphans}
-        else:
-            return 0 if not with_report else {"orphans": None}
-
-    def _randomly_find_orphans(self, num=1000):
-        """ Find streams that have expired """
-        NAMES = self._NAMES()
-        unique_random_names = list(set(self.client.srandmember(NAMES, num)))
-        num_random = len(unique_random_names)
-        if num_random:
-            num_exists = self.client.stream_exists(*unique_random_names)
-            if num_exists < num_random:
-                # There must be orphans, defined as those who are listed
-                # in reserved["names"] but have expired
-                exists_pipe = self.client.pipeline(transaction=True)
-                for name in unique_random_names:
-                    exists_pipe.stream_exists(name)
-                exists = exists_pipe.execute()
-
-                orphans = [
-                    name for name, ex in zip(unique_random_names, exists) if not ex
-                ]
-                return orphans
+    @staticmethod
+    def _sweep_progress(sweep, cursor, num_examined, num_orphans):
+        """ The sweep after this batch: cumulative counts for the pass, and the last """
+        now = time.time()
+        started = float(sweep.get('started', now))
+        examined = int(sweep.get('examined', 0)) + num_examined
+        orphans = int(sweep.get('orphans', 0)) + num_orphans
+        progress = {
+            "cursor": cursor,
+            "passes": int(sweep.get('passes', 0)),
+            "examined": examined,
+            "orphans": orphans,
+            "started": started
+        }
+        if cursor == 0:
+            # Pass complete. Remember how it went and start the next
+            progress.update({
+                "passes": progress["passes"] + 1,
+                "last_pass_examined": examined,
+                "last_pass_orphans": orphans,
+                "last_pass_seconds": now - started,
+                "examined": 0,
+                "orphans": 0,
+                "started": now
+            })
+        return progress
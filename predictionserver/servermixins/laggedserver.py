@@ -1,12 +1,50 @@
 from predictionserver.servermixins.baseserver import BaseServer
-from predictionserver.serverhabits.laggedhabits import LaggedHabits
+from microconventions.value_conventions import ValueConventions
 from pprint import pprint
+from collections import OrderedDict
+from redis.client import NEVER_DECODE
+import numpy as np
 
 
-class LaggedServer(LaggedHabits, BaseServer):
+# Scalar lags can be kept as one string of packed (time, value) records instead of two
+# lists of strings (see LaggedConventions for the format). Appending is a script call,
+# and reading is a GETRANGE of the most recent records that numpy views without
+# parsing. The string is trimmed when it holds twice the lagged length, so between one
+# and two lagged lengths are kept. Vectors, and lags written while packing is disabled,
+# go to the lists.
+#
+# Packing is a choice of writer, so readers do not rely on their own flag. They read
+# the packed string and the lists alike, and merge them by time when both hold lags,
+# as they do for a while after packing is enabled or disabled.
+
+
+class LaggedServer(BaseServer, ValueConventions):
+
+    # Append packed lag ARGV[1] to KEYS[1], keeping at least ARGV[2] records of ARGV[3]
+    # bytes. Trimming copies the string, so it waits until twice that many are stored.
+    _APPEND_LAG_SCRIPT = """
+    local keep = tonumber(ARGV[2]) * tonumber(ARGV[3])
+    local stored = redis.call('APPEND', KEYS[1], ARGV[1])
+    if stored >= 2 * keep then
+        local recent = redis.call('GETRANGE', KEYS[1], stored - keep, stored - 1)
+        redis.call('SET', KEYS[1], recent, 'EX', ARGV[4])
+    else
+        redis.call('EXPIRE', KEYS[1], ARGV[4])
+    end
+    return stored
+    """
+    _NUM_LAGGED_READS = 3  # Commands per stream in _pipe_lagged()
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.packed_lags = False  # See enable_packed_lags()
+        self._append_lag_script = None
+
+    def enable_packed_lags(self, enable=True):
+        """ Store scalar lags written from here as packed float64 records """
+        if enable and not self.has_capability('scripting'):
+            raise Exception('Packed lags require a redis server with scripting')
+        self.packed_lags = enable
 
     def get_delayed(self, name, delay=None, delays=None, to_float=True):
         return self._get_delayed_implementation(
@@ -74,6 +112,17 @@ class LaggedServer(LaggedHabits, BaseServer):
             to_float=to_float
         )
 
+    def get_lagged_many(self, names, count: int = None, as_array=True, padded=False):
+        """ Lagged times and values for many streams in one round trip
+        :param as_array:  float64 arrays rather than lists of floats
+        :param padded:    One row per name, padded with nan, plus a mask that is True
+                          where there is data
+        :return:  {name:(times, values)}  or  times, values, mask  if padded
+        """
+        return self._get_lagged_many_implementation(
+            names=names, count=count, as_array=as_array, padded=padded
+        )
+
     def get_history(
             self,
             name,
@@ -106,38 +155,22 @@ class LaggedServer(LaggedHabits, BaseServer):
     ):
         """
         :param separate:    Do you want  lagged_values, lagged_times as two separate lists?
+        :param to_float:    Floats, or else strings as stored (packed lags are formatted)
         :return:
         """
         count = count or self._DEFAULT_LAGGED_COUNT
         end = end or start + count - 1
-        get_pipe = self.client.pipeline()
-        if with_values:
-            get_pipe.lrange(self.lagged_values_name(name), start=start, end=end)
-        if with_times:
-            get_pipe.lrange(self.lagged_times_name(name=name), start=start, end=end)
-        res = get_pipe.execute()
-        if with_values and with_times:
-            raw_values = res[0]
-            raw_times = res[1]
-        elif with_values and not with_times:
-            raw_values = res[0]
-            raw_times = None
-        elif with_times and not with_values:
-            raw_times = res[0]
-            raw_values = None
-
-        if raw_values and to_float:
-            try:
-                values = self.to_float(raw_values)
-            except BaseException:
-                values = raw_values
-        else:
-            values = raw_values
-
-        if raw_times and to_float:
-            times = self.to_float(raw_times)
-        else:
-            times = raw_times
+        get_pipe = self._pipe_lagged(
+            pipe=self.client.pipeline(transaction=False), name=name, end=end
+        )
+        raw_times, raw_values = self._lagged_from_execution(
+            get_pipe.execute(), start=start, end=end
+        )
+        times, values = self._lagged_lists(
+            raw_times=raw_times if with_times else [],
+            raw_values=raw_values if with_values else [],
+            to_float=to_float
+        )
 
         if with_values and with_times:
             if separate:
@@ -149,6 +182,126 @@ class LaggedServer(LaggedHabits, BaseServer):
         elif with_times and not with_values:
             return times
 
+    def _get_lagged_many_implementation(self, names, count, as_array, padded):
+        count = count or self._DEFAULT_LAGGED_COUNT
+        get_pipe = self.client.pipeline(transaction=False)
+        for name in names:
+            get_pipe = self._pipe_lagged(pipe=get_pipe, name=name, end=count - 1)
+        res = get_pipe.execute()
+        width = self._NUM_LAGGED_READS
+        raw_times, raw_values = zip(*[
+            self._lagged_from_execution(res[k:k + width], start=0, end=count - 1)
+            for k in range(0, len(res), width)
+        ]) if names else ((), ())
+
+        if padded:
+            # Values and times are pushed together, but can briefly differ in length
+            lengths = np.array([min(len(v), len(t)) for v, t in zip(raw_values, raw_times)],
+                               dtype=int)
+            mask = np.arange(max(lengths, default=0)) < lengths[:, None]
+            times = np.full(mask.shape, np.nan)
+            values = np.full(mask.shape, np.nan)
+            # Each row of the mask is a prefix, so row-major order matches concatenation
+            times[mask] = np.concatenate([np.empty(0)] + [
+                self._lagged_array(t[:n]) for t, n in zip(raw_times, lengths)
+            ])
+            values[mask] = np.concatenate([np.empty(0)] + [
+                self._lagged_array(v[:n]) for v, n in zip(raw_values, lengths)
+            ])
+            return times, values, mask
+
+        lagged = OrderedDict()
+        for name, values, times in zip(names, raw_values, raw_times):
+            if isinstance(values, np.ndarray):
+                # Packed lags are views of what was read, so need no conversion
+                lagged[name] = (times, values) if as_array else (
+                    times.tolist(), values.tolist()
+                )
+            elif as_array:
+                lagged[name] = self._lagged_array(times), self._lagged_array(values)
+            else:
+                lagged[name] = self._lagged_lists(
+                    raw_times=times, raw_values=values, to_float=True
+                )
+        return lagged
+
+    def _pipe_packed_lag(self, pipe, name, t, value, lag_len, ttl):
+        if self._append_lag_script is None:
+            self._append_lag_script = self.client.register_script(
+                self._APPEND_LAG_SCRIPT
+            )
+        self._append_lag_script(
+            keys=[self.lagged_packed_name(name)],
+            args=[self.pack_lag(t=t, value=value), lag_len + 1,
+                  self.LAGGED_RECORD.size, ttl],
+            client=pipe
+        )
+        return pipe
+
+    def _pipe_lagged(self, pipe, name, end):
+        """ Lags 0..end from both the packed string and the lists
+              (Packed lags are read undecoded, which needs a pipeline without MULTI)
+        """
+        first, last = self.lagged_packed_range(start=0, end=end)
+        pipe.execute_command(
+            'GETRANGE', self.lagged_packed_name(name), first, last,
+            **{NEVER_DECODE: []}
+        )
+        pipe.lrange(self.lagged_values_name(name), start=0, end=end)
+        pipe.lrange(self.lagged_times_name(name=name), start=0, end=end)
+        return pipe
+
+    def _lagged_from_execution(self, results, start, end):
+        """ times, values  of lags start..end from the results of _pipe_lagged(), most
+            recent first: float64 arrays if only packed lags were found, otherwise lists
+            of strings from the lists, mixed with floats if there were packed lags too
+        """
+        raw, raw_values, raw_times = results
+        times, values = self.unpack_lags(raw)
+        if not len(times):
+            times, values = raw_times, raw_values
+        elif raw_times:
+            times, values = self.merge_lags(
+                times=times, values=values, raw_times=raw_times, raw_values=raw_values
+            )
+        return times[start:end + 1], values[start:end + 1]
+
+    def _lagged_lists(self, raw_times, raw_values, to_float):
+        """ Lists of floats from _lagged_from_execution(), or of strings as stored """
+        if not to_float:
+            return self._lagged_strings(raw_times), self._lagged_strings(raw_values)
+        if isinstance(raw_values, np.ndarray):
+            values = raw_values.tolist()  # Packed lags are already float
+        else:
+            try:
+                values = self.to_float(raw_values) if len(raw_values) else []
+            except BaseException:
+                values = list(raw_values)
+        if isinstance(raw_times, np.ndarray):
+            times = raw_times.tolist()
+        else:
+            times = self.to_float(raw_times) if len(raw_times) else []
+        return times, values
+
+    @staticmethod
+    def _lagged_strings(raw):
+        """ Packed lags formatted as redis would store the float, e.g. '3.0' """
+        raw = raw.tolist() if isinstance(raw, np.ndarray) else raw
+        return [v if isinstance(v, str) else repr(v) for v in raw]
+
+    @staticmethod
+    def _lagged_array(raw):
+        """ float64 array from strings, with nan for anything that is not a number """
+        try:
+            return np.asarray(raw, dtype=float)
+        except (ValueError, TypeError):
+            def as_float(v):
+                try:
+                    return float(v)
+                except (ValueError, TypeError):
+                    return np.nan
+            return np.fromiter((as_float(v) for v in raw), dtype=float, count=len(raw))
+
     def _get_delayed_implementation(self, name, delay=None, delays=None, to_float=True):
         """ Get delayed values from one or more names """
         singular = delays is None
@@ -0,0 +1,210 @@
+from predictionserver.servermixins.baseserver import BaseServer
+import math
+
+# Leaderboard scores are stored divided by a per-leaderboard scale, so that shrinking
+# a leaderboard changes one number instead of rewriting the sorted set. The log of the
+# scale is kept in a hash keyed by leaderboard name (absent means a scale of 1), so
+# shrinkage is a single HINCRBYFLOAT:
+#
+#      score = stored score * exp(log scale)
+#
+# Increments are divided by the scale as they are written, atomically by script where
+# the server supports scripting. Once the scale has drifted by more than a factor of
+# exp(_LEADERBOARD_DRIFT) the stored scores are rewritten and the scale reset, which
+# admin_shrinkage does in the background. That pass walks the hash with HSCAN and
+# forgets the scales of leaderboards that have since expired, so the hash does not
+# outgrow the leaderboards that are left.
+#
+# Without scripting the scale is read before increments are sent, so an increment
+# that races a renormalization can be mis-scaled. Use a server with scripting.
+
+
+class LeaderboardScaleServer(BaseServer):
+
+    # Add ARGV pairs (code, amount) to leaderboard KEYS[2], divided by its scale
+    _INCREMENT_SCRIPT = """
+    local scale = math.exp(tonumber(redis.call('HGET', KEYS[1], KEYS[2]) or '0'))
+    for i = 1, #ARGV, 2 do
+        redis.call('ZINCRBY', KEYS[2], string.format('%.17g', ARGV[i + 1] / scale),
+                   ARGV[i])
+    end
+    return #ARGV / 2
+    """
+
+    # Fold the scale of leaderboard KEYS[2] into its scores, if it has drifted ARGV[1]
+    _RENORMALIZE_SCRIPT = """
+    local log_scale = tonumber(redis.call('HGET', KEYS[1], KEYS[2]) or '0')
+    if math.abs(log_scale) < tonumber(ARGV[1]) then
+        return 0
+    end
+    local ttl = redis.call('PTTL', KEYS[2])
+    redis.call('ZUNIONSTORE', KEYS[2], 1, KEYS[2], 'WEIGHTS',
+               string.format('%.17g', math.exp(log_scale)))
+    redis.call('HDEL', KEYS[1], KEYS[2])
+    if ttl > 0 then
+        redis.call('PEXPIRE', KEYS[2], ttl)
+    end
+    return 1
+    """
+
+    # Forget the scale of leaderboard KEYS[2], unless it has been written since
+    _FORGET_SCALE_SCRIPT = """
+    if redis.call('EXISTS', KEYS[2]) == 1 then
+        return 0
+    end
+    return redis.call('HDEL', KEYS[1], KEYS[2])
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._LEADERBOARD_DRIFT = math.log(1e6)  # Renormalize beyond this log scale
+        self._increment_script = None
+        self._renormalize_script = None
+        self._forget_scale_script = None
+        self._SCALE_SCAN_COUNT = 500  # Leaderboards checked per pipeline
+
+    # ------------------- #
+    #   Implementation    #
+    # ------------------- #
+
+    def _pipe_leaderboard_scales(self, pipe, leaderboard_names):
+        pipe.hmget(self._LEADERBOARD_SCALES(), *leaderboard_names)
+        return pipe
+
+    @staticmethod
+    def _leaderboard_scales_from_execution(log_scales):
+        """ Multipliers for stored scores, from the result of hmget """
+        return [math.exp(float(log_scale or 0.)) for log_scale in log_scales]
+
+    def _leaderboard_scales(self, leaderboard_names):
+        if not leaderboard_names:
+            return list()
+        return self._leaderboard_scales_from_execution(
+            self.client.hmget(self._LEADERBOARD_SCALES(), *leaderboard_names)
+        )
+
+    def _pipe_leaderboard_increments(self, pipe, increments):
+        """ Add to leaderboard scores, allowing for their scales
+              increments   {leaderboard_name: {code: amount}}
+        """
+        if self.has_capability('scripting'):
+            if self._increment_script is None:
+                self._increment_script = self.client.register_script(
+                    self._INCREMENT_SCRIPT
+                )
+            for leaderboard_name, amounts in increments.items():
+                self._increment_script(
+                    keys=[self._LEADERBOARD_SCALES(), leaderboard_name],
+                    args=[x for code, amount in amounts.items()
+                          for x in (code, float(amount))],
+                    client=pipe
+                )
+            return pipe
+
+        leaderboard_names = list(increments)
+        scales = self._leaderboard_scales(leaderboard_names)
+        for leaderboard_name, scale in zip(leaderboard_names, scales):
+            for code, amount in increments[leaderboard_name].items():
+                pipe.zincrby(name=leaderboard_name, value=code, amount=amount / scale)
+        return pipe
+
+    def _pipe_leaderboard_shrinkage(self, pipe, leaderboard_name, weight):
+        """ Multiply all scores by weight, in constant time """
+        pipe.hincrbyfloat(
+            name=self._LEADERBOARD_SCALES(), key=leaderboard_name, amount=math.log(weight)
+        )
+        return pipe
+
+    def _pipe_forget_leaderboard_scale(self, pipe, leaderboard_name):
+        pipe.hdel(self._LEADERBOARD_SCALES(), leaderboard_name)
+        return pipe
+
+    def _drifted_leaderboards(self):
+        """ Drifted leaderboards, forgetting the scales of any that no longer exist """
+        drifted = list()
+        batch = list()
+        for leaderboard_name, log_scale in self.client.hscan_iter(
+                self._LEADERBOARD_SCALES(), count=self._SCALE_SCAN_COUNT
+        ):
+            batch.append((leaderboard_name, log_scale))
+            if len(batch) >= self._SCALE_SCAN_COUNT:
+                drifted.extend(self._drifted_from_batch(batch))
+                batch = list()
+        drifted.extend(self._drifted_from_batch(batch))
+        return drifted
+
+    def _drifted_from_batch(self, batch):
+        if not batch:
+            return list()
+        exists_pipe = self.client.pipeline(transaction=False)
+        for leaderboard_name, _ in batch:
+            exists_pipe.exists(leaderboard_name)
+        drifted = list()
+        for (leaderboard_name, log_scale), exists in zip(batch, exists_pipe.execute()):
+            if not exists:
+                self._forget_expired_leaderboard_scale(leaderboard_name)
+            elif abs(float(log_scale)) >= self._LEADERBOARD_DRIFT:
+                drifted.append(leaderboard_name)
+        return drifted
+
+    def _forget_expired_leaderboard_scale(self, leaderboard_name):
+        """ Remove the scale of a leaderboard that has expired or been deleted
+            :returns  bool  True if the scale was removed
+        """
+        if self.has_capability('scripting'):
+            if self._forget_scale_script is None:
+                self._forget_scale_script = self.client.register_script(
+                    self._FORGET_SCALE_SCRIPT
+                )
+            return bool(self._forget_scale_script(
+                keys=[self._LEADERBOARD_SCALES(), leaderboard_name]
+            ))
+
+        # Without scripting, watch the scores so a new increment keeps its scale
+        def _forget(pipe):
+            if pipe.exists(leaderboard_name):
+                return False
+            pipe.multi()
+            pipe.hdel(self._LEADERBOARD_SCALES(), leaderboard_name)
+            return True
+
+        return self.client.transaction(
+            _forget, self._LEADERBOARD_SCALES(), leaderboard_name,
+            value_from_callable=True
+        )
+
+    def _renormalize_leaderboard(self, leaderboard_name):
+        """ Fold the scale into the stored scores if it has drifted
+            :returns  bool  True if scores were rewritten
+        """
+        if self.has_capability('scripting'):
+            if self._renormalize_script is None:
+                self._renormalize_script = self.client.register_script(
+                    self._RENORMALIZE_SCRIPT
+                )
+            return bool(self._renormalize_script(
+                keys=[self._LEADERBOARD_SCALES(), leaderboard_name],
+                args=[self._LEADERBOARD_DRIFT]
+            ))
+
+        # Without scripting, watch the scale and the scores instead
+        def _renormalize(pipe):
+            log_scale = float(
+                pipe.hget(self._LEADERBOARD_SCALES(), leaderboard_name) or 0.
+            )
+            if abs(log_scale) < self._LEADERBOARD_DRIFT:
+                return False
+            ttl = pipe.pttl(leaderboard_name)
+            pipe.multi()
+            pipe.zunionstore(dest=leaderboard_name, keys={
+                leaderboard_name: math.exp(log_scale)
+            })
+            pipe.hdel(self._LEADERBOARD_SCALES(), leaderboard_name)
+            if ttl > 0:
+                pipe.pexpire(leaderboard_name, ttl)
+            return True
+
+        return self.client.transaction(
+            _renormalize, self._LEADERBOARD_SCALES(), leaderboard_name,
+            value_from_callable=True
+        )
@@ -10,12 +10,12 @@ from predictionserver.servermixins.ownershipserver import OwnershipServer
 from pprint import pprint
 from collections import OrderedDict
 from typing import Union
-import random
 from microconventions import MicroConventions
 from predictionserver.servermixins.memoserver import MemoServer
+from predictionserver.servermixins.leaderboardscaleserver import LeaderboardScaleServer
 
 
-class LeaderboardServer(LeaderboardHabits, MemoServer):
+class LeaderboardServer(LeaderboardHabits, MemoServer, LeaderboardScaleServer):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -129,16 +129,20 @@ class LeaderboardServer(LeaderboardHabits, MemoServer):
 
     def __incr_leaderboard(self, pipe, leaderboard_name, code, amount):
         code = MicroConventions.code_from_code_or_key(code_or_key=code)
-        amount = float(amount)
-        pipe.zincrby(name=leaderboard_name, value=code, amount=amount)
-        return pipe
+        return self._pipe_leaderboard_increments(
+            pipe=pipe, increments={leaderboard_name: {code: float(amount)}}
+        )
 
     def _delete_leaderboard_implementation(self, granularity, name, **kwargs):
-        return self.client.delete(
-            self.leaderboard_name(
-                leaderboard_granularity=granularity, name=name, **kwargs
-            )
+        leaderboard_name = self.leaderboard_name(
+            leaderboard_granularity=granularity, name=name, **kwargs
         )
+        delete_pipe = self.client.pipeline(transaction=True)
+        delete_pipe.delete(leaderboard_name)
+        self._pipe_forget_leaderboard_scale(
+            pipe=delete_pipe, leaderboard_name=leaderboard_name
+        )
+        return delete_pipe.execute()[0]
 
     def _get_leaderboard_implementation(
             self, granularity, count, readable=True, with_repos=False, **kwargs
@@ -152,32 +156,30 @@ class LeaderboardServer(LeaderboardHabits, MemoServer):
         )
 
     def _get_leaderboard_from_name(self, leaderboard_name, with_repos, count, readable):
-        leaderboard = list(
-            reversed(
-                self.client.zrange(
-                    name=leaderboard_name,
-                    start=-count,
-                    end=-1,
-                    withscores=True
-                )
-            )
-        )
+        read_pipe = self.client.pipeline(transaction=True)
+        read_pipe.zrange(name=leaderboard_name, start=-count, end=-1, withscores=True)
+        self._pipe_leaderboard_scales(pipe=read_pipe, leaderboard_names=[leaderboard_name])
+        stored, log_scales = read_pipe.execute()
+        scale = self._leaderboard_scales_from_execution(log_scales)[0]
+        leaderboard = [(code, scale * score) for code, score in reversed(stored)]
         if with_repos:
             return self._get_leaderboard_implementation_with_repos(leaderboard, readable)
-        return OrderedDict([
-            (MicroConventions.animal_from_code(code), score)
-            for code, score in leaderboard
-        ]) if readable else dict(leaderboard)
+        if readable:
+            animals = self.animals_from_codes([code for code, _ in leaderboard])
+            return OrderedDict([
+                (animal, score) for animal, (_, score) in zip(animals, leaderboard)
+            ])
+        return dict(leaderboard)
 
     def _get_leaderboard_implementation_with_repos(self, leaderboard, readable):
         hash_to_url_dict = self.client.hgetall(name=self._REPOS)
-        return OrderedDict([
-            (
-                MicroConventions.animal_from_code(code),
-                (score, hash_to_url_dict.get(code, None))
-            )
-            for code, score in leaderboard
-        ]) if readable else dict([
+        if readable:
+            animals = self.animals_from_codes([code for code, _ in leaderboard])
+            return OrderedDict([
+                (animal, (score, hash_to_url_dict.get(code, None)))
+                for animal, (code, score) in zip(animals, leaderboard)
+            ])
+        return dict([
             (code, (score, hash_to_url_dict.get(code, None)))
             for code, score in leaderboard
         ])
@@ -193,11 +195,10 @@ class LeaderboardServer(LeaderboardHabits, MemoServer):
     ):
         leaderboard_name = self.leaderboard_name(granularity=granularity, **kwargs)
         if leaderboard_name is not None:
-            temporary_key = 'temporary_' + \
-                ''.join([random.choice(['a', 'b', 'c']) for _ in range(20)])
             shrink_pipe = self.client.pipeline(transaction=True)
-            shrink_pipe.zunionstore(dest=temporary_key, keys={leaderboard_name: weight})
-            shrink_pipe.zunionstore(dest=leaderboard_name, keys={temporary_key: 1})
+            self._pipe_leaderboard_shrinkage(
+                pipe=shrink_pipe, leaderboard_name=leaderboard_name, weight=weight
+            )
             exec = shrink_pipe.execute()
             return {leaderboard_name: exec}
 
@@ -205,16 +206,15 @@ class LeaderboardServer(LeaderboardHabits, MemoServer):
     #   daemon tasks    #
     # ----------------- #
 
-    def admin_shrinkage(self):
-        """ Scale leaderboard scores towards zero """
-        lb_name = self.client.rpop(self._SHRINK_QUEUE)
-        kwargs = self.leaderboard_name_as_dict(leaderboard_name=lb_name)
-        weight = 1. - self.SHRINKAGE
-        execution = self._scale_leaderboard_implementation(weight=weight, **kwargs)
-        memo = self.add_announcement_of_shrinkage(
-            leaderboard_name=lb_name, execution=execution, weight=weight
-        )
-        return memo
+    def admin_shrinkage(self, with_report=False):
+        """ Rewrite the scores of leaderboards whose scale factors have drifted
+            (Shrinkage itself happens as payments are made, in constant time)
+        """
+        report = dict([
+            (leaderboard_name, self._renormalize_leaderboard(leaderboard_name))
+            for leaderboard_name in self._drifted_leaderboards()
+        ])
+        return report if with_report else sum(report.values())
 
 
 class LeaderboardMigrationServer(LeaderboardServer, OwnershipServer, MemoServer):
@@ -264,43 +264,6 @@ class LeaderboardMigrationServer(LeaderboardServer, OwnershipServer, MemoServer)
         )
         pprint(new_retrieved)
 
-        # ---------------------------- #
-        #    Backward compatibility    #
-        # ---------------------------- #
-
-    @staticmethod
-    def old_lb_cat(name=None):
-        if name is not None:
-            if 'z1~' in name:
-                return 'zscores_univariate'
-            elif 'z2~' in name:
-                return 'zcurves_bivariate'
-            elif 'z3~' in name:
-                return 'zcurves_trivariate'
-            else:
-                return 'regular'
-        else:
-            return 'all_streams'
-
-    def old_custom_leaderboard_name(self, sponsor, name=None, dt=None):
-        """ Names for leaderboards with a given sponsor
-        :param animal:  str
-        :param name:     str
-        :param dt:       datetime
-        :return:
-        """
-
-        def __init__(**kwargs):
-            super().__init__(**kwargs)
-            self.CUSTOM_LEADERBOARD = 'CUSTOM_LEADERBOARD' + self.SEP
-
-        def lb_month(dt=None):
-            return dt.isoformat()[:7] if dt is not None else 'all_time'
-
-        sponsor = sponsor or 'overall'
-        return self.SEP.join([self.CUSTOM_LEADERBOARD[:-2], sponsor,
-                              self.old_lb_cat(name), lb_month(dt)]) + '.json'
-
 
 if __name__ == '__main__':
     from predictionserver.collider_config_private import (
@@ -73,7 +73,7 @@ class LinkServer(MemoServer):
         assert target == target_root
         if self._authorize(name=root, write_key=write_key):
             link_pipe = self.client.pipeline()
-            link_pipe.stream_exists(*targets)
+            link_pipe.exists(*targets)
             edge_weight = 1.0  # May change in the future
             for target in targets:
                 link_pipe.hset(
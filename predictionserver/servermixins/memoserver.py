@@ -2,8 +2,12 @@ from predictionserver.futureconventions.memoconventions import (
     Memo, MemoCategory, MemoGranularity, Activity, ActivityContext, PublicActor
 )
 from predictionserver.servermixins.baseserver import BaseServer
+from predictionserver.servermixins.memosink import MemoSink
+from predictionserver.servermixins.bufferedsink import SinkFlusher, flush_at_exit
 from predictionserver.serverhabits.memohabits import MemoImplementation, PrivateActor
+from collections import OrderedDict
 import json
+import threading
 from pprint import pprint
 
 
@@ -11,6 +15,52 @@ class MemoServer(BaseServer):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.memo_sink = None  # See enable_memo_sink()
+        self._memo_flusher = None
+        self._memo_flush_lock = threading.Lock()
+
+    def enable_memo_sink(self, enable=True, flush_size=500, flush_seconds=1.0,
+                         confirm_sample_rate=1.0, sample_above=None, background=True):
+        """ Buffer memos in process and write them in batches
+              confirm_sample_rate   Fraction of confirms kept when busy (see MemoSink)
+              background            Flush on a timer thread, not only when memos arrive
+            (Replacing or disabling the sink flushes whatever it holds, as does exit.)
+        """
+        if self._memo_flusher is not None:
+            self._memo_flusher.stop()
+            self._memo_flusher = None
+        self.flush_memos()
+        self.memo_sink = MemoSink(
+            flush_size=flush_size,
+            flush_seconds=flush_seconds,
+            confirm_sample_rate=confirm_sample_rate,
+            sample_above=sample_above
+        ) if enable else None
+        if enable:
+            flush_at_exit(self.flush_memos)
+        if enable and background:
+            self._memo_flusher = SinkFlusher(
+                sink=self.memo_sink, flush=self.flush_memos, description='Memos'
+            )
+
+    def flush_memos(self):
+        """ Write whatever the memo sink holds, in one pipeline
+            :returns  number of entries written
+        """
+        with self._memo_flush_lock:
+            pending = self.memo_sink.drain() if self.memo_sink is not None else None
+            if not pending:
+                return 0
+            pipe = self.client.pipeline(transaction=False)
+            for log_name, (ttl, limit, entries) in pending.items():
+                pipe = self._pipe_memo_log(
+                    pipe=pipe, log_name=log_name, ttl=ttl, limit=limit, entries=entries
+                )
+            pipe.execute()
+            return sum(len(entries) for _, _, entries in pending.values())
+
+    def get_memo_sink_stats(self):
+        return self.memo_sink.stats() if self.memo_sink is not None else OrderedDict()
 
         # ------------------- #
         #   Getters           #
@@ -21,6 +71,8 @@ class MemoServer(BaseServer):
     ):
         json_memos = self.get_memos_json(
             category=category, granularity=granularity, **kwargs)
+        if self.MEMO_IMPLEMENTATIONS[category] == MemoImplementation.redis_stream:
+            return [self.expand_transaction(fields) for _, fields in json_memos]
         return [json.loads(jm) for jm in json_memos]
 
     def get_memos_json(
@@ -60,6 +112,16 @@ class MemoServer(BaseServer):
             delay=delay
         )
 
+    def get_transactions(self, write_key=None, name=None, delay=None, count=1000):
+        """ Settlement transactions, most recent first, overall or by owner, stream
+            and delay (compact records are expanded)
+        """
+        log_name = self.transactions_name(write_key=write_key, name=name, delay=delay)
+        return [
+            self.expand_transaction(fields) for _, fields in
+            self.client.xrevrange(name=log_name, max='+', min='-', count=count)
+        ]
+
     def get_system_memos(self, category: MemoCategory, private_actor: PrivateActor):
         return self.get_memos(
             category=category,
@@ -137,11 +199,12 @@ class MemoServer(BaseServer):
             public_actor=PublicActor.announcer)
 
     def add_memo_as_owner_error(self, memo: Memo, success=0, allowed=None, execution=None):
-        return self.execute_one(method=self._pipe_add_memo_as_owner_error, allowed=allowed,
-                                memo=memo, success=success, execution=execution)
+        return self._execute_memos(method=self._pipe_add_memo_as_owner_error,
+                                   allowed=allowed, memo=memo, success=success,
+                                   execution=execution)
 
     def add_memo_as_owner_confirm(self, memo: Memo, success=1, allowed=1, execution=None):
-        return self.execute_one(
+        return self._execute_memos(
             method=self._pipe_add_memo_as_owner_confirm,
             allowed=allowed,
             memo=memo,
@@ -154,7 +217,7 @@ class MemoServer(BaseServer):
             success=0,
             allowed=None,
             execution=None):
-        return self.execute_one(
+        return self._execute_memos(
             method=self._pipe_add_memo_as_owner_warning,
             allowed=allowed,
             memo=memo,
@@ -163,12 +226,12 @@ class MemoServer(BaseServer):
             message=None)
 
     def add_memo_as_owner_and_horizon_transaction(self, memo: Memo):
-        return self.execute_one(
+        return self._execute_memos(
             method=self._pipe_add_memo_as_owner_and_horizon_transaction,
             memo=memo)
 
     def add_memo_as_owner_alert(self, memo: Memo):
-        return self.execute_one(
+        return self._execute_memos(
             method=self._pipe_add_memo_as_owner_alert,
             memo=memo,
             write_key=None)
@@ -188,7 +251,7 @@ class MemoServer(BaseServer):
             memo: Memo,
             private_actor: PrivateActor,
             category: MemoCategory):
-        self.execute_one(
+        self._execute_memos(
             method=self.__add_system_memo,
             memo=memo,
             private_actor=private_actor,
@@ -240,14 +303,19 @@ class MemoServer(BaseServer):
                 memo=memo,
                 category=category,
                 granularity=granularity)
-        return pipe.execute(raise_on_error=True)
+        return self._execute_memo_pipe(pipe)
+
+    def _execute_memos(self, method, **kwargs):
+        """ Like execute_one(), except that the memo sink may have taken the memos """
+        return self._execute_memo_pipe(method(pipe=self.client.pipeline(), **kwargs))[0]
 
-    def _sanitize_dict(self, d: dict):
-        for f1, f2 in Memo._SANITIZE_FIELDS.items():
-            if f1 in d and d[f1] is not None:
-                d[f2] = self.code_from_code_or_key(code_or_key=d[f1])
-                del(d[f1])
-        return d
+    def _execute_memo_pipe(self, pipe):
+        """ :returns  execution, or [1] if memos went to the sink instead """
+        if self.memo_sink is None:
+            return pipe.execute(raise_on_error=True)
+        if self.memo_sink.due():
+            self.flush_memos()
+        return [1]
 
     def __add_memo(
             self,
@@ -256,14 +324,21 @@ class MemoServer(BaseServer):
             category: MemoCategory,
             granularity: MemoGranularity,
             **kwargs):
+        if self.memo_sink is not None and not self.memo_sink.admit(
+                confirm=category == MemoCategory.confirm):
+            return pipe
         imp_type = self.MEMO_IMPLEMENTATIONS[category]
         ttl = self.MEMO_TTLS[category]
         limit = self.MEMO_LIMITS[category]
-        dmemo = memo.as_dict(cast_to_str=True, leave_out_none=True, flatten_data=True)
         location_new = self.memo_location(
-            category=category, granularity=granularity, **dmemo)
+            category=category,
+            granularity=granularity,
+            **dict([(k, memo.get(k)) for k in granularity.split()])
+        )
         location_old = self.memo_location_old(memo=memo, category=category, **kwargs)
-        dmemo = self._sanitize_dict(dmemo)
+        entry = self._sanitize_list_log_entry(
+            memo.as_bytes(code_from_key=self.code_from_code_or_key)
+        )
         if imp_type == MemoImplementation.redis_list:
             if location_old:
                 pipe = self.__log_to_list(
@@ -271,23 +346,33 @@ class MemoServer(BaseServer):
                     log_name=location_old,
                     ttl=ttl,
                     limit=limit,
-                    **dmemo)
+                    entry=entry)
             pipe = self.__log_to_list(
                 pipe=pipe,
                 log_name=location_new,
                 ttl=ttl,
                 limit=limit,
-                **dmemo)
+                entry=entry)
         elif imp_type == MemoImplementation.redis_stream:
             raise NotImplementedError  #
         return pipe
 
-    def _sanitize_list_log_entry(self, s: str):
-        return s.replace(self.obscurity(), 'OBSCURE')
+    def _sanitize_list_log_entry(self, s: bytes):
+        return s.replace(self.obscurity().encode(), b'OBSCURE')
+
+    def __log_to_list(self, pipe, log_name, ttl, limit, entry):
+        """ Append to list style log, or to the memo sink """
+        if self.memo_sink is not None:
+            self.memo_sink.append(log_name=log_name, entry=entry, ttl=ttl, limit=limit)
+            return pipe
+        return self._pipe_memo_log(
+            pipe=pipe, log_name=log_name, ttl=ttl, limit=limit, entries=[entry]
+        )
 
-    def __log_to_list(self, pipe, log_name, ttl, limit, **kwargs):
-        """ Append to list style log """
-        pipe.lpush(log_name, self._sanitize_list_log_entry(json.dumps(kwargs)))
+    @staticmethod
+    def _pipe_memo_log(pipe, log_name, ttl, limit, entries):
+        """ Entries oldest first, so the newest ends up at the head of the list """
+        pipe.lpush(log_name, *entries)
         pipe.expire(log_name, ttl)
         pipe.ltrim(log_name, start=0, end=limit)
         return pipe
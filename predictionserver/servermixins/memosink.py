@@ -0,0 +1,64 @@
+from predictionserver.servermixins.bufferedsink import BufferedSink
+import random
+
+
+# An optional in-process buffer for memo logs, so that memos from many calls are
+# written in one pipeline: one lpush, expire and ltrim per log rather than per memo.
+#
+# The buffer is drained once it holds flush_size entries (a memo may be logged in
+# more than one place), or once the oldest has waited flush_seconds. Entries sit in
+# process memory until then, so a crash loses at most that much logging.
+#
+# Under load (more than sample_above memos arriving within one flush window) confirms,
+# which are the least valuable memos, are kept with probability confirm_sample_rate.
+
+
+class MemoSink(BufferedSink):
+
+    def __init__(self, flush_size=500, flush_seconds=1.0, confirm_sample_rate=1.0,
+                 sample_above=None):
+        super().__init__(
+            flush_size=flush_size, flush_seconds=flush_seconds,
+            counters=('entries', 'sampled_out', 'logs_written')
+        )
+        self.confirm_sample_rate = confirm_sample_rate
+        self.sample_above = flush_size // 2 if sample_above is None else sample_above
+        self._num_pending = 0  # Entries, whereas _pending is keyed by log_name
+        self._window_arrivals = 0
+
+    def _size(self):
+        return self._num_pending
+
+    def admit(self, confirm):
+        """ Whether to log a memo, sampling confirms when busy """
+        with self._lock:
+            self._window_arrivals += 1
+            if confirm and self._window_arrivals > self.sample_above \
+                    and random.random() >= self.confirm_sample_rate:
+                self.counters['sampled_out'] += 1
+                return False
+            return True
+
+    def append(self, log_name, entry, ttl, limit):
+        """ :returns  True if the buffer should now be flushed """
+        with self._lock:
+            self._arrived()
+            if log_name not in self._pending:
+                self._pending[log_name] = (ttl, limit, list())
+            self._pending[log_name][2].append(entry)
+            self._num_pending += 1
+            self.counters['entries'] += 1
+            return self._due()
+
+    def drain(self):
+        """ Take everything pending
+            :returns  {log_name: (ttl, limit, [entry])}  entries oldest first
+        """
+        return super().drain()
+
+    def _count_drained(self, pending):
+        self.counters['logs_written'] += len(pending)
+
+    def _reset(self):
+        self._num_pending = 0
+        self._window_arrivals = 0
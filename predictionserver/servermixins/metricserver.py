@@ -1,12 +1,68 @@
 from predictionserver.serverhabits.metrichabits import MetricType, MetricGranularity
 from predictionserver.servermixins.memoserver import MemoServer
 from predictionserver.servermixins.ownershipserver import OwnershipServer
+from predictionserver.servermixins.metricsink import MetricSink
+from predictionserver.servermixins.bufferedsink import SinkFlusher, flush_at_exit
+from collections import OrderedDict
+import threading
 
 
 class MetricServer(MemoServer, OwnershipServer):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.metric_sink = None  # See enable_metric_sink()
+        self._metric_flusher = None
+        self._metric_flush_lock = threading.Lock()
+
+    def enable_metric_sink(self, enable=True, flush_size=1000, flush_seconds=1.0,
+                           background=True):
+        """ Accumulate incr_metric() and set_metric() in process and write them in batches
+              flush_size            Distinct fields held before writing
+              background            Flush on a timer thread, not only when metrics arrive
+            (Replacing or disabling the sink flushes whatever it holds, as does exit.)
+        """
+        if self._metric_flusher is not None:
+            self._metric_flusher.stop()
+            self._metric_flusher = None
+        self.flush_metrics()
+        self.metric_sink = MetricSink(
+            flush_size=flush_size, flush_seconds=flush_seconds
+        ) if enable else None
+        if enable:
+            flush_at_exit(self.flush_metrics)
+        if enable and background:
+            self._metric_flusher = SinkFlusher(
+                sink=self.metric_sink, flush=self.flush_metrics, description='Metrics'
+            )
+
+    def flush_metrics(self):
+        """ Write whatever the metric sink holds, one write per field, in one pipeline
+            :returns  number of fields written
+        """
+        with self._metric_flush_lock:
+            pending = self.metric_sink.drain() if self.metric_sink is not None else None
+            if not pending:
+                return 0
+            pipe = self.client.pipeline(transaction=False)
+            for (location, key), (op, amount) in pending.items():
+                if op == 'set':
+                    pipe.hset(name=location, key=key, value=amount)
+                else:
+                    pipe.hincrbyfloat(name=location, key=key, amount=amount)
+            pipe.execute()
+            return len(pending)
+
+    def get_metric_sink_stats(self):
+        """ Counters, and staleness: how long the oldest pending update has waited.
+            With a background flusher redis lags by at most staleness_bound seconds.
+        """
+        if self.metric_sink is None:
+            return OrderedDict()
+        stats = self.metric_sink.stats()
+        stats['staleness_bound'] = 1.25 * self.metric_sink.flush_seconds \
+            if self._metric_flusher is not None else None
+        return stats
 
     def get_metric(
             self,
@@ -32,6 +88,14 @@ class MetricServer(MemoServer, OwnershipServer):
     # ---------------- #
 
     def incr_metric(self, metric, granularity, amount, **kwargs):
+        """ :returns  new value, or 1 if the metric sink took the increment """
+        if self.metric_sink is not None:
+            location, key = self._metric_location_and_key(
+                metric=metric, granularity=granularity, **kwargs
+            )
+            if self.metric_sink.incr(location=location, key=key, amount=amount):
+                self.flush_metrics()
+            return 1
         return self.execute_one(
             method=self._pipe_incr_metric,
             metric=metric,
@@ -47,6 +111,13 @@ class MetricServer(MemoServer, OwnershipServer):
             value: float,
             **kwargs
     ):
+        if self.metric_sink is not None:
+            location, key = self._metric_location_and_key(
+                metric=metric, granularity=granularity, **kwargs
+            )
+            if self.metric_sink.set(location=location, key=key, value=value):
+                self.flush_metrics()
+            return 1
         _ = self.execute_one(
             method=self._pipe_set_metric,
             metric=metric,
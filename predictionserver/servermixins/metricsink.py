@@ -0,0 +1,57 @@
+from predictionserver.servermixins.bufferedsink import BufferedSink
+import time
+
+
+# An optional in-process accumulator for metrics, so that hot counters such as volume
+# and count cost one write per distinct (hash, field) per flush rather than one round
+# trip per event. Increments to the same field are summed, and a set replaces whatever
+# was pending for its field (later increments are added to it).
+#
+# The accumulator is drained once it holds flush_size distinct fields, or once the
+# oldest pending update has waited flush_seconds. Until then redis lags the process
+# by at most that long (plus the polling interval of a background flusher), and a
+# crash loses whatever is pending.
+
+_INCR = 'incr'
+_SET = 'set'
+
+
+class MetricSink(BufferedSink):
+
+    def __init__(self, flush_size=1000, flush_seconds=1.0):
+        super().__init__(
+            flush_size=flush_size, flush_seconds=flush_seconds,
+            counters=('updates', 'fields_written', 'max_staleness')
+        )
+        self.counters['max_staleness'] = 0.
+        # self._pending is {(location, key): (_INCR or _SET, amount)}
+
+    def incr(self, location, key, amount):
+        """ :returns  True if the accumulator should now be flushed """
+        with self._lock:
+            op, pending = self._pending.get((location, key), (_INCR, 0.))
+            self._pending[(location, key)] = (op, pending + float(amount))
+            return self._updated()
+
+    def set(self, location, key, value):
+        """ :returns  True if the accumulator should now be flushed """
+        with self._lock:
+            self._pending[(location, key)] = (_SET, value)
+            return self._updated()
+
+    def _updated(self):
+        self._arrived()
+        self.counters['updates'] += 1
+        return self._due()
+
+    def drain(self):
+        """ Take everything pending
+            :returns  {(location, key): ('incr' or 'set', amount)}
+        """
+        return super().drain()
+
+    def _count_drained(self, pending):
+        self.counters['fields_written'] += len(pending)
+        self.counters['max_staleness'] = max(
+            self.counters['max_staleness'], time.time() - self._opened
+        )
@@ -0,0 +1,110 @@
+from predictionserver.servermixins.baseserver import BaseServer
+import json
+import time
+
+# Optional push notifications over redis pub/sub, so that consumers need not poll.
+#
+# When enabled, every value written publishes to notifications::<name>
+#     {"kind":"value", "name":name, "value":value, "time":epoch_seconds}
+# and every mailbox update publishes to notifications::messages::<subscriber>
+#     {"kind":"messages", "name":subscriber, "messages":{sender:value}}
+# Values are strings, as they are stored. Pub/sub is fire and forget, so consumers
+# that disconnect should catch up with get() or get_messages() before listening again.
+
+
+class NotificationServer(BaseServer):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.notifications = False  # See enable_notifications()
+
+    def enable_notifications(self, enable=True):
+        """ Publish a notification whenever a value or mailbox changes """
+        self.notifications = enable
+
+    def listen(self, names=None, subscribers=None, timeout=None):
+        """ Generator yielding notifications as they arrive
+        :param names:        Streams whose values to follow
+        :param subscribers:  Streams whose mailboxes to follow
+                             (If neither names nor subscribers, follow everything)
+        :param timeout:      Stop after this many seconds without a notification
+        """
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._subscribe_notifications(pubsub=pubsub, names=names, subscribers=subscribers)
+        try:
+            deadline = self._notification_deadline(timeout)
+            while time.time() < deadline:
+                message = pubsub.get_message(timeout=min(1.0, deadline - time.time()))
+                if message is not None:
+                    yield self._notification_from_message(message)
+                    deadline = self._notification_deadline(timeout)
+        finally:
+            pubsub.close()
+
+    async def alisten(self, names=None, subscribers=None, timeout=None):
+        """ Async iterator version of listen(), using self.aclient """
+        aclient = getattr(self, 'aclient', None)
+        if aclient is None:
+            raise Exception('alisten() requires an asyncio client, see AsyncBaseServer')
+        pubsub = aclient.pubsub(ignore_subscribe_messages=True)
+        await self._subscribe_notifications(
+            pubsub=pubsub, names=names, subscribers=subscribers
+        )
+        try:
+            deadline = self._notification_deadline(timeout)
+            while time.time() < deadline:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=min(1.0, deadline - time.time())
+                )
+                if message is not None:
+                    yield self._notification_from_message(message)
+                    deadline = self._notification_deadline(timeout)
+        finally:
+            await pubsub.aclose()
+
+    # ------------------- #
+    #   Implementation    #
+    # ------------------- #
+
+    def _subscribe_notifications(self, pubsub, names, subscribers):
+        """ Returns whatever pubsub returns, so that async callers can await it """
+        if not names and not subscribers:
+            return pubsub.psubscribe(self.notifications_channel('*'))
+        channels = [self.notifications_channel(name) for name in names or []] + [
+            self.notifications_channel(self.messages_name(subscriber))
+            for subscriber in subscribers or []
+        ]
+        return pubsub.subscribe(*channels)
+
+    @staticmethod
+    def _notification_deadline(timeout):
+        # Subscription confirmations also come back as None, so wait on the clock
+        return float('inf') if timeout is None else time.time() + timeout
+
+    @staticmethod
+    def _notification_from_message(message):
+        return json.loads(message['data'])
+
+    def _pipe_value_notification(self, pipe, name, value, epoch_seconds):
+        pipe.publish(
+            self.notifications_channel(name),
+            json.dumps({
+                "kind": "value",
+                "name": name,
+                "value": str(value),
+                "time": epoch_seconds
+            })
+        )
+        return pipe
+
+    def _pipe_messages_notification(self, pipe, subscriber, messages):
+        pipe.publish(
+            self.notifications_channel(self.messages_name(subscriber)),
+            json.dumps({
+                "kind": "messages",
+                "name": subscriber,
+                "messages": dict((sender, str(value)) for sender, value in messages.items())
+            })
+        )
+        return pipe
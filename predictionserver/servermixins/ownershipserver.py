@@ -37,11 +37,12 @@ class OwnershipServer(BaseServer):
         return execution
 
     def get_names(self):
-        return list(self.client.smembers(self._NAMES))
+        return list(self.client.smembers(self._NAMES()))
 
     def get_sponsors(self):
         ownership = self.client.hgetall(self._OWNERSHIP())
-        obscured = [(name, self.animal_from_key(key)) for name, key in ownership.items()]
+        animals = self.animals_from_keys(list(ownership.values()))
+        obscured = list(zip(ownership.keys(), animals))
         obscured.sort(key=lambda t: len(t[1]))
         return OrderedDict(obscured)
 
@@ -68,10 +69,10 @@ class OwnershipServer(BaseServer):
         return self.client.hmget(self._OWNERSHIP(), *names)
 
     def stream_count(self):
-        return self.client.scard(self._NAMES)
+        return self.client.scard(self._NAMES())
 
     def stream_exists(self, name):
-        return self.client.sismember(name=self._NAMES, value=name)
+        return self.client.sismember(name=self._NAMES(), value=name)
 
 
 if __name__ == '__main__':
@@ -1,42 +1,50 @@
 from predictionserver.servermixins.memoserver import MemoServer
 from predictionserver.servermixins.ownershipserver import OwnershipServer
 import time
-import itertools
+from logging import warning
 from redis.exceptions import DataError
 
 
 class PromiseDaemon(MemoServer, OwnershipServer):
 
+    # Atomically take up to ARGV[2] promises due at or before ARGV[1] off the queue
+    _CLAIM_SCRIPT = """
+    local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES',
+                           'LIMIT', 0, ARGV[2])
+    for i = 1, #due, 2 do
+        redis.call('ZREM', KEYS[1], due[i])
+    end
+    return due
+    """
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self._claim_script = None
+        self._legacy_promises_drained = False  # See _drain_legacy_promises()
 
-    def admin_promises(self, with_report=False):
-        """ Iterate through task queues populating delays and samples """
+    def admin_promises(self, with_report=False, shards=None, count=None):
+        """ Claim promises that have fallen due, populating delays and samples
 
-        # Find recent promise queues that exist
-        exists_pipe = self.client.pipeline()
+              shards   Subset of range(self._PROMISE_SHARDS) to work on, so that
+                       several daemons can run in parallel over disjoint shards
+              count    Maximum number of promises to claim per shard
+        """
         utc_epoch_now = int(time.time())
-        candidates = [
-            self._promise_queue_name(
-                epoch_seconds=utc_epoch_now - seconds
-            ) for seconds in range(self._DELAY_GRACE, -1, -1)
-        ]
-        for candidate in candidates:
-            exists_pipe.stream_exists(candidate)
-        exists = exists_pipe.execute()
-
-        # If they exist get the members
-        get_pipe = self.client.pipeline()
-        promise_collection_names = [
-            promise for promise, exist in zip(candidates, exists) if exists
+        if not self._legacy_promises_drained:
+            self._drain_legacy_promises(epoch_seconds=utc_epoch_now)
+            self._legacy_promises_drained = True
+        shards = range(self._PROMISE_SHARDS) if shards is None else shards
+        claimed = self._claim_promises(
+            promise_queues=[self._promise_queue_name(shard=shard) for shard in shards],
+            epoch_seconds=utc_epoch_now,
+            count=count
+        )
+        # Promises overdue by more than the grace period reference data that has
+        # already expired, as they would have done when queues were per-second
+        individual_promises = [
+            promise for promise, due in claimed
+            if due >= utc_epoch_now - self._DELAY_GRACE
         ]
-        for collection_name in promise_collection_names:
-            get_pipe.smembers(collection_name)
-        collections = get_pipe.execute()
-        # Immediately delete task list so it isn't done twice ... not that that would
-        self.client.delete(*promise_collection_names)
-        # be the end of the world
-        individual_promises = list(itertools.chain(*collections))
 
         # Sort through promises in reverse time precedence
         # In particular, we allow more recent copy instructions to override less
@@ -115,8 +123,105 @@ class PromiseDaemon(MemoServer, OwnershipServer):
             else:
                 raise Exception("bug - missing case ")
 
+        # Let readers of samples know they have changed (see ScenarioServer)
+        inserted = dict(
+            (destination, dict(value))
+            for value, destination, method in zip(source_values, destinations, methods)
+            if method == 'predict' and len(value)
+        )
+        for destination in inserted:
+            move_pipe.hincrby(name=self._SCENARIO_VERSIONS(), key=destination, amount=1)
         execut = move_pipe.execute()
+        if inserted:
+            versions = execut[-len(inserted):]
+            execut = execut[:-len(inserted)]
+            scenario_index = getattr(self, 'scenario_index', None)
+            if scenario_index is not None:
+                for (destination, mapping), version in zip(inserted.items(), versions):
+                    scenario_index.insert(
+                        name=destination, mapping=mapping, version=version
+                    )
         for record, ex in zip(execution_report, execut):
             record.update({"execution_result": ex})
 
         return sum(execut) if not with_report else execution_report
+
+    def _drain_legacy_promises(self, epoch_seconds):
+        """ Move promises out of the per-second sets used before queues were sharded,
+            so that none queued across the upgrade are lost. Sets due from the grace
+            period ago to the longest delay ahead are moved, keeping their due times.
+
+            Run by each daemon on its first call. Moving is idempotent, so daemons
+            may do so together, but writers must all be upgraded beforehand.
+              :returns  number of promises moved
+        """
+        seconds = range(
+            epoch_seconds - self._DELAY_GRACE, epoch_seconds + max(self.DELAYS) + 1
+        )
+        legacy_names = [self._legacy_promise_queue_name(epoch_seconds=s) for s in seconds]
+        read_pipe = self.client.pipeline(transaction=False)
+        for legacy_name in legacy_names:
+            read_pipe.smembers(legacy_name)
+        collections = read_pipe.execute()
+
+        move_pipe = self.client.pipeline(transaction=True)
+        moved = 0
+        for due, legacy_name, promises in zip(seconds, legacy_names, collections):
+            for promise in promises:
+                separators = [sep for sep in (self.COPY_SEP, self.PREDICTION_SEP)
+                              if sep in promise]
+                if not separators:
+                    warning('Dropped invalid legacy promise ' + promise)
+                    continue
+                promise_queue = self._promise_queue_name(
+                    shard=self._promise_shard(
+                        destination=promise.split(separators[0])[1]
+                    )
+                )
+                move_pipe.zadd(name=promise_queue, mapping={promise: due})
+                move_pipe.expire(name=promise_queue, time=self._promise_queue_ttl())
+                moved += 1
+            if promises:
+                move_pipe.delete(legacy_name)
+        if len(move_pipe):
+            move_pipe.execute()
+        return moved
+
+    def _claim_promises(self, promise_queues, epoch_seconds, count=None):
+        """ Remove and return [(promise, due)] due by epoch_seconds, oldest first
+            within each queue
+
+            Claims are atomic, so no promise is handed to two daemons.
+        """
+        num = -1 if count is None else int(count)
+        if self.has_capability('scripting'):
+            if self._claim_script is None:
+                self._claim_script = self.client.register_script(self._CLAIM_SCRIPT)
+            claim_pipe = self.client.pipeline(transaction=False)
+            for promise_queue in promise_queues:
+                self._claim_script(
+                    keys=[promise_queue], args=[epoch_seconds, num], client=claim_pipe
+                )
+            dues = claim_pipe.execute()
+            return [
+                (promise, float(score))
+                for due in dues for promise, score in zip(due[::2], due[1::2])
+            ]
+
+        # Without scripting (e.g. fakeredis), watch the queue instead
+        def _claim(pipe):
+            due = pipe.zrangebyscore(
+                name=promise_queue, min='-inf', max=epoch_seconds,
+                start=0, num=num, withscores=True
+            )
+            pipe.multi()
+            if due:
+                pipe.zrem(promise_queue, *[promise for promise, _ in due])
+            return due
+
+        claimed = list()
+        for promise_queue in promise_queues:
+            claimed.extend(
+                self.client.transaction(_claim, promise_queue, value_from_callable=True)
+            )
+        return claimed
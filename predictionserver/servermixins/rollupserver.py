@@ -0,0 +1,117 @@
+from predictionserver.servermixins.baseserver import BaseServer
+from predictionserver.futureconventions.laggedconventions import RollupResolution
+from typing import Union
+from collections import OrderedDict
+import numpy as np
+
+# Lags hold only the most recent values, so scalar values can also be rolled up as
+# they are written into minute, hour and day buckets of count, sum, min, max and last.
+# Each resolution is a sorted set per stream, scored by bucket start time, with one
+# member per bucket:
+#
+#      "bucket start,count,sum,min,max,last"
+#
+# A script replaces the member for the current bucket and drops buckets older than the
+# retention for that resolution, so get_rollup() reads at most a few hundred members.
+# Rollups live as long as the stream does.
+
+_ROLLUP_FIELDS = ('time', 'count', 'sum', 'min', 'max', 'last')
+
+
+class RollupServer(BaseServer):
+
+    # Roll value ARGV[2] at time ARGV[1] into KEYS (one per resolution), then per key
+    # ARGV holds bucket seconds and the number of buckets to keep. Empty values are
+    # ignored, so that every page costs the same number of operations.
+    _ROLLUP_SCRIPT = """
+    local t, value, ttl = tonumber(ARGV[1]), tonumber(ARGV[2]), ARGV[3]
+    if not value then
+        return 0
+    end
+    for i = 1, #KEYS do
+        local seconds, retention = tonumber(ARGV[2 + 2 * i]), tonumber(ARGV[3 + 2 * i])
+        local bucket = math.floor(t / seconds) * seconds
+        local count, total, low, high = 1, value, value, value
+        local existing = redis.call('ZRANGEBYSCORE', KEYS[i], bucket, bucket)
+        if #existing > 0 then
+            local _, c, s, lo, hi = string.match(
+                existing[1], '^([^,]*),([^,]*),([^,]*),([^,]*),([^,]*)')
+            count = tonumber(c) + 1
+            total = tonumber(s) + value
+            low = math.min(tonumber(lo), value)
+            high = math.max(tonumber(hi), value)
+            redis.call('ZREM', KEYS[i], existing[1])
+        end
+        redis.call('ZADD', KEYS[i], bucket, string.format(
+            '%.17g,%.17g,%.17g,%.17g,%.17g,%.17g', bucket, count, total, low, high, value))
+        redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', bucket - retention * seconds)
+        redis.call('EXPIRE', KEYS[i], ttl)
+    end
+    return 1
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.rollups = False  # See enable_rollups()
+        self._rollup_script = None
+        self._ROLLUP_RETENTION = OrderedDict([   # Buckets kept at each resolution
+            (RollupResolution.minute, 24 * 60),
+            (RollupResolution.hour, 30 * 24),
+            (RollupResolution.day, 2 * 365)
+        ])
+
+    def enable_rollups(self, enable=True):
+        """ Roll up scalar values into minute, hour and day aggregates as they arrive """
+        if enable and not self.has_capability('scripting'):
+            raise Exception('Rollups require a redis server with scripting')
+        self.rollups = enable
+
+    def get_rollup(
+            self, name, resolution: Union[RollupResolution, str] = 'minute', start=None,
+            end=None, as_array=False
+    ):
+        """ Aggregates of values written between start and end (epoch seconds)
+        :param as_array:  float64 arrays rather than lists
+        :return:  {'time':[bucket start], 'count':[], 'sum':[], 'min':[], 'max':[],
+                   'last':[]}  oldest bucket first
+        """
+        return self._get_rollup_implementation(
+            name=name, resolution=resolution, start=start, end=end, as_array=as_array
+        )
+
+    # ------------------- #
+    #   Implementation    #
+    # ------------------- #
+
+    def _pipe_rollup(self, pipe, name, t, value, ttl):
+        """ One operation per call, whether or not value is rolled up
+              value    Scalar, or None to skip
+        """
+        if self._rollup_script is None:
+            self._rollup_script = self.client.register_script(self._ROLLUP_SCRIPT)
+        args = [t, '' if value is None else float(value), ttl]
+        for resolution, retention in self._ROLLUP_RETENTION.items():
+            args.extend([resolution.value, retention])
+        self._rollup_script(
+            keys=[self.rollup_name(name=name, resolution=resolution)
+                  for resolution in self._ROLLUP_RETENTION],
+            args=args,
+            client=pipe
+        )
+        return pipe
+
+    def _get_rollup_implementation(self, name, resolution, start, end, as_array):
+        resolution = RollupResolution[str(resolution)]
+        # The bucket containing start is included
+        low = '-inf' if start is None else \
+            int(start // resolution.value) * resolution.value
+        high = '+inf' if end is None else end
+        members = self.client.zrangebyscore(
+            self.rollup_name(name=name, resolution=resolution), min=low, max=high
+        )
+        table = np.array([member.split(',') for member in members], dtype=float)
+        table = table.reshape(len(members), len(_ROLLUP_FIELDS))
+        return OrderedDict([
+            (field, column if as_array else column.tolist())
+            for field, column in zip(_ROLLUP_FIELDS, table.T)
+        ])
@@ -1,27 +1,58 @@
 from predictionserver.futureconventions.leaderboardconventions import (
-    LeaderboardGranularity
-)
-from predictionserver.futureconventions.performanceconventions import (
-    PerformanceGranularity
+    LeaderboardGranularity, LeaderboardMemoryDescription
 )
+from predictionserver.serverhabits.leaderboardhabits import LeaderboardHabits
 from predictionserver.servermixins.memoserver import MemoServer
+from predictionserver.utilities.scenarioindex import ScenarioIndex
+from predictionserver.servermixins.leaderboardscaleserver import LeaderboardScaleServer
+from predictionserver.utilities.lrucache import LruCache
 from pprint import pprint
+from copy import deepcopy
 import time
 import numpy as np
 from logging import warning
 import datetime
 import itertools
 import math
-from collections import Counter
+from collections import Counter, defaultdict, OrderedDict
 
 
 # Scenario server receives requests to submit scenarios, and requests to cancel scenarios
 
 
-class ScenarioServer(MemoServer):
+class ScenarioServer(LeaderboardHabits, MemoServer, LeaderboardScaleServer):
+
+    # Append transaction records to the streams KEYS, trimming each to about ARGV[1]
+    # entries and setting its ttl to ARGV[2]. ARGV[3] records follow, each as a number
+    # of fields and then field, value pairs, and then per key a number of records and
+    # their (one based) indexes.
+    _TRANSACTIONS_SCRIPT = """
+    local maxlen, ttl = ARGV[1], ARGV[2]
+    local records, a = {}, 4
+    for r = 1, tonumber(ARGV[3]) do
+        local num_args = 2 * tonumber(ARGV[a])
+        records[r] = {unpack(ARGV, a + 1, a + num_args)}
+        a = a + 1 + num_args
+    end
+    for i = 1, #KEYS do
+        local count = tonumber(ARGV[a])
+        for j = 1, count do
+            redis.call('XADD', KEYS[i], 'MAXLEN', '~', maxlen, '*',
+                       unpack(records[tonumber(ARGV[a + j])]))
+        end
+        redis.call('EXPIRE', KEYS[i], ttl)
+        a = a + 1 + count
+    end
+    return #KEYS
+    """
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.scenario_index = None  # Optional local mirror, see enable_scenario_index()
+        self.cdf_cache = None  # See enable_result_cache()
+        self.distribution_cache = None
+        self.compact_transactions = False  # See enable_compact_transactions()
+        self._transactions_script = None
 
     def submit(self, name, values, delay, write_key, verbose=False):
         return self._permissioned_submit_implementation(
@@ -84,23 +115,33 @@ class ScenarioServer(MemoServer):
         singular = delays is None
         delays = delays or [delay]
         distribution_names = [namer(name=name, delay=delay) for delay in delays]
-        pipe = self.client.pipeline()
-        for distribution_name in distribution_names:
-            # TODO: Return ordered
-            pipe.zrange(
-                name=distribution_name, start=0, end=-1, withscores=True
+        if self.distribution_cache is not None:
+            keys = self._distribution_cache_keys(
+                distribution_names=distribution_names, obscure=obscure
             )
-        private_distributions = pipe.execute()
-        data = list()
-        for distribution in private_distributions:
-            if obscure:
-                _data = dict([
-                    (self._make_scenario_obscure(scenario), v)
-                    for (scenario, v) in distribution
-                ])
-            else:
-                _data = dict([(scenario, v) for (scenario, v) in distribution])
-            data.append(_data)
+            found, missing = self.distribution_cache.lookup(keys=keys)
+            missing = list(dict.fromkeys(missing))
+        else:
+            keys = missing = [(distribution_name,)
+                              for distribution_name in distribution_names]
+            found = dict()
+
+        if missing:
+            pipe = self.client.pipeline()
+            for key in missing:
+                # TODO: Return ordered
+                pipe.zrange(name=key[0], start=0, end=-1, withscores=True)
+            for key, distribution in zip(missing, pipe.execute()):
+                if obscure:
+                    found[key] = dict([
+                        (self._make_scenario_obscure(scenario), v)
+                        for (scenario, v) in distribution
+                    ])
+                else:
+                    found[key] = dict([(scenario, v) for (scenario, v) in distribution])
+            if self.distribution_cache is not None:
+                self.distribution_cache.put(dict((key, found[key]) for key in missing))
+        data = [dict(found[key]) for key in keys]
         return data[0] if singular else data
 
     # ------------- #
@@ -223,18 +264,30 @@ class ScenarioServer(MemoServer):
                 'epoch_time': time.time(),
                 'explanation': 'delayed withdrawal is complete'
             }
+            keys = [
+                self._format_scenario(write_key, k)
+                for k in range(self.NUM_PREDICTIONS)
+            ]
+            modified = list()
             for delay in delays:
                 collective_predictions_name = self._predictions_name(name, delay)
-                keys = [
-                    self._format_scenario(write_key, k)
-                    for k in range(self.NUM_PREDICTIONS)
-                ]
                 delete_pipe.zrem(collective_predictions_name, *keys)  # 1000
                 samples_name = self._samples_name(name=name, delay=delay)
                 delete_pipe.zrem(samples_name, *keys)  # 1000
                 owners_name = self._sample_owners_name(name=name, delay=delay)
                 delete_pipe.srem(owners_name, write_key)  # 1
+                modified.extend([collective_predictions_name, samples_name])
+            delete_pipe = self._pipe_bump_scenario_versions(
+                pipe=delete_pipe, zset_names=modified
+            )
             _execut = delete_pipe.execute()
+            versions = _execut[-len(modified):]
+            _execut = _execut[:-len(modified)]
+            if self.scenario_index is not None:
+                for zset_name, version in zip(modified, versions):
+                    self.scenario_index.remove(
+                        name=zset_name, tickets=keys, version=version
+                    )
 
             confirmation.update({'execute': _execut})
 
@@ -348,24 +401,37 @@ class ScenarioServer(MemoServer):
                 time=promise_ttl
             )  # true
             for delay_seconds in delays:
-                promise_queue = self._promise_queue_name(utc_epoch_now + delay_seconds)
                 promise = self._prediction_promise(
                     target=name,
                     delay=delay_seconds,
                     predictions_name=individual_predictions_name
                 )
-                set_and_expire_pipe.sadd(promise_queue, promise)  # (3::3)
-                set_and_expire_pipe.expire(
-                    name=promise_queue,
-                    time=delay_seconds + self._DELAY_GRACE
-                )  # (4::3)
+                set_and_expire_pipe = self._pipe_promise(
+                    pipe=set_and_expire_pipe,
+                    promise=promise,
+                    destination=self._samples_name(name=name, delay=delay_seconds),
+                    due=utc_epoch_now + delay_seconds
+                )  # (3::3) (4::3)
                 set_and_expire_pipe.expire(
                     name=individual_predictions_name,
                     time=delay_seconds + self._DELAY_GRACE
                 )  # (5::3)
 
+            # Versions of collective predictions, for anyone mirroring them
+            predictions_names = [self._predictions_name(name, delay) for delay in delays]
+            set_and_expire_pipe = self._pipe_bump_scenario_versions(
+                pipe=set_and_expire_pipe, zset_names=predictions_names
+            )
+
             # Execute pipeline ... should not fail (!)
             execut = set_and_expire_pipe.execute()
+            versions = execut[-len(delays):]
+            execut = execut[:-len(delays)]
+            if self.scenario_index is not None:
+                for predictions_name, version in zip(predictions_names, versions):
+                    self.scenario_index.insert(
+                        name=predictions_name, mapping=predictions, version=version
+                    )
             anticipated_execut = [self.num_predictions] * \
                 len(delays) + [self.num_predictions, True] + [1, True, True] * len(delays)
 
@@ -469,227 +535,70 @@ class ScenarioServer(MemoServer):
         HALF_WINNERS = int(math.ceil(self.NUM_WINNERS))
 
         assert len(set(names)) == len(names), "mget() cannot be used with repeated names"
-        retrieve_pipe = self.client.pipeline()
         num_delay = len(self.DELAYS)
-        num_windows = len(self._WINDOWS)
         sponsors = [self.shash(ky) for ky in write_keys]
 
         # ----  Construct pipe to retrieve quarantined predictions ----------
-        scenarios_lookup = dict([
-            (name, dict([(delay_ndx, dict()) for delay_ndx in range(num_delay)]))
-            for name in names
-        ])
-        pools_lookup = dict([(name, dict()) for name in names])
-        participants_lookup = dict([(name, dict()) for name in names])
-        for name, value in zip(names, values):
-            for delay_ndx, delay in enumerate(self.DELAYS):
-                samples_name = self._samples_name(name=name, delay=delay)
-                pools_lookup[name][delay_ndx] = len(retrieve_pipe)
-                retrieve_pipe.zcard(samples_name)  # Total number of entries
-                participants_lookup[name][delay_ndx] = len(retrieve_pipe)
-                retrieve_pipe.smembers(
-                    self._sample_owners_name(name=name, delay=delay)
-                )  # List of owners
-                for window_ndx, window in enumerate(self._WINDOWS):
-                    scenarios_lookup[name][delay_ndx][window_ndx] = len(retrieve_pipe)
-                    retrieve_pipe.zrangebyscore(
-                        name=samples_name,
-                        min=value,
-                        max=value + 0.5 * window,
-                        withscores=False,
-                        start=0,
-                        num=HALF_WINNERS
-                    )
-                    retrieve_pipe.zrevrangebyscore(
-                        name=samples_name,
-                        max=value,
-                        min=value - 0.5 * window,
-                        withscores=False,
-                        start=0,
-                        num=HALF_WINNERS
-                    )
-        retrieved = retrieve_pipe.execute()
-
-        # ---- Compute percentiles by zooming out until we have enough points ---
-        some_percentiles = False
+        # One block of 2 + 2 * num_windows results per horizon, horizons ordered by
+        # name then delay
+        if self.scenario_index is not None:
+            retrieved = self._retrieve_settlement_from_index(
+                names=names, values=values, limit=HALF_WINNERS
+            )
+        else:
+            retrieve_pipe = self.client.pipeline()
+            for name, value in zip(names, values):
+                for delay in self.DELAYS:
+                    samples_name = self._samples_name(name=name, delay=delay)
+                    retrieve_pipe.zcard(samples_name)  # Total number of entries
+                    retrieve_pipe.smembers(
+                        self._sample_owners_name(name=name, delay=delay)
+                    )  # List of owners
+                    for window in self._WINDOWS:
+                        retrieve_pipe.zrangebyscore(
+                            name=samples_name,
+                            min=value,
+                            max=value + 0.5 * window,
+                            withscores=False,
+                            start=0,
+                            num=HALF_WINNERS
+                        )
+                        retrieve_pipe.zrevrangebyscore(
+                            name=samples_name,
+                            max=value,
+                            min=value - 0.5 * window,
+                            withscores=False,
+                            start=0,
+                            num=HALF_WINNERS
+                        )
+            retrieved = retrieve_pipe.execute()
+        settlement = self._settlement_from_retrieved(
+            retrieved=retrieved,
+            num_names=len(names),
+            with_percentiles=with_percentiles
+        )
         percentiles = dict([
-            (name, dict((d, 0.5) for d in range(len(self.DELAYS))))
-            for name in names
+            (name, dict(enumerate(settlement['percentiles'][
+                name_ndx * num_delay:(name_ndx + 1) * num_delay
+            ].tolist())))
+            for name_ndx, name in enumerate(names)
         ])
-        if with_percentiles:
-            for name in names:
-                pools = [retrieved[pools_lookup[name][delay_ndx]]
-                         for delay_ndx in range(num_delay)]
-                if any(pools):
-                    for delay_ndx, pool in enumerate(pools):
-                        assert pool == retrieved[
-                            pools_lookup[name][delay_ndx]
-                        ]  # Just checkin
-                        participant_set = retrieved[
-                            participants_lookup[name][delay_ndx]
-                        ]
-                        if pool and len(participant_set) >= 1:
-                            # Zoom out window for percentiles ... want a few so we can
-                            # average zscores from more than one contributor, hopefully
-                            # leading to more accurate percentiles
-                            percentile_scenarios = list()
-                            for window_ndx in range(num_windows):
-                                if len(percentile_scenarios) < 10:
-                                    _ndx = scenarios_lookup[name][delay_ndx][window_ndx]
-                                    percentile_scenarios_up = retrieved[_ndx]
-                                    percentile_scenarios_dn = retrieved[_ndx + 1]
-                                    percentile_scenarios = percentile_scenarios_dn + \
-                                                           percentile_scenarios_up
-                                    some_percentiles = len(percentile_scenarios) > 0
-                            percentiles[name][delay_ndx] = self._zmean_scenarios_percentile(
-                                percentile_scenarios=percentile_scenarios
-                            )
+        some_percentiles = settlement['some_percentiles']
 
         # ---- Rewards and leaderboard update pipeline
         pipe = self.client.pipeline()
         pipe.hmset(name=self.BUDGETS, mapping=dict(
             zip(names, budgets)))  # Log the budget decision
-        for name, budget, write_key, sponsor, value in zip(
-                names, budgets, write_keys, sponsors, values):
-            pools = [retrieved[pools_lookup[name][delay_ndx]]
-                     for delay_ndx in range(num_delay)]
-            if any(pools):
-                participant_sets = [
-                    retrieved[participants_lookup[name][delay_ndx]]
-                    for delay_ndx in range(num_delay)
-                ]
-                for delay_ndx, delay, pool, participant_set in zip(
-                        range(num_delay), self.DELAYS, pools, participant_sets
-                ):
-                    payments = Counter()
-                    if pool and len(participant_set) > 1:
-                        # Zoom out rewards scenarios window if we don't have a winner
-                        # Possibly this should be adjusted by the number of participants
-                        # to reduce wealth variance It is unlikely that we'd have just
-                        # one so won't worry too much about this for now.
-                        rewarded_scenarios = list()
-                        for window_ndx in range(num_windows):
-                            if len(rewarded_scenarios) == 0:
-                                _ndx = scenarios_lookup[name][delay_ndx][window_ndx]
-                                rewarded_scenarios = retrieved[_ndx]
-                                winning_window_ndx = window_ndx
-                        winning_window = self._WINDOWS[winning_window_ndx]
-                        num_rewarded = len(rewarded_scenarios)
-
-                        game_payments = self._game_payments(
-                            pool=pool,
-                            participant_set=participant_set,
-                            rewarded_scenarios=rewarded_scenarios
-                        )
-                        payments.update(game_payments)
-
-                    if len(payments):
-                        pipe = self.__update_leaderboards_for_horizon(
-                            pipe=pipe,
-                            name=name,
-                            delay=delay,
-                            payments=payments,
-                            multiplier=budget
-                        )
-                        leaderboard_names = self.leaderboard_names_to_update(
-                            name=name, delay=delay, sponsor=sponsor
-                        )
-                        write_code = self.shash(write_key)
-                        old_leaderboard_names = [
-                            self.old_custom_leaderboard_name(
-                                sponsor=write_code, name=name
-                            ),
-                            self.old_custom_leaderboard_name(
-                                sponsor=write_code
-                            )
-                        ]
-                        for (recipient, amount) in payments.items():
-                            # Record keeping
-                            rescaled_amount = budget * float(amount)
-                            self._update_balance(
-                                pipe=pipe, write_key=recipient, amount=rescaled_amount)
-                            # pipe.hincrbyfloat(
-                            #     name=self._BALANCES,
-                            #     key=recipient,
-                            #     amount=rescaled_amount
-                            # )
-                            pipe.hincrbyfloat(
-                                name=self.VOLUMES,
-                                key=self.horizon_name(name=name, delay=delay),
-                                amount=abs(rescaled_amount)
-                            )
-                            write_code = self.shash(write_key)
-                            recipient_code = self.shash(recipient)
-                            # Leaderboards
-                            for lb in old_leaderboard_names:
-                                pipe.zincrby(
-                                    name=lb, value=recipient_code, amount=rescaled_amount
-                                )
-
-                            # Performance
-                            pipe = self.__incr_performance(
-                                variety=PerformanceGranularity.write_key,
-                                write_key=write_key,
-                                name=name,
-                                delay=delay,
-                                amount=rescaled_amount
-                            )
-                            pipe.hincrbyfloat(
-                                name=self.performance_name_old(write_key=recipient),
-                                key=self.horizon_name(name=name, delay=delay),
-                                amount=rescaled_amount
-                            )
-
-                            # Transactions logs:
-                            maxed_out = num_rewarded == 2 * HALF_WINNERS
-                            mass = num_rewarded / pool if pool > 0.0 else 0.
-                            density = mass / winning_window
-                            reliable = 0 if maxed_out else 1
-                            breakeven = self.num_predictions * num_rewarded / pool \
-                                if pool > 0 else 0
-
-                            transaction_record = {
-                                "settlement_time": str(datetime.datetime.now()),
-                                "amount": rescaled_amount,
-                                "budget": budget,
-                                "stream": name,
-                                "delay": delay,
-                                "value": value,
-                                "window": winning_window,
-                                "mass": mass,
-                                "density": density,
-                                "average": breakeven,
-                                "reliable": reliable,
-                                "submissions_count": pool,
-                                "submissions_close": num_rewarded,
-                                "stream_owner_code": write_code,
-                                "recipient_code": recipient_code
-                            }
-                            log_names = [
-                                self.transactions_name(),
-                                self.transactions_name(write_key=recipient),
-                                self.transactions_name(write_key=recipient, name=name),
-                                self.transactions_name(
-                                    write_key=recipient, name=name, delay=delay
-                                )
-                            ]
-                            for ln in log_names:
-                                pipe.xadd(
-                                    name=ln,
-                                    fields=transaction_record,
-                                    maxlen=self.TRANSACTIONS_LIMIT
-                                )
-                                pipe.expire(name=ln, time=self._TRANSACTIONS_TTL)
-                        for lb in leaderboard_names:
-                            pipe.expire(name=lb, time=self._LEADERBOARD_TTL)
-                            try:
-                                # Sometimes leave a note for admin_shrinkage
-                                memory = self.leaderboard_memory_from_name(lb)
-                                if np.random.rand() < 1. / (memory * self.SHRINKAGE):
-                                    pipe.lpush(self._SHRINK_QUEUE, *leaderboard_names)
-                            except AttributeError:
-                                pass
-
+        pipe = self._pipe_settlement_payments(
+            pipe=pipe,
+            settlement=settlement,
+            names=names,
+            values=values,
+            budgets=budgets,
+            write_keys=write_keys,
+            sponsors=sponsors,
+            max_rewarded=2 * HALF_WINNERS
+        )
         _ = pipe.execute()  # No checks here
 
         result = {"percentiles": percentiles}
@@ -738,67 +647,673 @@ class ScenarioServer(MemoServer):
                 )
         return result
 
+    def _settlement_from_retrieved(self, retrieved, num_names, with_percentiles):
+        """ Decode the settlement pipeline into arrays and compute payments
+
+        :param retrieved:   Results of the retrieval pipeline in _msettle
+        :return:  dict      Arrays indexed by horizon h = name_ndx * num_delay + delay_ndx,
+                            and aggregated payments as parallel arrays
+                            'horizons', 'recipients' (with 'owners' the lookup for the
+                            latter) and 'amounts'
+        """
+        num_delay = len(self.DELAYS)
+        num_windows = len(self._WINDOWS)
+        num_horizons = num_names * num_delay
+        block = 2 + 2 * num_windows
+
+        pools = np.array(retrieved[0::block], dtype=float)
+        participant_sets = [list(ps) for ps in retrieved[1::block]]
+        num_participants = np.array([len(ps) for ps in participant_sets], dtype=int)
+        ups = [
+            retrieved[h * block + 2:(h + 1) * block:2] for h in range(num_horizons)
+        ]
+        dns = [
+            retrieved[h * block + 3:(h + 1) * block:2] for h in range(num_horizons)
+        ]
+        up_counts = np.array(
+            [[len(u) for u in up] for up in ups], dtype=int
+        ).reshape(num_horizons, num_windows)
+        dn_counts = np.array(
+            [[len(d) for d in dn] for dn in dns], dtype=int
+        ).reshape(num_horizons, num_windows)
+        stream_active = np.repeat(
+            pools.reshape(num_names, num_delay).any(axis=1), num_delay
+        )
+
+        # ---- Compute percentiles by zooming out until we have enough points ---
+        # Want a few so we can average zscores from more than one contributor,
+        # hopefully leading to more accurate percentiles
+        percentiles = np.full(num_horizons, 0.5)
+        some_percentiles = False
+        if with_percentiles:
+            eligible = np.flatnonzero(stream_active & (pools > 0) & (num_participants >= 1))
+            if len(eligible):
+                windows = self.first_sufficient_window(
+                    counts=up_counts + dn_counts, minimum=10
+                )
+                scenarios = [dns[h][windows[h]] + ups[h][windows[h]] for h in eligible]
+                segments = np.repeat(eligible, [len(sc) for sc in scenarios])
+                prctls, owners = self._decode_scenarios(list(itertools.chain(*scenarios)))
+                _, owner_ndxs = np.unique(owners, return_inverse=True)
+                percentiles = self.segment_zmean_percentiles(
+                    segments=segments,
+                    owners=owner_ndxs.ravel(),
+                    percentiles=prctls,
+                    num_segments=num_horizons
+                )
+                # As before, the last horizon examined decides
+                some_percentiles = len(scenarios[-1]) > 0
+
+        # ---- Zoom out rewards window if we don't have a winner ---
+        # Possibly this should be adjusted by the number of participants to reduce
+        # wealth variance. It is unlikely that we'd have just one so won't worry too
+        # much about this for now.
+        payable = stream_active & (pools > 0) & (num_participants > 1)
+        reward_windows = self.first_sufficient_window(counts=up_counts, minimum=1)
+        rewarded = [
+            ups[h][reward_windows[h]] if payable[h] else list()
+            for h in range(num_horizons)
+        ]
+        num_rewarded = np.array([len(r) for r in rewarded], dtype=int)
+        unrewarded = np.flatnonzero(payable & (num_rewarded == 0))
+        carryover = np.zeros(num_horizons, dtype=bool)
+        carryover[unrewarded] = np.random.rand(len(unrewarded)) < 0.05
+
+        _, winners = self._decode_scenarios(list(itertools.chain(*rewarded)))
+        participant_horizons = np.repeat(
+            np.arange(num_horizons), num_participants * payable
+        )
+        participants = list(itertools.chain(*[
+            ps for ps, pay in zip(participant_sets, payable) if pay
+        ]))
+        owners, owner_ndxs = np.unique(
+            np.array(participants + list(winners) + [self._RESERVE()], dtype=str),
+            return_inverse=True
+        )
+        owner_ndxs = owner_ndxs.ravel()
+        horizons, recipients, amounts, leaked = self.game_payments(
+            pools=pools,
+            participant_horizons=participant_horizons,
+            participant_owners=owner_ndxs[:len(participants)],
+            winner_horizons=np.repeat(np.arange(num_horizons), num_rewarded),
+            winner_owners=owner_ndxs[len(participants):-1],
+            carryover=carryover,
+            reserve=owner_ndxs[-1],
+            num_predictions=self.num_predictions
+        )
+        if leaked.any():
+            # This can occur if owners gets out of sync with the scenario hash ...
+            # which it should not
+            # FIXME: Fail gracefully and raise system alert and/or garbage cleanup of
+            # owner::samples::delay::name versus samples::delay::name
+            warning(
+                'Leakage in zero sum game for ' + str(int(leaked.sum())) +
+                ' horizon(s). Set all payments to zero, for now, but need to fix this...'
+            )
+
+        return {
+            "pools": pools,
+            "percentiles": percentiles,
+            "some_percentiles": some_percentiles,
+            "reward_windows": reward_windows,
+            "num_rewarded": num_rewarded,
+            "horizons": horizons,
+            "recipients": recipients,
+            "owners": owners,
+            "amounts": amounts
+        }
+
+    def _pipe_settlement_payments(
+            self, pipe, settlement, names, values, budgets, write_keys, sponsors,
+            max_rewarded
+    ):
+        """ Record keeping for payments, one aggregated increment per (key, member) """
+        num_delay = len(self.DELAYS)
+        horizons = settlement['horizons']
+        if not len(horizons):
+            return pipe
+        name_ndxs = horizons // num_delay
+        rescaled_amounts = np.asarray(budgets, dtype=float)[name_ndxs] * \
+            settlement['amounts']
+        owners = settlement['owners']
+        recipients = owners[settlement['recipients']]
+        recipient_codes = dict([(r, self.shash(r)) for r in np.unique(recipients)])
+
+        # Balances, aggregated across horizons
+        balances = np.bincount(
+            settlement['recipients'], weights=rescaled_amounts, minlength=len(owners)
+        )
+        for recipient_ndx in np.unique(settlement['recipients']):
+            pipe.hincrbyfloat(
+                name=self._BALANCES(),
+                key=owners[recipient_ndx],
+                amount=float(balances[recipient_ndx])
+            )
+
+        # Volumes, one per horizon
+        paid_horizons, paid_ndx = np.unique(horizons, return_inverse=True)
+        volumes = np.bincount(paid_ndx.ravel(), weights=np.abs(rescaled_amounts))
+        horizon_names = dict()
+        for h, volume in zip(paid_horizons, volumes):
+            name, delay = names[h // num_delay], self.DELAYS[h % num_delay]
+            horizon_names[h] = self.horizon_name(name=name, delay=delay)
+            pipe.hincrbyfloat(
+                name=self.VOLUMES, key=horizon_names[h], amount=float(volume)
+            )
+
+        # Leaderboards, which are shared between horizons
+        leaderboard_names = dict()
+        old_leaderboard_names = dict()
+        leaderboard_increments = defaultdict(Counter)
+        for h in paid_horizons:
+            name_ndx = h // num_delay
+            name, delay = names[name_ndx], self.DELAYS[h % num_delay]
+            write_code = self.shash(write_keys[name_ndx])
+            leaderboard_names[h] = self.leaderboard_names_to_update(
+                name=name, delay=delay, code=sponsors[name_ndx]
+            )
+            old_leaderboard_names[h] = [
+                self.old_custom_leaderboard_name(sponsor=write_code, name=name),
+                self.old_custom_leaderboard_name(sponsor=write_code)
+            ]
+        for h, recipient, amount in zip(horizons, recipients, rescaled_amounts):
+            for lb in leaderboard_names[h] + old_leaderboard_names[h]:
+                leaderboard_increments[lb][recipient_codes[recipient]] += amount
+        pipe = self._pipe_leaderboard_increments(
+            pipe=pipe, increments=leaderboard_increments
+        )
+
+        # Performance, one per (recipient, horizon), and transaction records, which
+        # are gathered by log so that each log is appended to once
+        settlement_time = str(datetime.datetime.now())
+        transaction_logs = defaultdict(list)
+        records = list()
+        for h, recipient, rescaled_amount in zip(horizons, recipients, rescaled_amounts):
+            name_ndx = h // num_delay
+            name, delay = names[name_ndx], self.DELAYS[h % num_delay]
+            rescaled_amount = float(rescaled_amount)
+            pipe.hincrbyfloat(
+                name=self.performance_name(write_key=recipient),
+                key=horizon_names[h],
+                amount=rescaled_amount
+            )
+
+            # Transactions logs:
+            pool = settlement['pools'][h]
+            num_rewarded = int(settlement['num_rewarded'][h])
+            winning_window = self._WINDOWS[settlement['reward_windows'][h]]
+            maxed_out = num_rewarded == max_rewarded
+            mass = num_rewarded / pool if pool > 0.0 else 0.
+            density = mass / winning_window
+            reliable = 0 if maxed_out else 1
+            breakeven = self.num_predictions * num_rewarded / pool \
+                if pool > 0 else 0
+
+            transaction_record = {
+                "settlement_time": settlement_time,
+                "amount": rescaled_amount,
+                "budget": budgets[name_ndx],
+                "stream": name,
+                "delay": delay,
+                "value": values[name_ndx],
+                "window": winning_window,
+                "mass": mass,
+                "density": density,
+                "average": breakeven,
+                "reliable": reliable,
+                "submissions_count": int(pool),
+                "submissions_close": num_rewarded,
+                "stream_owner_code": self.shash(write_keys[name_ndx]),
+                "recipient_code": recipient_codes[recipient]
+            }
+            records.append(
+                self.compact_transaction(transaction_record)
+                if self.compact_transactions else transaction_record
+            )
+            for ln in [
+                self.transactions_name(),
+                self.transactions_name(write_key=recipient),
+                self.transactions_name(write_key=recipient, name=name),
+                self.transactions_name(
+                    write_key=recipient, name=name, delay=delay
+                )
+            ]:
+                transaction_logs[ln].append(len(records) - 1)
+        pipe = self._pipe_transaction_logs(
+            pipe=pipe, records=records, transaction_logs=transaction_logs
+        )
+
+        shrink_weight = 1. - self.SHRINKAGE
+        medium_memory = self.LEADERBOARD_MEMORIES[LeaderboardMemoryDescription.medium]
+        for lb in set(itertools.chain(*[leaderboard_names[h] for h in paid_horizons])):
+            pipe.expire(name=lb, time=self._LEADERBOARD_TTL)
+            # Sometimes shrink, which only touches the scale of the leaderboard
+            memory = self.leaderboard_name_as_dict(lb).get(
+                str(LeaderboardGranularity.memory), medium_memory
+            )
+            if np.random.rand() < 1. / (memory * self.SHRINKAGE):
+                self._pipe_leaderboard_shrinkage(
+                    pipe=pipe, leaderboard_name=lb, weight=shrink_weight
+                )
+        return pipe
+
+    # --------------------------------------------------------------------------
+    #           Transaction logs
+    # --------------------------------------------------------------------------
+
+    def enable_compact_transactions(self, enable=True):
+        """ Write settlement transactions as a single field (see expand_transaction()) """
+        self.compact_transactions = enable
+
+    def _pipe_transaction_logs(self, pipe, records, transaction_logs):
+        """ Append records to transaction logs, with one expire per log
+              records            [dict]   Stream fields
+              transaction_logs   {log_name: [int]}  Indexes of records, oldest first
+            One operation in all where the server supports scripting
+        """
+        if not transaction_logs:
+            return pipe
+        if self.has_capability('scripting'):
+            if self._transactions_script is None:
+                self._transactions_script = self.client.register_script(
+                    self._TRANSACTIONS_SCRIPT
+                )
+            args = [self.TRANSACTIONS_LIMIT, self.TRANSACTIONS_TTL, len(records)]
+            for fields in records:
+                args.append(len(fields))
+                for field, value in fields.items():
+                    args.extend([field, value])
+            for ndxs in transaction_logs.values():
+                args.append(len(ndxs))
+                args.extend([ndx + 1 for ndx in ndxs])
+            self._transactions_script(
+                keys=list(transaction_logs), args=args, client=pipe
+            )
+            return pipe
+
+        for log_name, ndxs in transaction_logs.items():
+            for ndx in ndxs:
+                pipe.xadd(
+                    name=log_name, fields=records[ndx], maxlen=self.TRANSACTIONS_LIMIT
+                )
+            pipe.expire(name=log_name, time=self.TRANSACTIONS_TTL)
+        return pipe
+
+    # --------------------------------------------------------------------------
+    #           Promises
+    # --------------------------------------------------------------------------
+
+    def _pipe_promise(self, pipe, promise, destination, due):
+        """ Queue a promise to be fulfilled by PromiseDaemon once it falls due
+              due   epoch seconds
+            Adds two operations to the pipeline (zadd, expire)
+        """
+        promise_queue = self._promise_queue_name(
+            shard=self._promise_shard(destination=destination)
+        )
+        pipe.zadd(name=promise_queue, mapping={promise: int(due)})
+        pipe.expire(name=promise_queue, time=self._promise_queue_ttl())
+        return pipe
+
+    # --------------------------------------------------------------------------
+    #           Local scenario index
+    # --------------------------------------------------------------------------
+
+    def enable_scenario_index(self, enable=True):
+        """ Mirror predictions and samples locally so that window queries avoid redis """
+        self.scenario_index = ScenarioIndex(
+            decoder=self._decode_scenarios
+        ) if enable else None
+
+    def _pipe_bump_scenario_versions(self, pipe, zset_names):
+        for zset_name in zset_names:
+            pipe.hincrby(name=self._SCENARIO_VERSIONS(), key=zset_name, amount=1)
+        return pipe
+
+    def _refresh_scenario_index(self, zset_names, versions, cards):
+        """ Reload mirrored sorted sets that are missing or out of date
+              versions, cards     As last seen in redis
+        """
+        return self.execute_steps(self._refresh_scenario_index_steps(
+            client=self.client, zset_names=zset_names, versions=versions, cards=cards
+        ))
+
+    def _refresh_scenario_index_steps(self, client, zset_names, versions, cards):
+        """ _refresh_scenario_index() as pipelines on client, see execute_steps() """
+        stale = self._stale_scenario_zsets(
+            zset_names=zset_names, versions=versions, cards=cards
+        )
+        if stale:
+            # Read versions and contents together, so they are consistent
+            load_pipe = self._pipe_load_scenario_index(
+                pipe=client.pipeline(transaction=True), zset_names=stale
+            )
+            self._load_scenario_index(zset_names=stale, loaded=(yield load_pipe))
+        return stale
+
+    def _stale_scenario_zsets(self, zset_names, versions, cards):
+        return [
+            zset_name for zset_name, version, card in zip(zset_names, versions, cards)
+            if not self.scenario_index.is_fresh(name=zset_name, version=version, card=card)
+        ]
+
+    def _pipe_load_scenario_index(self, pipe, zset_names):
+        for zset_name in zset_names:
+            pipe.hget(name=self._SCENARIO_VERSIONS(), key=zset_name)
+            pipe.zrange(name=zset_name, start=0, end=-1, withscores=True)
+        return pipe
+
+    def _load_scenario_index(self, zset_names, loaded):
+        for zset_name, version, items in zip(zset_names, loaded[0::2], loaded[1::2]):
+            self.scenario_index.load(name=zset_name, items=items, version=version)
+
+    def _retrieve_settlement_from_index(self, names, values, limit):
+        """ Same layout as the retrieval pipeline in _msettle, but window queries are
+            answered by the local scenario index
+        """
+        samples_names = [
+            self._samples_name(name=name, delay=delay)
+            for name in names for delay in self.DELAYS
+        ]
+        num_horizons = len(samples_names)
+        state_pipe = self.client.pipeline()
+        state_pipe.hmget(self._SCENARIO_VERSIONS(), *samples_names)
+        for samples_name in samples_names:
+            state_pipe.zcard(samples_name)
+        for name in names:
+            for delay in self.DELAYS:
+                state_pipe.smembers(self._sample_owners_name(name=name, delay=delay))
+        state = state_pipe.execute()
+        versions, cards = state[0], state[1:1 + num_horizons]
+        participant_sets = state[1 + num_horizons:]
+        self._refresh_scenario_index(
+            zset_names=samples_names, versions=versions, cards=cards
+        )
+
+        half_widths = [0.5 * window for window in self._WINDOWS]
+        num_delay = len(self.DELAYS)
+        retrieved = list()
+        for h, samples_name in enumerate(samples_names):
+            ups, dns = self.scenario_index.around(
+                name=samples_name,
+                values=[values[h // num_delay]],
+                half_widths=half_widths,
+                limit=limit
+            )
+            retrieved.extend([cards[h], participant_sets[h]])
+            for up, dn in zip(ups[0], dns[0]):
+                retrieved.extend([up, dn])
+        return retrieved
+
+    # --------------------------------------------------------------------------
+    #           Result cache
+    # --------------------------------------------------------------------------
+    # CDFs, predictions and samples only change when their sorted sets do, which
+    # bumps the counters in _SCENARIO_VERSIONS, or when the leaders whose scenarios
+    # count change. Results are cached locally under keys including versions,
+    # cardinalities (which catch expiry) and, for CDFs, the abscissae and included
+    # leaders, so a stale entry is never found, merely evicted in time. Versions and
+    # leaderboards are still read every time, but not the scenarios.
+
+    def enable_result_cache(self, enable=True, maxsize=10000):
+        """ Remember CDFs, predictions and samples until their sorted sets change """
+        self.cdf_cache = LruCache(maxsize=maxsize) if enable else None
+        self.distribution_cache = LruCache(maxsize=maxsize) if enable else None
+
+    def get_result_cache_stats(self):
+        return OrderedDict([
+            (label, cache.stats()) for label, cache in [
+                ('cdf', self.cdf_cache), ('distributions', self.distribution_cache)
+            ] if cache is not None
+        ])
+
+    def _distribution_cache_keys(self, distribution_names, obscure):
+        state_pipe = self.client.pipeline()
+        state_pipe.hmget(self._SCENARIO_VERSIONS(), *distribution_names)
+        for distribution_name in distribution_names:
+            state_pipe.zcard(distribution_name)
+        state = state_pipe.execute()
+        return [
+            (distribution_name, version, card, obscure)
+            for distribution_name, version, card in zip(
+                distribution_names, state[0], state[1:]
+            )
+        ]
+
+    def _cdf_cache_lookup(self, horizons, values, nums, leaderboards, versions,
+                          min_balance):
+        """ :returns  {horizon:cdf} found, cache keys, nums with those horizons zeroed
+        """
+        if self.cdf_cache is None:
+            return dict(), None, nums
+        keys = [
+            (horizon, version, num, tuple(values[horizon]), min_balance, tuple(sorted(
+                code for code, balance in leaderboard if balance > min_balance
+            ))) for horizon, version, num, leaderboard in zip(
+                horizons, versions, nums, leaderboards
+            )
+        ]
+        found, _ = self.cdf_cache.lookup(keys=keys)
+        cached = dict((key[0], deepcopy(cdf)) for key, cdf in found.items())
+        nums = [0 if horizon in cached else num for horizon, num in zip(horizons, nums)]
+        return cached, keys, nums
+
+    def _cdf_cache_update(self, cdfs, cached, keys):
+        if keys is not None:
+            self.cdf_cache.put(dict(
+                (key, deepcopy(cdfs[key[0]])) for key in keys if key[0] not in cached
+            ))
+            cdfs.update(cached)
+        return cdfs
+
+    # --------------------------------------------------------------------------
+    #           Community CDFs
+    # --------------------------------------------------------------------------
+    # Read in two round trips, whether the client is synchronous (CdfServer) or
+    # not (AsyncBaseServer), so the reads are a sequence of pipelines that either
+    # executes (see execute_steps).
+
+    def _cdf_steps(self, client, horizons, values, top, min_balance):
+        """ {horizon:cdf} from one pipeline for cardinalities and leaderboards, then
+            one for window scans unless the scenario index is on
+              values   {horizon:[float]}
+        """
+        names_delays = [self.split_horizon_name(horizon) for horizon in horizons]
+        for name, delay in names_delays:
+            assert name == self._root_name(name), "get_cdf expects root name"
+            assert delay in self.DELAYS, "delay is not a valid choice of delay"
+        predictions_names = [
+            self._predictions_name(name=name, delay=delay) for name, delay in names_delays
+        ]
+        state_pipe = self._pipe_cdf_state(
+            pipe=client.pipeline(),
+            predictions_names=predictions_names,
+            names_delays=names_delays,
+            top=top
+        )
+        nums, leaderboards, versions = self._cdf_state_from_execution(
+            execution=(yield state_pipe), num_horizons=len(horizons)
+        )
+        cached, cache_keys, uncached_nums = self._cdf_cache_lookup(
+            horizons=horizons, values=values, nums=nums, leaderboards=leaderboards,
+            versions=versions, min_balance=min_balance
+        )
+        half_widths = self._cdf_half_widths(
+            horizons=horizons, values=values, nums=uncached_nums
+        )
+        if self.scenario_index is not None:
+            yield from self._refresh_scenario_index_steps(
+                client=client, zset_names=predictions_names, versions=versions, cards=nums
+            )
+            windows = self._cdf_windows_from_index(
+                horizons=horizons,
+                values=values,
+                predictions_names=predictions_names,
+                half_widths=half_widths
+            )
+        elif half_widths:
+            score_pipe = self._pipe_cdf_scans(
+                pipe=client.pipeline(),
+                horizons=horizons,
+                values=values,
+                predictions_names=predictions_names,
+                half_widths=half_widths
+            )
+            windows = self._cdf_windows_from_scans(
+                execution=(yield score_pipe),
+                horizons=horizons,
+                values=values,
+                half_widths=half_widths
+            )
+        else:
+            windows = dict()
+        cdfs = self._cdfs_from_windows(
+            horizons=horizons,
+            values=values,
+            leaderboards=leaderboards,
+            windows=windows,
+            min_balance=min_balance
+        )
+        return self._cdf_cache_update(cdfs=cdfs, cached=cached, keys=cache_keys)
+
+    def _pipe_cdf_state(self, pipe, predictions_names, names_delays, top):
+        """ Cardinalities and top of leaderboards, plus versions if the index is on """
+        leaderboard_names = [
+            self.leaderboard_name(
+                granularity=LeaderboardGranularity.name_and_delay, name=name, delay=delay
+            ) for name, delay in names_delays
+        ]
+        for predictions_name, leaderboard_name in zip(predictions_names, leaderboard_names):
+            pipe.zcard(name=predictions_name)
+            pipe.zrange(name=leaderboard_name, start=-top, end=-1, withscores=True)
+        self._pipe_leaderboard_scales(pipe=pipe, leaderboard_names=leaderboard_names)
+        if self._cdf_versions_wanted():
+            pipe.hmget(self._SCENARIO_VERSIONS(), *predictions_names)
+        return pipe
+
+    def _cdf_versions_wanted(self):
+        return self.scenario_index is not None or self.cdf_cache is not None
+
+    def _cdf_state_from_execution(self, execution, num_horizons):
+        """ :returns  nums, leaderboards, versions (None unless the index or cache is on)
+        """
+        nums = execution[0:2 * num_horizons:2]
+        scales = self._leaderboard_scales_from_execution(execution[2 * num_horizons])
+        leaderboards = [
+            [(code, scale * score) for code, score in leaderboard]
+            for leaderboard, scale in zip(execution[1:2 * num_horizons:2], scales)
+        ]
+        versions = execution[-1] if self._cdf_versions_wanted() else None
+        return nums, leaderboards, versions
+
+    @staticmethod
+    def _cdf_half_widths(horizons, values, nums):
+        """ Window half widths for horizons that have predictions """
+        return dict([
+            (ndx, min(0.1, max(5.0 / num, 0.00001)) * max(
+                [abs(v) for v in values[horizons[ndx]]] + [1.0]
+            )) for ndx, num in enumerate(nums) if num
+        ])
+
+    def _pipe_cdf_scans(self, pipe, horizons, values, predictions_names, half_widths):
+        """ Scenarios just below, then just above, each value """
+        for ndx, h in half_widths.items():
+            for value in values[horizons[ndx]]:
+                pipe.zrevrangebyscore(
+                    name=predictions_names[ndx],
+                    max=value,
+                    min=value - h,
+                    start=0,
+                    num=5,
+                    withscores=False
+                )
+                pipe.zrangebyscore(
+                    name=predictions_names[ndx],
+                    min=value,
+                    max=value + h,
+                    start=0,
+                    num=5,
+                    withscores=False
+                )
+        return pipe
+
+    @staticmethod
+    def _cdf_windows_from_scans(execution, horizons, values, half_widths):
+        execut = iter(execution)
+        return dict([
+            (ndx, [next(execut) + next(execut) for _ in values[horizons[ndx]]])
+            for ndx in half_widths
+        ])
+
+    def _cdf_windows_from_index(self, horizons, values, predictions_names, half_widths):
+        windows = dict()
+        for ndx, h in half_widths.items():
+            ups, dns = self.scenario_index.around(
+                name=predictions_names[ndx],
+                values=values[horizons[ndx]],
+                half_widths=[h],
+                limit=5
+            )
+            windows[ndx] = [dn[0] + up[0] for up, dn in zip(ups, dns)]
+        return windows
+
+    def _cdfs_from_windows(self, horizons, values, leaderboards, windows, min_balance):
+        """ Community percentiles, then monotone smoothing of all CDFs at once
+              windows   {ndx:[[ticket]]}  Scenarios near each value, for active horizons
+        """
+        active = list(windows)
+        width = max([len(values[horizons[ndx]]) for ndx in active] + [0])
+        prtcls = np.full((len(active), width), np.nan)
+        for row, ndx in enumerate(active):
+            included = [
+                code for code, balance in leaderboards[ndx] if balance > min_balance
+            ]
+            prtcls[row, :len(windows[ndx])] = [
+                self._zmean_scenarios_percentile(
+                    percentile_scenarios=ex,
+                    included_codes=included) if ex else np.nan for ex in windows[ndx]
+            ]
+        prtcls[np.abs(prtcls - 0.5) <= 1e-6] = np.nan
+        smoothed = self.monotone_envelopes(prtcls)
+
+        cdfs = dict([(horizon, {"message": "No predictions."}) for horizon in horizons])
+        for row, ndx in enumerate(active):
+            valid = ~np.isnan(smoothed[row])
+            cdfs[horizons[ndx]] = {
+                "x": [v for v, ok in zip(values[horizons[ndx]], valid) if ok],
+                "y": smoothed[row][valid].tolist()
+            }
+        return cdfs
+
     def _zmean_scenarios_percentile(self, percentile_scenarios, included_codes=None):
         """ Each submission has an implicit z-score. Average them. """
+        percentiles, owners = self._decode_scenarios(percentile_scenarios)
         # On the fly discard legacy scenarios where num_predictions are too large
+        keep = percentiles < 1
         if included_codes:
-            owners_prctls = dict([
-                (self._scenario_owner(s), self._scenario_percentile(s))
-                for s in percentile_scenarios if
-                self.shash(
-                    self._scenario_owner(s)
-                ) in included_codes and self._scenario_percentile(s) < 1
-            ])
-        else:
-            owners_prctls = dict([
-                (self._scenario_owner(s), self._scenario_percentile(s))
-                for s in percentile_scenarios
-                if self._scenario_percentile(s) < 1
-            ])
-
-        prctls = [p for o, p in owners_prctls.items()]
+            unique_owners, inverse = np.unique(owners, return_inverse=True)
+            included = np.array([
+                self.shash(owner) in included_codes for owner in unique_owners
+            ], dtype=bool)
+            keep &= included[inverse.ravel()]
+        percentiles, owners = percentiles[keep], owners[keep]
+        # Last scenario per owner counts
+        _, reversed_first = np.unique(owners[::-1], return_index=True)
+        prctls = percentiles[len(owners) - 1 - reversed_first]
         mean_prctl = self.zmean_percentile(prctls)
 
-        if prctls and included_codes is not None and len(prctls) < len(
+        if len(prctls) and included_codes is not None and len(prctls) < len(
                 included_codes) and abs(mean_prctl - 0.5) > 1e-6:
             if True:
                 E = math.exp(8.0 * (mean_prctl - 0.5))
                 missing_prctl = (E / (E + 1))
-                prctls = prctls + [missing_prctl] * (len(included_codes) - len(prctls))
+                prctls = np.concatenate([
+                    prctls, [missing_prctl] * (len(included_codes) - len(prctls))
+                ])
             return self.zmean_percentile(prctls)
         else:
             return mean_prctl
 
-    def _game_payments(self, pool, participant_set, rewarded_scenarios):
-        if len(rewarded_scenarios) == 0:
-            do_carryover = np.random.rand() < 0.05
-            if do_carryover:
-                game_payments = Counter(dict((p, -1.0) for p in participant_set))
-                carryover = Counter({self._RESERVE: 1.0 * pool / self.num_predictions})
-                game_payments.update(carryover)
-            else:
-                game_payments = Counter()
-        else:
-            game_payments = Counter(dict((p, -1.0) for p in participant_set))
-            winners = [self._scenario_owner(ticket) for ticket in rewarded_scenarios]
-            # Could augment this to use kernel or whatever
-            reward = (1.0 * pool / self.num_predictions) / len(winners)
-            payouts = Counter(dict([(w, reward * c) for w, c in Counter(winners).items()]))
-            game_payments.update(payouts)
-
-        if abs(sum(game_payments.values())) > 0.1:
-            # This can occur if owners gets out of sync with the scenario hash ...
-            # which it should not
-            # FIXME: Fail gracefully and raise system alert and/or garbage cleanup of
-            # owner::samples::delay::name versus samples::delay::name
-            print('********************************************')
-            print("Leakage in zero sum game", flush=True)
-            pprint(game_payments)
-            print('********************************************')
-            print('Set all payments to zero, for now, but need to fix this...')
-            game_payments = Counter(dict((p, 0.0) for p in participant_set))
-        return game_payments
-
 
 if __name__ == '__main__':
     from predictionserver.collider_config_private import (
@@ -0,0 +1,123 @@
+from predictionserver.servermixins.baseserver import BaseServer
+
+# Default CDF abscissae come from the recent values of a stream. Rather than reading
+# and digesting thousands of lags per request, scalar values can be sketched as they
+# are written: counts by logarithmic bucket of levels and of changes, sign flips of
+# each (to tell a process from a level), the last value, and distinct values while
+# there are few. See StatsConventions.sketch_cdf_values for the fields.
+#
+# Like the lags, a sketch only covers recent values. Once a generation has counted
+# lag_len values it becomes the previous generation and a new one is started, so the
+# two together cover between one and two lagged lengths.
+
+
+class SketchServer(BaseServer):
+
+    # Sketch value ARGV[1] into KEYS[1], moving it to KEYS[2] once it holds ARGV[2]
+    # values. ARGV[3] is the number of distinct values to list, ARGV[4] the ttl, and
+    # ARGV[5], ARGV[6] are SKETCH_GAMMA and SKETCH_ZERO. Empty values are ignored.
+    _SKETCH_SCRIPT = """
+    local x = tonumber(ARGV[1])
+    if not x then
+        return 0
+    end
+    local capacity, max_distinct, ttl = tonumber(ARGV[2]), tonumber(ARGV[3]), ARGV[4]
+    local log_gamma, zero = math.log(tonumber(ARGV[5])), tonumber(ARGV[6])
+    local function bucket(prefix, v)
+        if math.abs(v) < zero then
+            return prefix .. '0'
+        end
+        local k = math.ceil(math.log(math.abs(v)) / log_gamma)
+        return prefix .. (v > 0 and '+' or '-') .. k
+    end
+    local function list_distinct(count_field, prefix, v)
+        local count = tonumber(redis.call('HGET', KEYS[1], count_field) or '0')
+        if count <= max_distinct and redis.call(
+                'HSETNX', KEYS[1], prefix .. string.format('%.12f', v), 1) == 1 then
+            redis.call('HINCRBY', KEYS[1], count_field, 1)
+        end
+    end
+    local state = redis.call('HMGET', KEYS[1], 'n', 'last', 'last_diff')
+    if (tonumber(state[1]) or 0) >= capacity then
+        redis.call('RENAME', KEYS[1], KEYS[2])
+        redis.call('EXPIRE', KEYS[2], ttl)
+    end
+    local last, last_diff = tonumber(state[2]), tonumber(state[3])
+    redis.call('HINCRBY', KEYS[1], 'n', 1)
+    redis.call('HINCRBY', KEYS[1], bucket('L', x), 1)
+    list_distinct('distinct_levels', 'U', x)
+    if last then
+        local d = x - last
+        redis.call('HINCRBY', KEYS[1], bucket('D', d), 1)
+        list_distinct('distinct_diffs', 'W', d)
+        if last * x < 0 then
+            redis.call('HINCRBY', KEYS[1], 'level_flips', 1)
+        end
+        if last_diff and last_diff * d < 0 then
+            redis.call('HINCRBY', KEYS[1], 'diff_flips', 1)
+        end
+        redis.call('HSET', KEYS[1], 'last_diff', string.format('%.17g', d))
+    end
+    redis.call('HSET', KEYS[1], 'last', string.format('%.17g', x))
+    redis.call('EXPIRE', KEYS[1], ttl)
+    return 1
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sketches = False  # See enable_sketches()
+        self._sketch_script = None
+        self._SKETCH_DISTINCT = 26  # Distinct values listed, for discrete streams
+
+    def enable_sketches(self, enable=True):
+        """ Sketch scalar values as they arrive, and take default CDF abscissae from
+            the sketch when there is one
+        """
+        if enable and not self.has_capability('scripting'):
+            raise Exception('Sketches require a redis server with scripting')
+        self.sketches = enable
+
+    def get_sketch_values(self, name, num=20):
+        """ Default CDF abscissae from the sketch of name
+        :return:  [float], or None if name has not been sketched
+        """
+        return self._sketch_values_many(names=[name], num=num)[name]
+
+    # ------------------- #
+    #   Implementation    #
+    # ------------------- #
+
+    def _pipe_sketch(self, pipe, name, value, lag_len, ttl):
+        """ One operation per call, whether or not value is sketched
+              value    Scalar, or None to skip
+        """
+        if self._sketch_script is None:
+            self._sketch_script = self.client.register_script(self._SKETCH_SCRIPT)
+        self._sketch_script(
+            keys=[self.sketch_name(name=name), self.sketch_name(name=name, generation=1)],
+            args=['' if value is None else float(value), lag_len + 1,
+                  self._SKETCH_DISTINCT, ttl, self.SKETCH_GAMMA, self.SKETCH_ZERO],
+            client=pipe
+        )
+        return pipe
+
+    def _pipe_sketch_reads(self, pipe, name):
+        pipe.hgetall(self.sketch_name(name=name, generation=1))
+        pipe.hgetall(self.sketch_name(name=name))
+        return pipe
+
+    def _sketch_values_from_execution(self, results, num):
+        """ [float] or None per name, from the results of _pipe_sketch_reads() """
+        return [
+            self.sketch_cdf_values(sketches=results[k:k + 2], num=num)
+            for k in range(0, len(results), 2)
+        ]
+
+    def _sketch_values_many(self, names, num):
+        """ {name: [float] or None} in one round trip """
+        sketch_pipe = self.client.pipeline(transaction=False)
+        for name in names:
+            sketch_pipe = self._pipe_sketch_reads(pipe=sketch_pipe, name=name)
+        return dict(zip(
+            names, self._sketch_values_from_execution(sketch_pipe.execute(), num=num)
+        ))
@@ -3,11 +3,20 @@ from predictionserver.futureconventions.activityconventions import (
 )
 from predictionserver.futureconventions.memoconventions import Memo
 from predictionserver.servermixins.laggedserver import LaggedServer
+from predictionserver.servermixins.rollupserver import RollupServer
+from predictionserver.servermixins.sketchserver import SketchServer
 from predictionserver.servermixins.scenarioserver import ScenarioServer
+from predictionserver.servermixins.ownershipserver import OwnershipServer
+from predictionserver.utilities.subscriberindex import SubscriberIndex
+from predictionserver.servermixins.notificationserver import NotificationServer
 from microconventions.type_conventions import NameList, ValueList, List, Optional, KeyList
+from redis.client import list_or_args
 
 import itertools
 import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from logging import warning
 import time
 import json
 import numpy as np
@@ -15,10 +24,115 @@ import numpy as np
 from typing import Any
 
 
-class StreamServer(LaggedServer, ScenarioServer):
+class StreamServer(
+        LaggedServer, RollupServer, SketchServer, OwnershipServer, ScenarioServer,
+        NotificationServer
+):
+
+    # Scripted version of _modify_page() for a batch of existing streams with lag
+    # friendly values. Subscribers are messaged afterwards by _propagate_to_subscribers()
+    # as for any other write, since their mailboxes are not known in advance. KEYS[1] is
+    # the ownership hash, then per stream: name, copy, lagged values, lagged times,
+    # packed lags and per delay samples, sample owners, predictions and promise queue.
+    # ARGV starts with num_delays, time, promise_ttl, promise queue ttl and the
+    # notifications prefix ('' if off), then per stream: value, write_key, ttl,
+    # distribution_ttl, lag_len, packed lag ('' to use the lists) and per delay promise
+    # and due time. Returns {status, info} per stream.
+    _SET_EXISTING_SCRIPT = """
+    local num_delays = tonumber(ARGV[1])
+    local now, promise_ttl, queue_ttl = ARGV[2], ARGV[3], ARGV[4]
+    local notifications = ARGV[5]
+    local key_width, arg_width = 5 + 4 * num_delays, 6 + 2 * num_delays
+    local outcomes = {}
+    for i = 0, (#KEYS - 1) / key_width - 1 do
+        local k, a = 1 + i * key_width, 5 + i * arg_width
+        local name, value, write_key = KEYS[k + 1], ARGV[a + 1], ARGV[a + 2]
+        local ttl, distribution_ttl, lag_len = ARGV[a + 3], ARGV[a + 4], ARGV[a + 5]
+        local packed = ARGV[a + 6]
+        local owner = redis.call('HGET', KEYS[1], name)
+        if not owner then
+            outcomes[i + 1] = {'new', ''}
+        elseif owner ~= write_key then
+            outcomes[i + 1] = {'rejected', string.sub(owner, -4)}
+        else
+            redis.call('SET', name, value, 'EX', ttl)
+            redis.call('SET', KEYS[k + 2], value, 'EX', promise_ttl)
+            for d = 0, num_delays - 1 do
+                local kd, ad = k + 5 + 4 * d, a + 6 + 2 * d
+                redis.call('EXPIRE', KEYS[kd + 1], distribution_ttl)
+                redis.call('EXPIRE', KEYS[kd + 2], distribution_ttl)
+                redis.call('EXPIRE', KEYS[kd + 3], distribution_ttl)
+                redis.call('ZADD', KEYS[kd + 4], ARGV[ad + 2], ARGV[ad + 1])
+                redis.call('EXPIRE', KEYS[kd + 4], queue_ttl)
+            end
+            if packed ~= '' then
+                local keep = #packed * (lag_len + 1)
+                local stored = redis.call('APPEND', KEYS[k + 5], packed)
+                if stored >= 2 * keep then
+                    redis.call('SET', KEYS[k + 5],
+                        redis.call('GETRANGE', KEYS[k + 5], stored - keep, stored - 1))
+                end
+                redis.call('EXPIRE', KEYS[k + 5], ttl)
+            else
+                redis.call('LPUSH', KEYS[k + 3], value)
+                redis.call('LPUSH', KEYS[k + 4], now)
+                redis.call('LTRIM', KEYS[k + 3], 0, lag_len)
+                redis.call('LTRIM', KEYS[k + 4], 0, lag_len)
+                redis.call('EXPIRE', KEYS[k + 3], ttl)
+                redis.call('EXPIRE', KEYS[k + 4], ttl)
+            end
+            if notifications ~= '' then
+                redis.call('PUBLISH', notifications .. name, cjson.encode(
+                    {kind = 'value', name = name, value = value, time = tonumber(now)}))
+            end
+            outcomes[i + 1] = {'ok', ''}
+        end
+    end
+    return outcomes
+    """
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.scripted_writes = False  # See enable_scripted_writes()
+        self._set_existing_script = None
+        self.subscriber_index = None  # See enable_subscriber_index()
+        self.fanout_executor = None  # See enable_background_fanout()
+        self.fanout_stats = OrderedDict([
+            ('batches', 0),
+            ('senders', 0),
+            ('messages', 0),
+            ('mailboxes', 0),
+            ('subscriber_lookups', 0),
+            ('seconds', 0.),
+            ('max_seconds', 0.),
+            ('failures', 0)
+        ])
+
+    def enable_scripted_writes(self, enable=True):
+        """ Modify existing streams with a server side script, one round trip per mset """
+        self.scripted_writes = enable
+
+    def enable_subscriber_index(self, enable=True, ttl=5.0, max_sources=10000):
+        """ Cache subscribers of each source locally, for up to ttl seconds """
+        self.subscriber_index = SubscriberIndex(
+            ttl=ttl, max_sources=max_sources
+        ) if enable else None
+
+    def enable_background_fanout(self, enable=True):
+        """ Message subscribers after set() and mset() return, rather than before
+            (A single worker thread, so batches land in the order they were written.
+             Disabling waits for outstanding batches.)
+        """
+        if self.fanout_executor is not None:
+            self.fanout_executor.shutdown(wait=True)
+        self.fanout_executor = ThreadPoolExecutor(max_workers=1) if enable else None
+
+    def get_fanout_stats(self):
+        stats = OrderedDict(self.fanout_stats)
+        if self.subscriber_index is not None:
+            stats['cache_hits'] = self.subscriber_index.hits
+            stats['cache_misses'] = self.subscriber_index.misses
+        return stats
 
     def get_budget(self, name):
         return self.client.hget(name=self.BUDGETS, key=name)
@@ -60,8 +174,8 @@ class StreamServer(LaggedServer, ScenarioServer):
     def set(self, name, value, write_key, budget=1.):
         """ Set name=value and initiate clearing, derived zscore market etc """
         _ = Memo(activity=Activity.set, genre=ActivityContext)
-        assert MicroServerConventions.is_plain_name(name), "Expecting plain name"
-        assert MicroServerConventions.is_valid_key(write_key), "Invalid write_key"
+        assert self.is_plain_name(name), "Expecting plain name"
+        assert self.is_valid_key(write_key), "Invalid write_key"
         if not self.permitted_to_set(write_key=write_key):
             reason = "Write key isn't sufficiently rare to create or update a stream"
             self._error(
@@ -134,7 +248,7 @@ class StreamServer(LaggedServer, ScenarioServer):
         """
         Apply set() for multiple names and values, with copula derived streams optionally
         """  # Todo: disallow calling with multiple write_keys
-        is_plain = [MicroServerConventions.is_plain_name(name) for name in names]
+        is_plain = [self.is_plain_name(name) for name in names]
         if not len(names) == len(values):
             error_data = {
                 'names': names,
@@ -206,7 +320,7 @@ class StreamServer(LaggedServer, ScenarioServer):
 
         if return_args is None:
             return_args = ['name', 'write_key', 'value', 'percentile']
-        names, values, write_keys, budgets = MicroServerConventions.coerce_inputs(
+        names, values, write_keys, budgets = self.coerce_inputs(
             names=names,
             values=values,
             write_keys=write_keys,
@@ -236,13 +350,16 @@ class StreamServer(LaggedServer, ScenarioServer):
         pools = self._pools(names, self.DELAYS)
         for nm, v, wk in zip(names, values, write_keys):
             if self.is_scalar_value(v):
+                baseline_delays = list()
                 for delay_ndx, delay in enumerate(self.DELAYS):
                     if np.random.rand() < 1 / 20 and pools[nm][delay_ndx] < 4:
-                        self._baseline_prediction(
-                            name=nm, value=v, write_key=wk, delay=delay)
+                        baseline_delays.append(delay)
                     elif pools[nm][delay_ndx] >= 3:
                         # We can step aside now that two others are fighting it out.
                         self._cancel_implementation(name=nm, write_key=wk, delay=delay)
+                if baseline_delays:
+                    self._baseline_predictions(
+                        name=nm, write_key=wk, delays=baseline_delays)
 
         # Rewards, percentiles ... but only for scalar floats
         # Settlement also triggers the derived market for zscores
@@ -292,6 +409,19 @@ class StreamServer(LaggedServer, ScenarioServer):
         ) = self._pipelined_set_obscure(
             ndxs=ndxs, names=names, values=values, write_keys=write_keys, budgets=budgets
         )
+        executed_scripted, rejected_scripted = list(), list()
+        if self.scripted_writes and self.has_capability('scripting'):
+            (
+                executed_scripted,
+                rejected_scripted,
+                ndxs,
+                names,
+                values,
+                write_keys
+            ) = self._scripted_set_existing(
+                ndxs=ndxs, names=names, values=values, write_keys=write_keys,
+                budgets=budgets
+            )
         (
             executed_new,
             rejected_new,
@@ -305,15 +435,19 @@ class StreamServer(LaggedServer, ScenarioServer):
         executed_existing, rejected_existing = self._pipelined_set_existing(
             ndxs=ndxs, names=names, values=values, write_keys=write_keys, budgets=budgets
         )
-        executed = executed_obscure + executed_new + executed_existing
-
-        # Propagate to subscribers
-        modified_names = [ex["name"] for ex in executed]
-        modified_values = [ex["value"] for ex in executed]
-        self._propagate_to_subscribers(names=modified_names, values=modified_values)
+        executed = executed_scripted + executed_obscure + executed_new + executed_existing
+
+        # Propagate to subscribers, in the order the values were written
+        modified = sorted(executed, key=lambda ex: ex["ndx"])
+        if modified:
+            self._propagate_to_subscribers(
+                names=[ex["name"] for ex in modified],
+                values=[ex["value"] for ex in modified]
+            )
         return {
             "executed": executed,
-            "rejected": rejected_obscure + rejected_new + rejected_existing
+            "rejected": rejected_obscure + rejected_scripted + rejected_new +
+            rejected_existing
         }
 
     @staticmethod
@@ -377,7 +511,7 @@ class StreamServer(LaggedServer, ScenarioServer):
                         ignored_ndxs.append(ndx)
 
             if len(executed):
-                obscure_results = MicroServerConventions.chunker(
+                obscure_results = self.chunker(
                     results=obscure_pipe.execute(), n=len(executed)
                 )
                 for intent, res in zip(executed, obscure_results):
@@ -400,7 +534,7 @@ class StreamServer(LaggedServer, ScenarioServer):
             exists_pipe = self.client.pipeline(transaction=False)
             fakeredis = self.client.connection is None
             for name in names:
-                exists_pipe.hexists(name=self._ownership_name(), key=name)
+                exists_pipe.hexists(name=self._OWNERSHIP(), key=name)
             exists = exists_pipe.execute()
 
             new_pipe = self.client.pipeline(transaction=False)
@@ -430,7 +564,7 @@ class StreamServer(LaggedServer, ScenarioServer):
                     ignored_ndxs.append(ndx)
 
             if len(executed):
-                new_results = MicroServerConventions.chunker(
+                new_results = self.chunker(
                     results=new_pipe.execute(), n=len(executed)
                 )
                 for intent, res in zip(executed, new_results):
@@ -468,19 +602,12 @@ class StreamServer(LaggedServer, ScenarioServer):
                         "error": "write_key does not match page_key on record"
                     }
                     intent = auth_message
-                    error_pipe.lpush(
-                        self.errors_name(write_key=write_key),
-                        json.dumps(auth_message)
-                    )
-                    error_pipe.expire(self.errors_name(write_key=write_key), self.ERROR_TTL)
-                    error_pipe.ltrim(
-                        name=self.errors_name(write_key=write_key),
-                        start=0,
-                        end=self.ERROR_LIMIT
+                    error_pipe = self._pipe_error_message(
+                        pipe=error_pipe, write_key=write_key, message=auth_message
                     )
                     rejected.append(intent)
             if len(executed):
-                modify_results = MicroServerConventions.chunker(
+                modify_results = self.chunker(
                     results=modify_pipe.execute(), n=len(executed)
                 )
                 for intent, res in zip(executed, modify_results):
@@ -491,32 +618,218 @@ class StreamServer(LaggedServer, ScenarioServer):
 
         return executed, rejected
 
+    def _scripted_set_existing(self, ndxs, names, values, write_keys, budgets):
+        """ Modify existing streams and queue their promises in a single round trip
+            (two with rollups or sketches). Streams that are new, or values that are
+            not stored as lags, are returned for the pipelined path.
+        """
+        executed = list()
+        rejected = list()
+        ignored_ndxs = list()
+        if ndxs:
+            t = time.time()
+            utc_epoch_now = int(t)
+            keys = [self._OWNERSHIP()]
+            args = [
+                len(self.DELAYS), t, self._promise_ttl(), self._promise_queue_ttl(),
+                self.notifications_channel('') if self.notifications else ''
+            ]
+            intents = list()
+            for ndx, name, value, write_key in zip(ndxs, names, values, write_keys):
+                if not (self.is_valid_key(write_key) and self._good_for_lags(value)):
+                    ignored_ndxs.append(ndx)
+                    continue
+                budget = budgets[ndx]
+                ttl = self._cost_based_ttl(value=value, budget=budget)
+                name_of_copy = self._random_promised_name(name)
+                keys.extend([
+                    name,
+                    name_of_copy,
+                    self.lagged_values_name(name),
+                    self.lagged_times_name(name),
+                    self.lagged_packed_name(name)
+                ])
+                args.extend([
+                    value,
+                    write_key,
+                    ttl,
+                    self._cost_based_distribution_ttl(budget=budget),
+                    self._cost_based_lagged_len(value),
+                    self.pack_lag(t=t, value=value) if self.packed_lags
+                    and self.is_scalar_value(value) else ''
+                ])
+                for delay in self.DELAYS:
+                    destination = self.delayed_name(name=name, delay=delay)
+                    keys.extend([
+                        self._samples_name(name=name, delay=delay),
+                        self._sample_owners_name(name=name, delay=delay),
+                        self._predictions_name(name=name, delay=delay),
+                        self._promise_queue_name(
+                            shard=self._promise_shard(destination=destination)
+                        )
+                    ])
+                    args.extend([
+                        self._copy_promise(source=name_of_copy, destination=destination),
+                        utc_epoch_now + delay
+                    ])
+                intents.append({
+                    "ndx": ndx,
+                    "name": name,
+                    "value": value,
+                    "write_key": write_key,
+                    "ttl": ttl,
+                    "new": False,
+                    "obscure": False,
+                    "copy": name_of_copy
+                })
+
+            if intents:
+                if self._set_existing_script is None:
+                    self._set_existing_script = self.client.register_script(
+                        self._SET_EXISTING_SCRIPT
+                    )
+                outcomes = self._set_existing_script(keys=keys, args=args)
+                after_pipe = self.client.pipeline(transaction=False)
+                for intent, (status, info) in zip(intents, outcomes):
+                    if status == 'ok':
+                        intent.update({"result": status})
+                        executed.append(intent)
+                        if self.is_scalar_value(intent["value"]):
+                            after_pipe = self._pipe_scalar_extras(
+                                pipe=after_pipe, t=t, intent=intent
+                            )
+                    elif status == 'new':
+                        ignored_ndxs.append(intent["ndx"])
+                    else:
+                        auth_message = {
+                            "ndx": intent["ndx"],
+                            "name": intent["name"],
+                            "value": intent["value"],
+                            "write_key": intent["write_key"],
+                            "official_write_key_ends_in": info,
+                            "error": "write_key does not match page_key on record"
+                        }
+                        after_pipe = self._pipe_error_message(
+                            pipe=after_pipe, write_key=intent["write_key"],
+                            message=auth_message
+                        )
+                        rejected.append(auth_message)
+                if len(after_pipe):
+                    after_pipe.execute()
+
+        # Return those we are yet to get to, in their original order
+        names = [n for n, ndx in zip(names, ndxs) if ndx in ignored_ndxs]
+        values = [v for v, ndx in zip(values, ndxs) if ndx in ignored_ndxs]
+        write_keys = [w for w, ndx in zip(write_keys, ndxs) if ndx in ignored_ndxs]
+        ignored_ndxs = [ndx for ndx in ndxs if ndx in ignored_ndxs]
+        return executed, rejected, ignored_ndxs, names, values, write_keys
+
+    def _pipe_scalar_extras(self, pipe, t, intent):
+        """ Optional rollups and sketches, following the scripted write of a scalar """
+        if self.rollups:
+            pipe = self._pipe_rollup(
+                pipe=pipe, name=intent["name"], t=t, value=intent["value"],
+                ttl=intent["ttl"]
+            )
+        if self.sketches:
+            pipe = self._pipe_sketch(
+                pipe=pipe, name=intent["name"], value=intent["value"],
+                lag_len=self._cost_based_lagged_len(intent["value"]), ttl=intent["ttl"]
+            )
+        return pipe
+
+    def _pipe_error_message(self, pipe, write_key, message):
+        errors_name = self.errors_name(write_key=write_key)
+        pipe.lpush(errors_name, json.dumps(message))
+        pipe.expire(errors_name, self.ERROR_TTL)
+        pipe.ltrim(name=errors_name, start=0, end=self.ERROR_LIMIT)
+        return pipe
+
     def _propagate_to_subscribers(self, names, values):
-        """ Create a message for every subscriber """
-        subscriber_pipe = self.client.pipeline(transaction=False)
-        for name in names:
-            subscriber_pipe.smembers(name=self.subscribers_name(name=name))
-        subscribers_sets = subscriber_pipe.execute()
-        propagate_pipe = self.client.pipeline(transaction=False)
+        """ Create a message for every subscriber, now or in the background """
+        if self.fanout_executor is not None:
+            future = self.fanout_executor.submit(
+                self._fan_out, names=list(names), values=list(values)
+            )
+            future.add_done_callback(self._fan_out_done)
+            return list()
+        return self._fan_out(names=names, values=values)
+
+    def _fan_out_done(self, future):
+        """ Nobody waits on a background batch, so its failure is logged and counted """
+        if not future.cancelled() and future.exception() is not None:
+            self.fanout_stats['failures'] += 1
+            warning('Background fan-out to subscribers failed: ' + repr(future.exception()))
+
+    def _fan_out(self, names, values):
+        """ One hset per mailbox, with a field for every sender it subscribes to
+              :returns [ {"mailbox_name":str, "senders":[str], "result":int} ]
+        """
+        start_time = time.time()
+        # If a name was written twice in the batch, the later value is the message
+        latest = OrderedDict(zip(names, values))
+        subscribers = self._lookup_subscribers(sources=list(latest))
+        mailboxes = OrderedDict()
+        for sender_name, value in latest.items():
+            for subscriber in subscribers[sender_name]:
+                mailboxes.setdefault(subscriber, OrderedDict())[sender_name] = value
 
         executed = list()
-        for sender_name, value, subscribers_set in zip(names, values, subscribers_sets):
-            for subscriber in subscribers_set:
+        if mailboxes:
+            with_mapping = self.has_capability('hset_mapping')
+            propagate_pipe = self.client.pipeline(transaction=False)
+            for subscriber, mapping in mailboxes.items():
                 mailbox_name = self.messages_name(subscriber)
-                propagate_pipe.hset(name=mailbox_name, key=sender_name, value=value)
+                if with_mapping:
+                    propagate_pipe.hset(name=mailbox_name, mapping=mapping)
+                else:
+                    for sender_name, value in mapping.items():
+                        propagate_pipe.hset(name=mailbox_name, key=sender_name, value=value)
+            if self.notifications:
+                # Published after every hset, so results of the latter come first
+                for subscriber, mapping in mailboxes.items():
+                    propagate_pipe = self._pipe_messages_notification(
+                        pipe=propagate_pipe, subscriber=subscriber, messages=mapping
+                    )
+            results = iter(propagate_pipe.execute())
+            for subscriber, mapping in mailboxes.items():
+                num_results = 1 if with_mapping else len(mapping)
                 executed.append({
-                    "mailbox_name": mailbox_name, "sender": sender_name, "value": value
+                    "mailbox_name": self.messages_name(subscriber),
+                    "senders": list(mapping),
+                    "result": sum(next(results) for _ in range(num_results))
                 })
 
-        if len(executed):
-            propagation_results = MicroServerConventions.chunker(
-                results=propagate_pipe.execute(), n=len(executed)
-            )
-            for intent, res in zip(executed, propagation_results):
-                intent.update({"result": res})
-
+        elapsed = time.time() - start_time
+        self.fanout_stats['batches'] += 1
+        self.fanout_stats['senders'] += len(latest)
+        self.fanout_stats['messages'] += sum(len(ex["senders"]) for ex in executed)
+        self.fanout_stats['mailboxes'] += len(executed)
+        self.fanout_stats['seconds'] += elapsed
+        self.fanout_stats['max_seconds'] = max(self.fanout_stats['max_seconds'], elapsed)
         return executed
 
+    def _lookup_subscribers(self, sources):
+        """ :returns {source:set} using the subscriber index where possible """
+        subscriber_index = self.subscriber_index
+        if subscriber_index is None:
+            found, missing = dict(), sources
+        else:
+            generation = subscriber_index.generation
+            found, missing = subscriber_index.lookup(sources=sources)
+        if missing:
+            subscriber_pipe = self.client.pipeline(transaction=False)
+            for source in missing:
+                subscriber_pipe.smembers(name=self.subscribers_name(name=source))
+            for source, subscribers in zip(missing, subscriber_pipe.execute()):
+                found[source] = subscribers
+                if subscriber_index is not None:
+                    subscriber_index.put(
+                        source=source, subscribers=subscribers, generation=generation
+                    )
+            self.fanout_stats['subscriber_lookups'] += len(missing)
+        return found
+
     def _new_obscure_page(
             self, pipe, ndx, name, value, write_key, budget, fakeredis=False
     ):
@@ -540,8 +853,8 @@ class StreamServer(LaggedServer, ScenarioServer):
               intent       :  Explanation log in form of a dict
         """
         # Establish ownership
-        pipe.hset(name=self._ownership_name(), key=name, value=write_key)
-        pipe.sadd(self._NAMES, name)
+        pipe.hset(name=self._OWNERSHIP(), key=name, value=write_key)
+        pipe.sadd(self._NAMES(), name)
         # Charge for stream creation
         create_charge = -budget * self._CREATE_COST
         transaction_record = {
@@ -552,7 +865,7 @@ class StreamServer(LaggedServer, ScenarioServer):
             "message": "charge for new stream creation",
             "name": name
         }
-        pipe.hincrbyfloat(name=self._BALANCES, key=write_key, amount=create_charge)
+        pipe.hincrbyfloat(name=self._BALANCES(), key=write_key, amount=create_charge)
         if not fakeredis:
             log_names = [
                 self.transactions_name(write_key=write_key),
@@ -564,7 +877,7 @@ class StreamServer(LaggedServer, ScenarioServer):
                     fields=transaction_record,
                     maxlen=self.TRANSACTIONS_LIMIT
                 )
-                pipe.expire(name=ln, time=self._TRANSACTIONS_TTL)
+                pipe.expire(name=ln, time=self.TRANSACTIONS_TTL)
         # Then modify
         pipe, intent = self._modify_page(
             pipe=pipe, ndx=ndx, name=name, value=value, budget=budget
@@ -572,6 +885,12 @@ class StreamServer(LaggedServer, ScenarioServer):
         intent.update({"new": True, "write_key": write_key, "value": value})
         return pipe, intent
 
+    def _good_for_lags(self, value):
+        """ Scalars and small vectors are stored as lags, other values in history """
+        return self.is_scalar_value(value) or (
+            self.is_small_value(value) and self.is_vector_value(value)
+        )
+
     def _modify_page(self, pipe, ndx, name, value, budget):
         """ Create pipelined operations for save, buffer, history etc """
         # Remark: It is important the exactly the same number of redis operations are used
@@ -605,12 +924,15 @@ class StreamServer(LaggedServer, ScenarioServer):
         # (2) Decide how to store: lags, history or neither, but always use exactly
         # six operations
         len_in = len(pipe)
-        good_for_lags = self.is_scalar_value(value)
-        if not good_for_lags:
-            if self.is_small_value(value):
-                if self.is_vector_value(value):
-                    good_for_lags = True
-        if good_for_lags:
+        good_for_lags = self._good_for_lags(value)
+        if good_for_lags and self.packed_lags and self.is_scalar_value(value):
+            pipe = self._pipe_packed_lag(
+                pipe=pipe, name=name, t=time.time(), value=value,
+                lag_len=self._cost_based_lagged_len(value), ttl=ttl
+            )
+            for _ in range(5):  # Same hack ... insist on (6) operations here
+                pipe.expire(name=name_of_copy, time=promise_ttl)
+        elif good_for_lags:
             # Dynamically choose length of lags according to size of value
             t = time.time()
             lag_len = self._cost_based_lagged_len(value)
@@ -626,9 +948,9 @@ class StreamServer(LaggedServer, ScenarioServer):
         # Other types value field(s) may be stored in stream instead ... (note
         # again: exactly six operations so chunking of pipeline is trivial)
         if not good_for_lags:
-            if self._streams_support():
+            if self.has_capability('streams'):
                 if self.is_small_value(value):
-                    fields = MicroServerConventions.to_record(value)
+                    fields = self.to_record(value)
                 else:
                     fields = {self._POINTER: name_of_copy}
                 history = self.history_name(name)
@@ -646,16 +968,35 @@ class StreamServer(LaggedServer, ScenarioServer):
         assert len_out - len_in == 6, "Need precisely six operations so parent function" \
                                       " can chunk pipeline results"
 
+        # (3) Optionally announce the new value (one more operation for every page)
+        if self.notifications:
+            pipe = self._pipe_value_notification(
+                pipe=pipe, name=name, value=value, epoch_seconds=time.time()
+            )
+
+        # (3.5) Optionally roll up and sketch scalars (one more operation for every
+        # page, for each)
+        scalar = value if self.is_scalar_value(value) else None
+        if self.rollups:
+            pipe = self._pipe_rollup(
+                pipe=pipe, name=name, t=time.time(), value=scalar, ttl=ttl
+            )
+        if self.sketches:
+            pipe = self._pipe_sketch(
+                pipe=pipe, name=name, value=scalar,
+                lag_len=self._cost_based_lagged_len(value), ttl=ttl
+            )
+
         # (4) Construct delay promises
         utc_epoch_now = int(time.time())
         for delay in self.DELAYS:
-            # self.PROMISES+str(utc_epoch_now+delay)
-            queue = self._promise_queue_name(utc_epoch_now + delay)
             # self.DELAYED+str(delay_seconds)+self.SEP+name
             destination = self.delayed_name(name=name, delay=delay)
             promise = self._copy_promise(source=name_of_copy, destination=destination)
-            pipe.sadd(queue, promise)
-            pipe.expire(name=queue, time=promise_ttl)
+            pipe = self._pipe_promise(
+                pipe=pipe, promise=promise, destination=destination,
+                due=utc_epoch_now + delay
+            )
 
         # (5) Execution log
         intent = {
@@ -780,8 +1121,8 @@ class StreamServer(LaggedServer, ScenarioServer):
         delete_pipe.hdel(self.VOLUMES, *names)
 
         # (b-6) And de-register the name
-        delete_pipe.srem(self._NAMES, *names)
-        delete_pipe.hdel(self._ownership_name(), *names)
+        delete_pipe.srem(self._NAMES(), *names)
+        delete_pipe.hdel(self._OWNERSHIP(), *names)
 
         # TODO: Expire the leaderboards also
 
@@ -865,7 +1206,7 @@ class StreamServer(LaggedServer, ScenarioServer):
             ) for seconds in range(self._CANCEL_GRACE, -1, -1)
         ]))
         for candidate in candidates:
-            exists_pipe.stream_exists(candidate)
+            exists_pipe.exists(candidate)
         exists = exists_pipe.execute()
 
         # Get them if they exist
@@ -897,7 +1238,10 @@ class StreamServer(LaggedServer, ScenarioServer):
     # --------------------------------------------------------------------------
 
     def _baseline_prediction(self, name, value, write_key, delay):
-        # So bad !!!
+        return self._baseline_predictions(name=name, write_key=write_key, delays=[delay])[0]
+
+    def _baseline_predictions(self, name, write_key, delays):
+        # So bad !!!  ... but the lags are read once, and sampled once, for all delays
         lagged_values = self._get_lagged_implementation(
             name,
             with_times=False,
@@ -907,16 +1251,14 @@ class StreamServer(LaggedServer, ScenarioServer):
             end=None,
             count=self.num_predictions
         )
-        predictions = self.empirical_predictions(lagged_values=lagged_values)
-        return self._set_scenarios_implementation(
-            name=name, values=predictions, write_key=write_key, delay=delay)
+        predictions = self.empirical_predictions_many(
+            lagged_values=lagged_values, size=len(delays))
+        return [
+            self._set_scenarios_implementation(
+                name=name, values=delay_predictions, write_key=write_key, delay=delay)
+            for delay, delay_predictions in zip(delays, predictions)
+        ]
 
     @staticmethod
     def _flatten(list_of_lists):
         return [item for sublist in list_of_lists for item in sublist]
-
-
-class StreamServer(SummarizingHabits):
-
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
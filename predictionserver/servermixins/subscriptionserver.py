@@ -83,6 +83,7 @@ class StandaloneSubscriptionServer(SubscriptionServer, OwnershipServer, MemoServ
                 the_pipe.sadd(self.subscribers_name(_source), name)
             the_pipe.sadd(self.subscriptions_name(name), *sources)
             exec = the_pipe.execute()
+            self._invalidate_subscriber_index(sources=sources)
             return sum(exec) / 2
         else:
             return 0
@@ -96,8 +97,15 @@ class StandaloneSubscriptionServer(SubscriptionServer, OwnershipServer, MemoServ
             if self._INSTANT_RECALL:
                 pipe.hdel(self.messages_name(name), sources)
             pipe.srem(self.subscriptions_name(name), *sources)
+            self._invalidate_subscriber_index(sources=sources)
         return pipe
 
+    def _invalidate_subscriber_index(self, sources):
+        # Streams combined with this server may cache subscribers, see StreamServer
+        subscriber_index = getattr(self, 'subscriber_index', None)
+        if subscriber_index is not None:
+            subscriber_index.invalidate(sources=sources)
+
     def _permissioned_unsubscribe_implementation(
             self, name, write_key, source=None, sources: Optional[NameList] = None
     ):
@@ -95,7 +95,9 @@ class SummarizingServer:
         derived = list(self.derived_names(name).values())
         private_derived = list(self._private_derived_names(name).values())
         mem_pipe = self.client.pipeline()
-        if with_private:
+        if not self.has_capability('memory_usage'):
+            all_names = list()
+        elif with_private:
             all_names = [name] + derived + private_derived
         else:
             all_names = [name] + derived
@@ -0,0 +1,181 @@
+import asyncio
+import time
+import functools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from logging import warning
+
+
+# One process can drive all background work by handing the admin_* methods of
+# a server to a DaemonScheduler, rather than having cron-like callers poll them.
+#
+# Each task is called repeatedly at its cadence while it finds work to do, and
+# backs off geometrically (up to max_backoff seconds) when it returns nothing.
+# The admin methods are synchronous, so they run in a small thread pool whose
+# size is the concurrency limit.
+
+
+class DaemonTask:
+
+    def __init__(self, name, method, cadence=1.0, max_backoff=60.0, backoff=2.0,
+                 kwargs=None):
+        """
+        :param method:       Callable returning a count of work done, a collection
+                             of work done, or None
+        :param cadence:      Seconds between calls while there is work
+        :param max_backoff:  Longest wait between calls when there is no work
+        :param backoff:      Multiplier applied to the wait after each idle call
+        """
+        self.name = name
+        self.method = method
+        self.cadence = cadence
+        self.max_backoff = max(max_backoff, cadence)
+        self.backoff = backoff
+        self.kwargs = kwargs or dict()
+        self.wait = cadence
+        self.counters = OrderedDict([
+            ('runs', 0),
+            ('idle', 0),
+            ('failures', 0),
+            ('work', 0),
+            ('busy_seconds', 0.),
+            ('last_latency', None),
+            ('max_latency', 0.),
+            ('max_lag', 0.),
+            ('last_run', None)
+        ])
+
+    @staticmethod
+    def amount_of_work(result):
+        """ Interpret whatever an admin method returns as a number of items processed """
+        if result is None:
+            return 0
+        if isinstance(result, (int, float)):
+            return result
+        try:
+            return len(result)
+        except TypeError:
+            return 1
+
+    def record(self, result, latency, lag, failed=False):
+        work = 0 if failed else self.amount_of_work(result)
+        self.counters['runs'] += 1
+        self.counters['failures'] += int(failed)
+        self.counters['idle'] += int(not work)
+        self.counters['work'] += work
+        self.counters['busy_seconds'] += latency
+        self.counters['last_latency'] = latency
+        self.counters['max_latency'] = max(self.counters['max_latency'], latency)
+        self.counters['max_lag'] = max(self.counters['max_lag'], lag)
+        self.counters['last_run'] = time.time()
+        if work:
+            self.wait = self.cadence
+        else:
+            self.wait = min(self.max_backoff, self.wait * self.backoff)
+        return work
+
+    def stats(self):
+        stats = OrderedDict(self.counters)
+        busy_seconds = self.counters['busy_seconds']
+        stats['throughput'] = self.counters['work'] / busy_seconds if busy_seconds else 0.
+        stats['wait'] = self.wait
+        return stats
+
+
+class DaemonScheduler:
+
+    # Cadence in seconds for admin methods found by from_server()
+    CADENCES = OrderedDict([
+        ('admin_promises', 1.0),
+        ('admin_cancellations', 10.0),
+        ('admin_shrinkage', 30.0),
+        ('admin_garbage_collection', 60.0),
+        ('admin_bankruptcy', 300.0),
+    ])
+
+    def __init__(self, concurrency: int = 2):
+        """
+        :param concurrency:   Maximum number of admin methods running at once
+        """
+        self.concurrency = concurrency
+        self.tasks = OrderedDict()
+        self._stopping = None
+
+    @classmethod
+    def from_server(cls, server, cadences: dict = None, concurrency: int = 2,
+                    max_backoff=60.0):
+        """ Schedule every admin method the server happens to have """
+        scheduler = cls(concurrency=concurrency)
+        for name, cadence in (cadences or cls.CADENCES).items():
+            method = getattr(server, name, None)
+            if method is not None:
+                scheduler.add_task(
+                    name=name, method=method, cadence=cadence, max_backoff=max_backoff
+                )
+        return scheduler
+
+    def add_task(self, name, method, cadence=1.0, max_backoff=60.0, backoff=2.0,
+                 **kwargs):
+        self.tasks[name] = DaemonTask(
+            name=name, method=method, cadence=cadence, max_backoff=max_backoff,
+            backoff=backoff, kwargs=kwargs
+        )
+        return self.tasks[name]
+
+    def stats(self):
+        return OrderedDict([(name, task.stats()) for name, task in self.tasks.items()])
+
+    def stop(self):
+        if self._stopping is not None:
+            self._stopping.set()
+
+    def run_for(self, seconds=None):
+        """ Blocking. Run all tasks for a while, or until stop() if seconds is None """
+        return asyncio.run(self.run(seconds=seconds))
+
+    async def run(self, seconds=None):
+        self._stopping = asyncio.Event()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            loops = [
+                self._task_loop(task=task, semaphore=semaphore, executor=executor)
+                for task in self.tasks.values()
+            ]
+            if seconds is not None:
+                loops.append(self._stop_after(seconds))
+            await asyncio.gather(*loops)
+        return self.stats()
+
+    async def _stop_after(self, seconds):
+        await self._sleep(seconds)
+        self.stop()
+
+    async def _sleep(self, seconds):
+        """ Sleep, but wake up immediately if stopped """
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _task_loop(self, task, semaphore, executor):
+        loop = asyncio.get_running_loop()
+        while not self._stopping.is_set():
+            due = time.time()
+            async with semaphore:
+                if self._stopping.is_set():
+                    break
+                start_time = time.time()
+                failed = False
+                result = None
+                try:
+                    result = await loop.run_in_executor(
+                        executor, functools.partial(task.method, **task.kwargs)
+                    )
+                except Exception as e:
+                    failed = True
+                    warning(task.name + ' failed: ' + str(e))
+                task.record(
+                    result=result, latency=time.time() - start_time,
+                    lag=start_time - due, failed=failed
+                )
+            await self._sleep(task.wait)
@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+
+
+# A bounded in-process cache with least recently used eviction and hit counts, for
+# looking up many keys at once. Safe to share between request threads.
+
+
+class LruCache:
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def lookup(self, keys):
+        """ :returns  {key:value}, [key]  for cached and missing keys """
+        found = dict()
+        missing = list()
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key, _MISSING)
+                if value is _MISSING:
+                    missing.append(key)
+                else:
+                    self._entries.move_to_end(key)
+                    found[key] = value
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put(self, mapping):
+        with self._lock:
+            for key, value in mapping.items():
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys=None):
+        """ Forget some keys, or everything """
+        with self._lock:
+            if keys is None:
+                self._entries.clear()
+            else:
+                for key in keys:
+                    self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return OrderedDict([
+                ('size', len(self._entries)),
+                ('hits', self.hits),
+                ('misses', self.misses),
+                ('hit_rate', self.hits / lookups if lookups else 0.)
+            ])
+
+
+_MISSING = object()
@@ -0,0 +1,135 @@
+import numpy as np
+
+
+# An optional in-process mirror of the predictions::<delay>::<name> and
+# samples::<delay>::<name> sorted sets.
+#
+# Each mirrored sorted set is held as a score array sorted in redis order (score, then
+# member) together with parallel arrays of tickets, percentiles and owners. Every
+# writer bumps a per-sorted-set version counter in redis, so a reader can tell when its
+# copy is stale and reload it. Writers in the same process apply their own changes
+# directly, provided nobody else wrote in between.
+
+
+class ScenarioIndex:
+
+    def __init__(self, decoder=None):
+        """
+        :param decoder:   Function taking [ticket] and returning (percentiles, owners)
+        """
+        self.decoder = decoder
+        self._entries = dict()
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def version(self, name):
+        entry = self._entries.get(name)
+        return None if entry is None else entry['version']
+
+    def card(self, name):
+        entry = self._entries.get(name)
+        return 0 if entry is None else len(entry['scores'])
+
+    def is_fresh(self, name, version, card=None):
+        """ True if the local copy matches the version (and cardinality) in redis """
+        entry = self._entries.get(name)
+        if entry is None or entry['version'] != int(version or 0):
+            return False
+        return card is None or len(entry['scores']) == card
+
+    def invalidate(self, name):
+        self._entries.pop(name, None)
+
+    def load(self, name, items, version):
+        """ Replace local copy with the result of zrange(..., withscores=True) """
+        tickets = np.array([ticket for ticket, _ in items], dtype=str)
+        scores = np.array([score for _, score in items], dtype=float)
+        self._set(name=name, tickets=tickets, scores=scores, version=version)
+
+    def insert(self, name, mapping: dict, version):
+        """ Apply zadd(name, mapping) locally, or invalidate if someone else wrote """
+        entry = self._entries.get(name)
+        if entry is None or entry['version'] + 1 != int(version):
+            self.invalidate(name)
+        else:
+            new_tickets = np.array(list(mapping.keys()), dtype=str)
+            new_scores = np.array(list(mapping.values()), dtype=float)
+            keep = ~np.isin(entry['tickets'], new_tickets)
+            self._set(
+                name=name,
+                tickets=np.concatenate([entry['tickets'][keep], new_tickets]),
+                scores=np.concatenate([entry['scores'][keep], new_scores]),
+                version=version
+            )
+
+    def remove(self, name, tickets, version):
+        """ Apply zrem(name, *tickets) locally, or invalidate if someone else wrote """
+        entry = self._entries.get(name)
+        if entry is None or entry['version'] + 1 != int(version):
+            self.invalidate(name)
+        else:
+            keep = ~np.isin(entry['tickets'], np.array(list(tickets), dtype=str))
+            entry.update({
+                'version': int(version),
+                'scores': entry['scores'][keep],
+                'tickets': entry['tickets'][keep],
+                'percentiles': entry['percentiles'][keep],
+                'owners': entry['owners'][keep]
+            })
+
+    def around(self, name, values, half_widths, limit: int = None):
+        """ Tickets near each value, mimicking a pair of range queries per window
+
+              values        [float]
+              half_widths   [float]
+              :returns  ups, dns    ups[value_ndx][window_ndx] is what
+                                    zrangebyscore(min=value, max=value+half_width,
+                                    start=0, num=limit) would return, and dns the same
+                                    for zrevrangebyscore(max=value, min=value-half_width)
+        """
+        entry = self._entries.get(name)
+        values = np.asarray(values, dtype=float).reshape(-1, 1)
+        half_widths = np.asarray(half_widths, dtype=float).reshape(1, -1)
+        if entry is None:
+            scores, tickets = np.zeros(0), np.zeros(0, dtype=str)
+        else:
+            scores, tickets = entry['scores'], entry['tickets']
+
+        # All boundaries located at once: inclusive bounds to the left and right
+        left = np.searchsorted(scores, np.hstack([values, values - half_widths]), 'left')
+        right = np.searchsorted(scores, np.hstack([values, values + half_widths]), 'right')
+        up_start, dn_start = left[:, :1], left[:, 1:]
+        dn_end, up_end = right[:, :1], right[:, 1:]
+        if limit is not None:
+            up_end = np.minimum(up_end, up_start + limit)
+            dn_start = np.maximum(dn_start, dn_end - limit)
+        up_start = np.broadcast_to(up_start, up_end.shape)
+        dn_end = np.broadcast_to(dn_end, dn_start.shape)
+        ups = [
+            [tickets[s:e].tolist() for s, e in zip(us, ue)]
+            for us, ue in zip(up_start, up_end)
+        ]
+        dns = [
+            [tickets[s:e][::-1].tolist() for s, e in zip(ds, de)]
+            for ds, de in zip(dn_start, dn_end)
+        ]
+        return ups, dns
+
+    def _set(self, name, tickets, scores, version):
+        order = np.lexsort((tickets, scores))
+        tickets, scores = tickets[order], scores[order]
+        if self.decoder is not None and len(tickets):
+            percentiles, owners = self.decoder(tickets)
+        else:
+            percentiles, owners = np.zeros(len(tickets)), np.array(tickets, dtype=str)
+        self._entries[name] = {
+            'version': int(version or 0),
+            'scores': scores,
+            'tickets': tickets,
+            'percentiles': np.asarray(percentiles, dtype=float),
+            'owners': np.asarray(owners)
+        }
@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# An optional in-process cache of subscribers::<source> sets, i.e. the reverse index
+# from a stream to the streams that subscribe to it, used when fanning out messages.
+#
+# Entries expire after ttl seconds, which bounds how long a subscription made by
+# another process can go unnoticed. Subscription changes made through this process
+# invalidate the affected sources immediately. The least recently used sources are
+# dropped once there are more than max_sources.
+#
+# The index is shared by request threads and the background fan-out. A set read from
+# redis is only put if nothing was invalidated since the read began (see generation),
+# as otherwise it might predate a subscription change made here.
+
+
+class SubscriberIndex:
+
+    def __init__(self, ttl=5.0, max_sources=10000):
+        self.ttl = ttl
+        self.max_sources = max_sources
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.generation = 0  # Incremented by every invalidation
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, sources):
+        """ :returns  {source:set}, [source]  for cached and missing sources """
+        now = time.time()
+        found = dict()
+        missing = list()
+        with self._lock:
+            for source in sources:
+                entry = self._entries.get(source)
+                if entry is None or entry[0] < now:
+                    missing.append(source)
+                else:
+                    self._entries.move_to_end(source)
+                    found[source] = entry[1]
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put(self, source, subscribers, generation=None):
+        """ Cache subscribers read from redis
+              generation   The generation when the read began, if it might be stale
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[source] = (time.time() + self.ttl, set(subscribers))
+            self._entries.move_to_end(source)
+            while len(self._entries) > self.max_sources:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, sources=None):
+        """ Forget some sources, or everything """
+        with self._lock:
+            self.generation += 1
+            if sources is None:
+                self._entries.clear()
+            else:
+                for source in sources:
+                    self._entries.pop(source, None)
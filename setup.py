@@ -1,5 +1,5 @@
 import pathlib
-from setuptools import setup
+from setuptools import setup, find_packages
 
 HERE = pathlib.Path(__file__).parent
 
@@ -20,7 +20,7 @@ setup(
         "Programming Language :: Python :: 3",
         "Programming Language :: Python :: 3.7",
     ],
-    packages=["predictionserver"],
+    packages=find_packages(include=["predictionserver", "predictionserver.*"]),
     test_suite='pytest',
     tests_require=['pytest', 'fakeredis', 'pytest-flask'],
     include_package_data=True,
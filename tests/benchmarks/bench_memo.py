@@ -0,0 +1,96 @@
+from predictionserver.futureconventions.memoconventions import (
+    Memo, Activity, ActivityContext
+)
+from predictionserver.futureconventions.keyconventions import KeyConventions
+from collections import OrderedDict
+from copy import deepcopy
+import datetime
+import json
+import time
+import timeit
+import uuid
+
+# Cost of building a memo and turning it into a log entry, as MemoServer does for
+# almost every call, with the OrderedDict based Memo that used to be used and the
+# slotted one.
+
+NUMBER = 20000
+WRITE_KEY = 'bench_memo_write_key'
+
+
+class LegacyMemo(OrderedDict):
+    """ The OrderedDict based Memo, abridged """
+
+    def __init__(self, **kwargs):
+        self._initialized = False
+        super().__init__([
+            (k, kwargs.get(k, default))
+            for k, default in zip(Memo._FIELDS, _LEGACY_DEFAULTS)
+        ])
+        self['epoch_time'] = kwargs.get('epoch_time') or time.time()
+        self['timestr'] = str(datetime.datetime.now())
+        self['memo_id'] = str(uuid.uuid4())
+        self._initialized = True
+
+    def __setitem__(self, key, value):
+        if self._initialized:
+            if key not in self.keys():
+                raise Exception(key + ' is not a valid memo field')
+            existing_value = self[key]
+            if existing_value is None or type(value) is type(existing_value):
+                super().__setitem__(key, value)
+            else:
+                raise Exception(
+                    key + ' is supposed to be type ' + str(type(existing_value))
+                )
+        else:
+            super().__setitem__(key, value)
+
+    def as_dict(self, cast_to_str=True, leave_out_none=True, flatten_data=True):
+        d = OrderedDict([
+            (k, v) for k, v in dict(self).items() if v is not None
+        ]) if leave_out_none else OrderedDict(self)
+        if cast_to_str:
+            for k in Memo._ENUM_FIELDS:
+                if k in d:
+                    d[k] = str(d[k])
+        if flatten_data and d.get('data') is not None:
+            if isinstance(d.get('data'), dict):
+                data = deepcopy(d['data'])
+                del (d['data'])
+                d.update(data)
+        return d
+
+
+_LEGACY_DEFAULTS = [1 if k == 'success' else -1 if k == 'execution' else None
+                    for k in Memo._FIELDS]
+
+
+def legacy_entry():
+    memo = LegacyMemo(activity=Activity.set, context=ActivityContext.lagged,
+                      write_key=WRITE_KEY, name='die.json', data={'care': 7, 'dog': 13})
+    memo['success'] = 1
+    d = memo.as_dict(cast_to_str=True, leave_out_none=True, flatten_data=True)
+    d['code'] = KeyConventions.code_from_code_or_key(d.pop('write_key'))
+    return json.dumps(d).replace('obscure', 'OBSCURE')
+
+
+def slotted_entry():
+    memo = Memo(activity=Activity.set, context=ActivityContext.lagged,
+                write_key=WRITE_KEY, name='die.json', data={'care': 7, 'dog': 13})
+    memo['success'] = 1
+    return memo.as_bytes(
+        code_from_key=KeyConventions.code_from_code_or_key
+    ).replace(b'obscure', b'OBSCURE')
+
+
+def run():
+    results = dict()
+    for label, entry in [('ordereddict', legacy_entry), ('slotted', slotted_entry)]:
+        results[label] = min(timeit.repeat(entry, number=NUMBER, repeat=3)) / NUMBER
+        print('{:12s}{:8.2f} us per memo'.format(label, 1e6 * results[label]))
+    return results
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,75 @@
+from predictionserver.servermixins.streamserver import StreamServer
+from predictionserver.set_config import MICRO_TEST_CONFIG
+import redis
+import time
+
+# Latency of repeated writes to streams that already exist, with and without
+# scripted writes, against the test redis instance. Network round trips are
+# what the script saves, so fakeredis would understate the difference.
+
+NUM_STREAMS = 10
+NUM_ROUNDS = 50
+
+
+def _round_trips(server):
+    """ Count pipeline and command executions made by server.client """
+    counter = {'n': 0}
+    execute_command = server.client.execute_command
+
+    def counted(*args, **kwargs):
+        counter['n'] += 1
+        return execute_command(*args, **kwargs)
+
+    server.client.execute_command = counted
+    pipeline = server.client.pipeline
+
+    def counted_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def counted_execute(*a, **k):
+            counter['n'] += 1
+            return execute(*a, **k)
+
+        pipe.execute = counted_execute
+        return pipe
+
+    server.client.pipeline = counted_pipeline
+    return counter
+
+
+def _connected(scripted):
+    server = StreamServer()
+    server.connect(**MICRO_TEST_CONFIG)
+    server.set_obscurity('mset_benchmark')
+    server.enable_scripted_writes(enable=scripted)
+    return server
+
+
+def run():
+    results = dict()
+    write_key = MICRO_TEST_CONFIG['BABLOH_CATTLE']
+    names = ['bench_mset_' + str(k) + '.json' for k in range(NUM_STREAMS)]
+    for scripted in [False, True]:
+        server = _connected(scripted=scripted)
+        server._mset_implementation(names=names, values=[0.0] * NUM_STREAMS,
+                                    write_keys=[write_key] * NUM_STREAMS)
+        counter = _round_trips(server)
+        start_time = time.time()
+        for k in range(NUM_ROUNDS):
+            server._mset_implementation(names=names, values=[float(k)] * NUM_STREAMS,
+                                        write_keys=[write_key] * NUM_STREAMS)
+        elapsed = time.time() - start_time
+        results[scripted] = elapsed / NUM_ROUNDS
+        print(('scripted  ' if scripted else 'pipelined ')
+              + '{:8.2f} ms per mset, '.format(1000 * results[scripted])
+              + '{:6.1f} round trips'.format(counter['n'] / NUM_ROUNDS))
+        server.client.delete(*names)
+    return results
+
+
+if __name__ == '__main__':
+    try:
+        run()
+    except redis.exceptions.ConnectionError:
+        print('Needs the redis instance in MICRO_TEST_CONFIG')
@@ -0,0 +1,65 @@
+from predictionserver.servermixins.promisedaemon import PromiseDaemon
+from predictionserver.servermixins.scenarioserver import ScenarioServer
+import fakeredis
+import time
+
+# Throughput of PromiseDaemon.admin_promises against fakeredis, in promises
+# fulfilled per second, for one daemon over all shards and for several daemons
+# splitting the shards between them (run one after the other here).
+
+NUM_PROMISES = 10000
+WORKERS = [1, 2, 4]
+
+
+def _connected(cls, server):
+    instance = cls()
+    instance.client = fakeredis.FakeStrictRedis(server=server, decode_responses=True)
+    instance.set_obscurity('promise_benchmark')
+    return instance
+
+
+def _populate(producer, num):
+    due = int(time.time())
+    pipe = producer.client.pipeline(transaction=False)
+    for k in range(num):
+        source = 'copy_' + str(k)
+        destination = producer.delayed_name(name='stream_' + str(k) + '.json', delay=70)
+        pipe.set(name=source, value=str(k))
+        pipe = producer._pipe_promise(
+            pipe=pipe,
+            promise=producer._copy_promise(source=source, destination=destination),
+            destination=destination,
+            due=due
+        )
+    pipe.execute()
+
+
+def run():
+    results = dict()
+    for num_workers in WORKERS:
+        server = fakeredis.FakeServer()
+        producer = _connected(ScenarioServer, server)
+        _populate(producer, num=NUM_PROMISES)
+        daemons = [_connected(PromiseDaemon, server) for _ in range(num_workers)]
+        for daemon in daemons:
+            daemon._DELAY_GRACE = 3600  # Populating takes a while, don't expire
+            # The one-off move of legacy queues is not what is being measured
+            daemon._drain_legacy_promises(epoch_seconds=int(time.time()))
+            daemon._legacy_promises_drained = True
+        shards = list(range(producer._PROMISE_SHARDS))
+        start_time = time.time()
+        fulfilled = sum(
+            daemon.admin_promises(shards=shards[worker::num_workers])
+            for worker, daemon in enumerate(daemons)
+        )
+        elapsed = time.time() - start_time
+        assert fulfilled == NUM_PROMISES, fulfilled
+        results[num_workers] = fulfilled / elapsed
+        print(str(num_workers) + ' worker(s) {:10.0f} promises/s'.format(
+            results[num_workers]
+        ))
+    return results
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,35 @@
+from predictionserver.futureconventions.samplers import exponential_bootstrap, \
+    exponential_bootstrap_many
+import numpy as np
+import timeit
+
+# Baseline predictions for every horizon of a stream: one bootstrap per horizon, as
+# _baseline_prediction() once did, against drawing all horizons in one call.
+
+NUM_LAGGED = 225
+NUM = 225
+NUM_DELAYS = 4
+REPEATS = 20
+
+
+def per_horizon(lagged):
+    return [exponential_bootstrap(lagged=lagged, decay=0.005, num=NUM)
+            for _ in range(NUM_DELAYS)]
+
+
+def all_horizons(lagged):
+    return exponential_bootstrap_many(lagged=lagged, decay=0.005, num=NUM, size=NUM_DELAYS)
+
+
+def run():
+    lagged = list(np.random.default_rng(0).standard_normal(NUM_LAGGED))
+    timings = dict()
+    for label, path in [('per_horizon', per_horizon), ('all_horizons', all_horizons)]:
+        timings[label] = min(timeit.repeat(lambda: path(lagged), number=1, repeat=REPEATS))
+        print(label.ljust(12) + ' {:8.3f} ms'.format(1000 * timings[label]))
+    print('speedup      {:8.1f} x'.format(timings['per_horizon'] / timings['all_horizons']))
+    return timings
+
+
+if __name__ == '__main__':
+    run()
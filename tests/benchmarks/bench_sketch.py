@@ -0,0 +1,44 @@
+from predictionserver.servermixins.sketchserver import SketchServer
+import numpy as np
+import timeit
+
+# Default CDF abscissae for a stream with plenty of history: digesting the lagged
+# values on every request, as get_cdf() does without sketches, against reading the
+# sketch maintained as values were written. Both read from (fake) redis.
+
+NUM_VALUES = 3000
+LAG_LEN = 1999
+REPEATS = 10
+
+
+def lagged_path(server):
+    lagged_values = server.to_float(
+        server.client.lrange(server.lagged_values_name('x.json'), 0, LAG_LEN)
+    )
+    return server.cdf_values(lagged_values=lagged_values, num=20, as_discrete=None)
+
+
+def sketch_path(server):
+    return server.get_sketch_values(name='x.json', num=20)
+
+
+def run():
+    np.random.seed(0)
+    server = SketchServer()
+    server.enable_sketches()
+    values = np.random.randn(NUM_VALUES)
+    pipe = server.client.pipeline()
+    for value in values:
+        server._pipe_sketch(pipe=pipe, name='x.json', value=value, lag_len=LAG_LEN, ttl=600)
+    pipe.lpush(server.lagged_values_name('x.json'), *values.tolist())
+    pipe.execute()
+    timings = dict()
+    for label, path in [('lagged', lagged_path), ('sketch', sketch_path)]:
+        timings[label] = min(timeit.repeat(lambda: path(server), number=1, repeat=REPEATS))
+        print(label.ljust(8) + ' {:8.3f} ms'.format(1000 * timings[label]))
+    print('speedup  {:8.1f} x'.format(timings['lagged'] / timings['sketch']))
+    return timings
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,61 @@
+from predictionserver.futureconventions.statsconventions import StatsConventions
+from predictionserver.habits import Habits
+from statistics import NormalDist
+import numpy as np
+import timeit
+from collections import defaultdict
+
+# Compares the per-element path that settlement and CDF used to take with the
+# array based one: ticket parsing, then zmean_percentile per segment.
+
+NUM_TICKETS = 2000
+NUM_SEGMENTS = 50
+REPEATS = 20
+
+
+def _tickets(num):
+    ks = np.random.randint(low=0, high=225, size=num)
+    owners = np.random.randint(low=0, high=200, size=num)
+    return [str(k).zfill(8) + '::' + 'write_key_' + str(o) for k, o in zip(ks, owners)]
+
+
+def scalar_path(habits, tickets, segments):
+    percentiles = [(0.5 + float(t.split('::')[0])) / habits.num_predictions
+                   for t in tickets]
+    _ = [t.split('::')[1] for t in tickets]
+    grouped = defaultdict(list)
+    for p, segment in zip(percentiles, segments):
+        grouped[segment].append(p)
+    summaries = list()
+    for segment in range(NUM_SEGMENTS):
+        zscores = [NormalDist(mu=0, sigma=1.0).inv_cdf(p) for p in grouped[segment]]
+        summaries.append(NormalDist(mu=0, sigma=1.0).cdf(np.nanmean(zscores)))
+    return summaries
+
+
+def array_path(habits, tickets, segments):
+    percentiles, _ = habits._decode_scenarios(tickets)
+    return StatsConventions.segment_zmean_percentile(
+        segments=segments, ps=percentiles, num_segments=NUM_SEGMENTS
+    )
+
+
+def run():
+    np.random.seed(0)
+    habits = Habits()
+    tickets = _tickets(NUM_TICKETS)
+    segments = np.random.randint(low=0, high=NUM_SEGMENTS, size=NUM_TICKETS)
+    assert np.allclose(scalar_path(habits, tickets, segments),
+                       array_path(habits, tickets, segments))
+    timings = dict()
+    for label, path in [('scalar', scalar_path), ('array', array_path)]:
+        timings[label] = min(timeit.repeat(
+            lambda: path(habits, tickets, segments), number=1, repeat=REPEATS
+        ))
+        print(label.ljust(8) + ' {:8.3f} ms'.format(1000 * timings[label]))
+    print('speedup  {:8.1f} x'.format(timings['scalar'] / timings['array']))
+    return timings
+
+
+if __name__ == '__main__':
+    run()
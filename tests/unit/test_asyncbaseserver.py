@@ -0,0 +1,156 @@
+from predictionserver.servermixins.asyncbaseserver import AsyncBaseServer
+from predictionserver.servermixins.baseserver import BaseServer
+from predictionserver.futureconventions.keyconventions import KeyConventions
+from predictionserver.futureconventions.leaderboardconventions import (
+    LeaderboardGranularity
+)
+import asyncio
+import redis
+import redis.asyncio
+import random
+import numpy as np
+
+
+def _server_with_predictions():
+    server = AsyncBaseServer()
+    server.set_obscurity('async_test')
+    rng = random.Random(7)
+    owners = ['key_' + str(k) for k in range(6)]
+    name, delay = 'die.json', server.DELAYS[0]
+    server.client.zadd(
+        server._predictions_name(name=name, delay=delay),
+        mapping=dict([
+            (str(k).zfill(8) + '::' + rng.choice(owners), rng.gauss(0, 1))
+            for k in range(server.num_predictions)
+        ])
+    )
+    server.client.zadd(
+        server.leaderboard_name(
+            granularity=LeaderboardGranularity.name_and_delay, name=name, delay=delay
+        ),
+        mapping=dict([(server.shash(owner), 1.0) for owner in owners])
+    )
+    return server, name, delay
+
+
+def test_pools_are_shared():
+    server_1, server_2 = BaseServer(), BaseServer()
+    client_1 = server_1._make_redis_client(host='localhost', port=6399)
+    client_2 = server_2._make_redis_client(host='localhost', port=6399)
+    client_3 = server_2._make_redis_client(host='localhost', port=6399, db=2)
+    assert client_1.connection_pool is client_2.connection_pool
+    assert client_1.connection_pool is not client_3.connection_pool
+    assert client_1.connection_pool.max_connections == BaseServer._POOL_DEFAULTS[
+        'max_connections']
+    server_1.set_client_factory(lambda **redis_kwargs: redis_kwargs)
+    assert server_1._make_redis_client(host='localhost')['decode_responses']
+
+
+def test_async_reads():
+    server = AsyncBaseServer()
+    server.set_obscurity('async_test')
+    server.client.set('die.json', 3.0)
+    server.client.lpush(server.lagged_values_name('die.json'), 1.0, 2.0)
+    server.client.lpush(server.lagged_times_name('die.json'), 10.0, 20.0)
+    lb = server.leaderboard_name(granularity='name', name='die.json')
+    server.client.zadd(lb, mapping={server.shash('a_key'): 1.0, server.shash('b_key'): 2.0})
+
+    async def read():
+        value = await server.get('die.json')
+        lagged = await server.get_lagged('die.json')
+        lagged_values = await server.get('lagged_values::die.json')
+        leaderboard = await server.get_leaderboard(
+            granularity='name', name='die.json', readable=False
+        )
+        return value, lagged, lagged_values, leaderboard
+
+    value, lagged, lagged_values, leaderboard = asyncio.run(read())
+    assert value == '3.0'
+    assert lagged == [(20.0, 2.0), (10.0, 1.0)]
+    assert lagged_values == [2.0, 1.0]
+    assert list(leaderboard.values()) == [2.0, 1.0]
+
+
+def test_async_packed_lags():
+    server = AsyncBaseServer()
+    server.enable_packed_lags()
+    pipe = server.client.pipeline(transaction=False)
+    for t, value in [(10.0, 1.0), (20.0, 2.0)]:
+        pipe = server._pipe_packed_lag(
+            pipe=pipe, name='die.json', t=t, value=value, lag_len=100, ttl=60
+        )
+    pipe.execute()
+    lagged = asyncio.run(server.get_lagged('die.json'))
+    assert lagged == [(20.0, 2.0), (10.0, 1.0)]
+    lagged = asyncio.run(server.get_lagged('die.json', start=1, to_float=False))
+    assert lagged == [('10.0', '1.0')]
+
+
+def test_async_cdf_with_and_without_index():
+    server, name, delay = _server_with_predictions()
+    values = [-1.0, -0.5, 0.0, 0.5, 1.0]
+    cdf = asyncio.run(server.get_cdf(name=name, delay=delay, values=values))
+    assert len(cdf['x']) == len(cdf['y']) and len(cdf['x']) > 0
+    assert all(np.diff(cdf['y']) >= 0)
+    server.enable_scenario_index()
+    assert asyncio.run(server.get_cdf(name=name, delay=delay, values=values)) == cdf
+    empty = asyncio.run(server.get_cdf(name=name, delay=server.DELAYS[1], values=values))
+    assert empty == {"message": "No predictions."}
+
+
+def test_async_cdf_result_cache():
+    server, name, delay = _server_with_predictions()
+    values = [-1.0, 0.0, 1.0]
+    cdf = asyncio.run(server.get_cdf(name=name, delay=delay, values=values))
+    server.enable_result_cache(maxsize=10)
+    for _ in range(3):
+        assert asyncio.run(server.get_cdf(name=name, delay=delay, values=values)) == cdf
+    assert server.get_result_cache_stats()['cdf']['hits'] == 2
+
+    # A new version of the predictions is a miss
+    predictions_name = server._predictions_name(name=name, delay=delay)
+    server.client.zadd(predictions_name, mapping={'00000200::key_0': 0.01})
+    server.client.hincrby(server._SCENARIO_VERSIONS(), predictions_name, 1)
+    changed = asyncio.run(server.get_cdf(name=name, delay=delay, values=values))
+    assert server.get_result_cache_stats()['cdf']['misses'] == 2
+    assert changed != cdf
+
+    predictions = server.get_predictions(name=name, delay=delay)
+    predictions['mutated'] = 1.0
+    assert server.get_predictions(name=name, delay=delay) == \
+        server._get_predictions_implementation(name=name, delay=delay)
+    stats = server.get_result_cache_stats()['distributions']
+    assert stats['hits'] == 2 and stats['misses'] == 1 and stats['size'] == 1
+
+
+def test_connect_with_connection_pool():
+    server = AsyncBaseServer()
+    pool = redis.ConnectionPool(host='localhost', port=6399, db=3, max_connections=7)
+    server.connect(connection_pool=pool)
+    assert server.client.connection_pool is pool
+    assert isinstance(server.aclient, redis.asyncio.StrictRedis)
+    async_kwargs = server.aclient.connection_pool.connection_kwargs
+    assert (async_kwargs['host'], async_kwargs['port'], async_kwargs['db']) == \
+        ('localhost', 6399, 3)
+    assert async_kwargs['decode_responses']
+    assert server.aclient.connection_pool.max_connections == 7
+    unix_pool = redis.ConnectionPool(
+        connection_class=redis.UnixDomainSocketConnection, path='/tmp/no_redis.sock'
+    )
+    server.connect(connection_pool=unix_pool)
+    assert server.aclient.connection_pool.connection_kwargs['path'] == '/tmp/no_redis.sock'
+
+
+def test_async_leaderboard_shares_redis_animals():
+    server = AsyncBaseServer()
+    server.set_obscurity('async_test')
+    server.enable_redis_animals()
+    write_key = KeyConventions.create_key(difficulty=6)
+    known, unknown = server.shash('a_key'), server.shash(write_key)
+    server.client.hset(server._ANIMALS(), known, 'Shared Animal')
+    lb = server.leaderboard_name(granularity='name', name='die.json')
+    server.client.zadd(lb, mapping={known: 1.0, unknown: 2.0})
+    leaderboard = asyncio.run(server.get_leaderboard(granularity='name', name='die.json'))
+    animal = KeyConventions.animal_from_code(unknown)
+    assert list(leaderboard.items()) == [(animal, 2.0), ('Shared Animal', 1.0)]
+    assert server.client.hget(server._ANIMALS(), unknown) == animal
@@ -0,0 +1,52 @@
+from predictionserver.servermixins import bufferedsink
+from predictionserver.servermixins.metricserver import (
+    MetricServer, MetricType, MetricGranularity
+)
+from predictionserver.servermixins.memoserver import MemoServer
+import gc
+import threading
+import time
+import weakref
+
+
+def test_sink_due_and_drain():
+    sink = bufferedsink.BufferedSink(flush_size=2, flush_seconds=60, counters=('x',))
+    assert not sink.due() and sink.staleness() == 0.
+    with sink._lock:
+        sink._arrived()
+        sink._pending['a'] = 1
+    assert not sink.due() and sink.staleness() > 0
+    sink._pending['b'] = 2
+    assert sink.due() and len(sink) == 2
+    assert sink.drain() == {'a': 1, 'b': 2} and sink.drain() == {}
+    stats = sink.stats()
+    assert stats['flushes'] == 1 and stats['pending'] == 0 and stats['staleness'] == 0.
+
+
+def test_pending_metrics_flushed_at_exit():
+    server = MetricServer()
+    server.set_obscurity('exit_test')
+    server.enable_metric_sink(background=False)
+    server.incr_metric(metric=MetricType.volume, granularity=MetricGranularity.name,
+                       amount=2, name='a.json')
+    bufferedsink._flush_at_exit()
+    assert server.get_metric(
+        metric=MetricType.volume, granularity=MetricGranularity.name, name='a.json'
+    ) == 2
+
+
+def test_sinks_do_not_keep_servers_alive():
+    num_threads = threading.active_count()
+    servers = [MetricServer(), MemoServer()]
+    servers[0].enable_metric_sink(flush_seconds=0.02)
+    servers[1].enable_memo_sink(flush_seconds=0.02)
+    refs = [weakref.ref(server) for server in servers]
+    assert threading.active_count() == num_threads + 2
+    del servers
+    gc.collect()
+    assert all(ref() is None for ref in refs)
+    deadline = time.time() + 5
+    while threading.active_count() > num_threads and time.time() < deadline:
+        time.sleep(0.01)
+    assert threading.active_count() == num_threads
+    bufferedsink._flush_at_exit()
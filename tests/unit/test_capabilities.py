@@ -0,0 +1,18 @@
+from predictionserver.servermixins.baseserver import BaseServer
+
+
+def test_capabilities_detected_once():
+    server = BaseServer()
+    assert server.capabilities is None
+    assert server.has_capability('streams') in [True, False]
+    capabilities = server.capabilities
+    assert set(capabilities) >= {'streams', 'memory_usage', 'scripting', 'zpopmin'}
+    assert server.client.keys('*') == []  # Probes clean up after themselves
+    assert not server.has_capability('teleportation')
+    assert server.capabilities is capabilities
+
+
+def test_connect_detects_capabilities():
+    server = BaseServer()
+    server.connect(decode_responses=True)
+    assert server.capabilities is not None
@@ -0,0 +1,63 @@
+from predictionserver.servermixins.cdfserver import CdfServer
+from predictionserver.futureconventions.leaderboardconventions import (
+    LeaderboardGranularity
+)
+import pytest
+import random
+
+
+def _server_with_predictions():
+    server = CdfServer()
+    server.set_obscurity('cdf_test')
+    rng = random.Random(11)
+    owners = ['key_' + str(k) for k in range(6)]
+    for name, loc in [('die.json', 0.0), ('coin.json', 3.0)]:
+        server.client.lpush(
+            server.lagged_values_name(name), *[rng.gauss(loc, 1) for _ in range(50)]
+        )
+        for delay in server.DELAYS[:2]:
+            server.client.zadd(
+                server._predictions_name(name=name, delay=delay),
+                mapping=dict([
+                    (str(k).zfill(8) + '::' + rng.choice(owners), rng.gauss(loc, 1))
+                    for k in range(server.num_predictions)
+                ])
+            )
+            server.client.zadd(
+                server.leaderboard_name(
+                    granularity=LeaderboardGranularity.name_and_delay, name=name,
+                    delay=delay
+                ),
+                mapping=dict([(server.shash(owner), 1.0) for owner in owners])
+            )
+    horizons = [
+        server.horizon_name(name=name, delay=delay)
+        for name in ['die.json', 'coin.json'] for delay in server.DELAYS[:3]
+    ]
+    return server, horizons
+
+
+@pytest.mark.parametrize('values', [None, [-1.0, 0.0, 0.5, 3.0]])
+def test_get_cdfs_matches_get_cdf(values):
+    server, horizons = _server_with_predictions()
+    one_at_a_time = [
+        server.get_cdf(name=name, delay=delay, values=values)
+        for name, delay in map(server.split_horizon_name, horizons)
+    ]
+    assert list(server.get_cdfs(horizons=horizons, values=values).values()) == \
+        one_at_a_time
+    assert one_at_a_time[2] == {"message": "No predictions."}
+    assert len(one_at_a_time[0]['x']) > 0
+
+    # Cache hits return the same as misses, whichever method filled the cache
+    server.enable_result_cache(maxsize=100)
+    assert list(server.get_cdfs(horizons=horizons, values=values).values()) == \
+        one_at_a_time
+    assert list(server.get_cdfs(horizons=horizons, values=values).values()) == \
+        one_at_a_time
+    assert [
+        server.get_cdf(name=name, delay=delay, values=values)
+        for name, delay in map(server.split_horizon_name, horizons)
+    ] == one_at_a_time
+    stats = server.get_result_cache_stats()['cdf']
+    assert stats['misses'] == len(horizons) and stats['hits'] == 2 * len(horizons)
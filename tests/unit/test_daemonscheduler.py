@@ -0,0 +1,48 @@
+from predictionserver.utilities.daemonscheduler import DaemonScheduler, DaemonTask
+from predictionserver.servermixins.promisedaemon import PromiseDaemon
+import threading
+import time
+
+
+def test_backoff_when_idle():
+    task = DaemonTask(name='idle', method=lambda: 0, cadence=0.1, max_backoff=0.5)
+    for _ in range(5):
+        task.record(result=0, latency=0.01, lag=0.)
+    assert task.wait == 0.5
+    task.record(result=['work', 'done'], latency=0.01, lag=0.)
+    assert task.wait == 0.1
+    stats = task.stats()
+    assert stats['runs'] == 6 and stats['idle'] == 5 and stats['work'] == 2
+
+
+def test_scheduler_counts_and_concurrency():
+    lock = threading.Lock()
+    running = {'now': 0, 'max': 0}
+
+    def busy():
+        with lock:
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+        time.sleep(0.02)
+        with lock:
+            running['now'] -= 1
+        return 3
+
+    def broken():
+        raise RuntimeError('no queue')
+
+    scheduler = DaemonScheduler(concurrency=2)
+    for k in range(4):
+        scheduler.add_task(name='busy_' + str(k), method=busy, cadence=0.01)
+    scheduler.add_task(name='broken', method=broken, cadence=0.01, max_backoff=0.04)
+    stats = scheduler.run_for(seconds=0.3)
+    assert running['max'] <= 2
+    assert all(stats['busy_' + str(k)]['work'] == 3 * stats['busy_' + str(k)]['runs']
+               for k in range(4))
+    assert stats['broken']['failures'] == stats['broken']['runs'] > 0
+    assert stats['busy_0']['throughput'] > 0
+
+
+def test_from_server():
+    scheduler = DaemonScheduler.from_server(PromiseDaemon())
+    assert list(scheduler.tasks) == ['admin_promises']
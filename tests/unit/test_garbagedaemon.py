@@ -0,0 +1,55 @@
+from predictionserver.servermixins.garbagedaemon import GarbageDaemon
+
+
+class DeletingGarbageDaemon(GarbageDaemon):
+    """ StreamServer provides _delete_implementation, but this will do for testing """
+
+    def _delete_implementation(self, names):
+        self.client.srem(self._NAMES(), *names)
+        return len(names)
+
+
+def test_sweep_covers_every_name():
+    daemon = DeletingGarbageDaemon()
+    daemon.set_obscurity('garbage_test')
+    names = ['stream_' + str(k) + '.json' for k in range(1000)]
+    daemon.client.sadd(daemon._NAMES(), *names)
+    for name in names[::3]:
+        daemon.client.set(name, 1.0)
+    reports = list()
+    while not (reports and reports[-1]['pass_complete']):
+        reports.append(daemon.admin_garbage_collection(with_report=True, batch=100))
+        assert len(reports) < 20
+    assert all(len(report['deleted']) <= 110 for report in reports)
+    assert sum(len(report['deleted']) for report in reports) == 666
+    assert reports[0]['orphans'] == len(reports[0]['deleted'])  # Cumulative count
+    assert reports[-1]['passes'] == 1 and reports[-1]['last_pass_orphans'] == 666
+    assert daemon.client.scard(daemon._NAMES()) == 334
+    assert reports[-1]['calls_remaining'] == 4
+    assert daemon.admin_garbage_collection(batch=50) == 0
+    assert int(daemon.get_garbage_sweep()['examined']) >= 50
+
+
+def test_concurrent_daemons_take_different_batches():
+    daemons = [DeletingGarbageDaemon(), DeletingGarbageDaemon()]
+    for daemon in daemons:
+        daemon.client = daemons[0].client
+        daemon.set_obscurity('garbage_test')
+    names = ['stream_' + str(k) + '.json' for k in range(300)]
+    daemons[0].client.sadd(daemons[0]._NAMES(), *names)
+    find_orphans = daemons[0]._find_orphans
+    interrupted = list()
+
+    def find_orphans_interrupted(names):
+        # The other daemon advances the cursor while this one is looking
+        if not interrupted:
+            interrupted.append(daemons[1].admin_garbage_collection(with_report=True,
+                                                                   batch=100))
+        return find_orphans(names=names)
+
+    daemons[0]._find_orphans = find_orphans_interrupted
+    report = daemons[0].admin_garbage_collection(with_report=True, batch=100)
+    deleted = interrupted[0]['deleted'] + report['deleted']
+    assert len(deleted) == len(set(deleted)) == 200
+    assert report['examined'] == 200 and report['orphans'] == 200
+    assert daemons[0].client.scard(daemons[0]._NAMES()) == 100
@@ -68,3 +68,16 @@ def test_own_write_key():
     kc = KeyConventions()
     kc.write_key = BABLOH_CATTLE
     assert kc.own_write_key() == BABLOH_CATTLE
+
+
+def test_key_caches():
+    KeyConventions.clear_key_caches()
+    code = KeyConventions.shash(BABLOH_CATTLE)
+    for _ in range(3):
+        assert KeyConventions.code_from_code_or_key(BABLOH_CATTLE) == code
+        assert KeyConventions.animal_from_code(code) == \
+            KeyConventions.animal_from_key(BABLOH_CATTLE)
+    stats = KeyConventions.key_cache_stats()
+    assert stats['shash']['misses'] == 1 and stats['shash']['hits'] == 3
+    assert stats['is_valid_key']['hits'] == 2
+    assert list(stats) == ['shash', 'is_valid_key']
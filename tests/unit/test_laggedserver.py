@@ -0,0 +1,123 @@
+from predictionserver.servermixins.laggedserver import LaggedServer
+from redis.client import NEVER_DECODE
+import numpy as np
+
+
+def _server_with_lags():
+    server = LaggedServer()
+    for name, num in [('a.json', 3), ('b.json', 0), ('c.json', 5)]:
+        for k in range(num):
+            server.client.lpush(server.lagged_values_name(name), str(k + 0.5))
+            server.client.lpush(server.lagged_times_name(name), str(1000. + k))
+    return server
+
+
+def test_get_lagged_many_arrays():
+    server = _server_with_lags()
+    lagged = server.get_lagged_many(names=['a.json', 'b.json', 'c.json'], count=4)
+    times, values = lagged['c.json']
+    assert values.dtype == np.float64 and len(values) == 4
+    assert list(values) == [4.5, 3.5, 2.5, 1.5]
+    assert len(lagged['b.json'][0]) == 0
+    as_lists = server.get_lagged_many(names=['a.json'], as_array=False)
+    expected = server.get_lagged_times_and_values(name='a.json')
+    assert as_lists['a.json'] == tuple(expected)
+
+
+def test_get_lagged_many_padded():
+    server = _server_with_lags()
+    server.client.lpush(server.lagged_values_name('a.json'), 'not a number')
+    server.client.lpush(server.lagged_times_name('a.json'), '1003.0')
+    times, values, mask = server.get_lagged_many(
+        names=['a.json', 'b.json', 'c.json'], padded=True
+    )
+    assert values.shape == times.shape == mask.shape == (3, 5)
+    assert list(mask.sum(axis=1)) == [4, 0, 5]
+    assert np.isnan(values[0, 0]) and values[0, 1] == 2.5
+    assert np.all(np.isnan(values[~mask]))
+    assert list(times[2]) == [1004., 1003., 1002., 1001., 1000.]
+
+
+def _server_with_packed_lags(lag_len=3):
+    server = LaggedServer()
+    server.enable_packed_lags()
+    pipe = server.client.pipeline(transaction=False)
+    for k in range(10):
+        pipe = server._pipe_packed_lag(
+            pipe=pipe, name='p.json', t=1000. + k, value=str(k + 0.5), lag_len=lag_len,
+            ttl=60
+        )
+    pipe.execute()
+    return server
+
+
+def test_packed_lags_ring_buffer():
+    server = _server_with_packed_lags(lag_len=3)
+    raw = server.client.execute_command(
+        'GETRANGE', server.lagged_packed_name('p.json'), 0, -1, **{NEVER_DECODE: []}
+    )
+    # Trimmed to four records on reaching eight, then two more appended
+    assert len(raw) == 6 * server.LAGGED_RECORD.size
+    assert server.client.ttl(server.lagged_packed_name('p.json')) > 0
+    times, values = server.unpack_lags(raw)
+    assert list(values) == [9.5, 8.5, 7.5, 6.5, 5.5, 4.5]
+
+
+def test_packed_lags_reads():
+    server = _server_with_packed_lags(lag_len=20)
+    assert server.get_lagged_values(name='p.json', count=3) == [9.5, 8.5, 7.5]
+    assert server.get_lagged_times(name='p.json', start=8) == [1001., 1000.]
+    assert server.get_lagged(name='p.json', start=1, end=2) == [(1008., 8.5), (1007., 7.5)]
+    server.client.lpush(server.lagged_values_name('a.json'), '2.5')
+    server.client.lpush(server.lagged_times_name('a.json'), '999.0')
+    lagged = server.get_lagged_many(names=['p.json', 'a.json', 'b.json'], count=4)
+    times, values = lagged['p.json']
+    assert isinstance(values, np.ndarray) and list(values) == [9.5, 8.5, 7.5, 6.5]
+    assert list(lagged['a.json'][1]) == [2.5]  # Falls back to lists
+    assert len(lagged['b.json'][1]) == 0
+    times, values, mask = server.get_lagged_many(names=['p.json', 'a.json'], padded=True)
+    assert list(mask.sum(axis=1)) == [10, 1] and values[1, 0] == 2.5
+
+
+def test_packed_lags_read_without_packing():
+    writer = _server_with_packed_lags(lag_len=20)
+    reader = LaggedServer()
+    reader.client = writer.client
+    assert not reader.packed_lags
+    assert reader.get_lagged_values(name='p.json', count=3) == [9.5, 8.5, 7.5]
+    times, values = reader.get_lagged_many(names=['p.json'], count=2)['p.json']
+    assert list(times) == [1009., 1008.]
+    # Lags written once packing is disabled again are merged with the packed ones
+    writer.enable_packed_lags(False)
+    writer.client.lpush(writer.lagged_values_name('p.json'), '10.5')
+    writer.client.lpush(writer.lagged_times_name('p.json'), '1010.0')
+    assert reader.get_lagged(name='p.json', count=3) == [
+        (1010., 10.5), (1009., 9.5), (1008., 8.5)
+    ]
+    assert writer.get_lagged_many(names=['p.json'], as_array=False, count=2)['p.json'] \
+        == ([1010., 1009.], [10.5, 9.5])
+
+
+def test_lags_kept_when_packing_is_enabled():
+    server = _server_with_lags()
+    server.enable_packed_lags()
+    server._pipe_packed_lag(
+        pipe=server.client.pipeline(), name='c.json', t=1005., value=5.5, lag_len=10,
+        ttl=60
+    ).execute()
+    assert server.get_lagged_values(name='c.json') == [5.5, 4.5, 3.5, 2.5, 1.5, 0.5]
+    assert server.get_lagged_times(name='c.json', start=4, end=5) == [1001., 1000.]
+    times, values, mask = server.get_lagged_many(names=['c.json', 'a.json'], padded=True)
+    assert list(values[0]) == [5.5, 4.5, 3.5, 2.5, 1.5, 0.5]
+    assert list(mask.sum(axis=1)) == [6, 3]
+
+
+def test_packed_lags_as_stored():
+    server = _server_with_packed_lags(lag_len=20)
+    assert server.get_lagged(name='p.json', count=2, to_float=False) == [
+        ('1009.0', '9.5'), ('1008.0', '8.5')
+    ]
+    server.client.lpush(server.lagged_values_name('p.json'), '10')
+    server.client.lpush(server.lagged_times_name('p.json'), '1010.0')
+    assert server.get_lagged_values(name='p.json', count=2, to_float=False) == \
+        ['10', '9.5']
@@ -0,0 +1,68 @@
+from predictionserver.servermixins.leaderboardscaleserver import LeaderboardScaleServer
+from predictionserver.serverhabits.leaderboardhabits import LeaderboardHabits
+import pytest
+
+
+class ScaledLeaderboards(LeaderboardHabits, LeaderboardScaleServer):
+    """ LeaderboardServer and ScenarioServer need microconventions, but this will do """
+
+    def scores(self, leaderboard_name):
+        scale = self._leaderboard_scales([leaderboard_name])[0]
+        return dict([
+            (code, scale * score) for code, score in
+            self.client.zrange(leaderboard_name, start=0, end=-1, withscores=True)
+        ])
+
+    def increment(self, leaderboard_name, amounts):
+        pipe = self.client.pipeline()
+        self._pipe_leaderboard_increments(pipe=pipe, increments={leaderboard_name: amounts})
+        return pipe.execute()
+
+    def shrink(self, leaderboard_name, weight):
+        pipe = self.client.pipeline()
+        self._pipe_leaderboard_shrinkage(
+            pipe=pipe, leaderboard_name=leaderboard_name, weight=weight
+        )
+        return pipe.execute()
+
+
+@pytest.mark.parametrize('scripting', [True, False])
+def test_lazy_shrinkage_and_renormalization(scripting):
+    server = ScaledLeaderboards()
+    server.set_obscurity('scale_test')
+    server.capabilities = {'scripting': scripting}
+    lb = 'leaderboard::name::die.json'
+    server.increment(lb, {'a': 1.0, 'b': 2.0})
+    server.client.expire(lb, 1000)
+    for _ in range(100):
+        server.shrink(lb, 0.8)
+    server.increment(lb, {'a': 1.0})
+    expected = {'a': 1.0 + 0.8 ** 100, 'b': 2.0 * 0.8 ** 100}
+    assert server.scores(lb) == pytest.approx(expected, rel=1e-9)
+
+    # Drifted by 0.8 ** 100 ~ 2e-10, so the daemon would fold the scale into the scores
+    assert server._drifted_leaderboards() == [lb]
+    assert server._renormalize_leaderboard(lb)
+    assert not server._renormalize_leaderboard(lb)
+    assert server._drifted_leaderboards() == []
+    assert server.client.hget(server._LEADERBOARD_SCALES(), lb) is None
+    assert server.client.ttl(lb) > 0
+    assert server.scores(lb) == pytest.approx(expected, rel=1e-9)
+
+
+@pytest.mark.parametrize('scripting', [True, False])
+def test_scales_of_expired_leaderboards_are_forgotten(scripting):
+    server = ScaledLeaderboards()
+    server.set_obscurity('scale_expiry_test')
+    server.capabilities = {'scripting': scripting}
+    server._SCALE_SCAN_COUNT = 2
+    kept, gone = 'leaderboard::name::kept.json', 'leaderboard::name::gone.json'
+    others = ['leaderboard::name::gone_%d.json' % i for i in range(3)]
+    for lb in [kept, gone] + others:
+        server.increment(lb, {'a': 1.0})
+        server.shrink(lb, 0.5)
+    server.client.delete(gone, *others)
+
+    assert server._drifted_leaderboards() == []
+    assert server.client.hkeys(server._LEADERBOARD_SCALES()) == [kept]
+    assert server.scores(kept) == pytest.approx({'a': 0.5})
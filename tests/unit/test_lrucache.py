@@ -0,0 +1,77 @@
+from predictionserver.utilities.lrucache import LruCache
+from predictionserver.servermixins.baseserver import BaseServer
+from predictionserver.futureconventions.keyconventions import KeyConventions
+import threading
+
+
+def test_lru_eviction_and_stats():
+    cache = LruCache(maxsize=2)
+    cache.put({'a': 1, 'b': 2})
+    assert cache.lookup(keys=['a', 'c']) == ({'a': 1}, ['c'])
+    cache.put({'c': 3})
+    assert 'b' not in cache and 'a' in cache and len(cache) == 2
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1 and stats['hit_rate'] == 0.5
+
+
+def test_animals_resolved_once_and_shared_through_redis():
+    write_keys = [KeyConventions.create_key(difficulty=6) for _ in range(3)]
+    codes = [KeyConventions.shash(write_key) for write_key in write_keys]
+    expected = [KeyConventions.animal_from_code(code) for code in codes]
+    server = BaseServer()
+    server.set_obscurity('animal_test')
+    server.enable_redis_animals()
+    searched = list()
+
+    def counting_animal_from_code(code):
+        searched.append(code)
+        return KeyConventions.animal_from_code(code)
+
+    server.animal_from_code = counting_animal_from_code
+    assert server.animals_from_codes(codes + codes[:1]) == expected + expected[:1]
+    assert server.animals_from_codes(codes) == expected
+    assert sorted(searched) == sorted(codes)
+    server.animal_cache.invalidate()
+    assert server.animals_from_codes(codes) == expected and len(searched) == 3
+    assert server.animals_from_keys(write_keys) == expected
+
+
+def test_codes_and_keys_cached_apart():
+    write_key = KeyConventions.create_key(difficulty=6)
+    code = KeyConventions.shash(write_key)
+    server = BaseServer()
+    # The same string means different things as a code and as a write key
+    as_key = server.animals_from_keys([write_key, code])
+    as_code = server.animals_from_codes([write_key, code])
+    assert as_key == [KeyConventions.animal_from_key(s) for s in [write_key, code]]
+    assert as_code == [KeyConventions.animal_from_code(s) for s in [write_key, code]]
+    assert as_key[0] == as_code[1] and as_key[0] != as_code[0]
+    assert server.animals_from_keys([code, write_key]) == as_key[::-1]
+    assert server.animals_from_codes([code, write_key]) == as_code[::-1]
+    assert server.animal_cache.stats()['hits'] == 4 and len(server.animal_cache) == 4
+
+
+def test_lru_shared_between_threads():
+    cache = LruCache(maxsize=50)
+    errors = list()
+
+    def churn(offset):
+        try:
+            for k in range(2000):
+                keys = [(offset + k + j) % 200 for j in range(5)]
+                found, missing = cache.lookup(keys=keys)
+                assert all(found[key] == key for key in found)
+                cache.put(dict([(key, key) for key in missing]))
+                if k % 100 == 0:
+                    cache.invalidate(keys=keys[:2])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=churn, args=(17 * n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [] and len(cache) <= 50
+    stats = cache.stats()
+    assert stats['hits'] + stats['misses'] == 8 * 2000 * 5
@@ -0,0 +1,39 @@
+from predictionserver.futureconventions.memoconventions import (
+    Memo, Activity, ActivityContext
+)
+from predictionserver.futureconventions.metricconventions import MetricType
+import json
+import pytest
+
+
+def test_memo_behaves_like_a_dict():
+    memo = Memo(activity=Activity.set, context=ActivityContext.lagged, write_key='k',
+                name='die.json', data={'care': 7})
+    memo['success'] = 0
+    memo['execution'] = 3
+    assert memo['name'] == 'die.json' and memo.get('delay') is None
+    assert memo.get('not_a_field') is None and 'name' in memo
+    with pytest.raises(Exception):
+        memo['not_a_field'] = 1
+    with pytest.raises(Exception):
+        memo['success'] = 'zero'
+    d = memo.as_dict()
+    assert d['activity'] == 'set' and d['context'] == 'lagged' and d['care'] == 7
+    assert 'data' not in d and 'delay' not in d
+    assert memo.as_dict(cast_to_str=False, flatten_data=False)['data'] == {'care': 7}
+    assert len(memo.as_dict(leave_out_none=False)) == len(memo)
+    assert dict(memo)['memo_id'] == memo['memo_id']
+
+
+def test_memo_as_bytes():
+    memo = Memo(activity=Activity.set, write_key='k', code='clobbered', value=1.5)
+    entry = json.loads(memo.as_bytes(code_from_key=lambda key: 'code_of_' + key))
+    assert entry['code'] == 'code_of_k' and 'write_key' not in entry
+    assert dict(entry, code='clobbered', write_key='k') == memo.as_dict()
+
+
+def test_memo_casts_enum_fields_only():
+    memo = Memo(metric=MetricType.volume, private_actor='me', data={'was': Activity.set})
+    d = memo.as_dict()
+    assert d['metric'] == 'volume' and d['private_actor'] == 'me'
+    assert d['was'] is Activity.set
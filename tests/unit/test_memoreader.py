@@ -0,0 +1,28 @@
+from predictionserver.clientmixins.memoreader import MemoReader
+from predictionserver.futureconventions.memoconventions import MemoCategory
+
+
+def test_transactions_are_expanded():
+    reader = MemoReader()
+    record = {'settlement_time': '2026-01-01 00:00:00', 'amount': 0.5, 'budget': 1,
+              'stream': 'die.json', 'delay': 70, 'value': 3.0, 'window': 0.01,
+              'mass': 0.1, 'density': 10., 'average': 2.5, 'reliable': 1,
+              'submissions_count': 225, 'submissions_close': 9,
+              'stream_owner_code': 'owner', 'recipient_code': 'code'}
+    served = {
+        'memos': [reader.compact_transaction(record)],
+        'transactions': [dict((k, str(v)) for k, v in record.items())]
+    }
+    requested = list()
+
+    def request_get_json(method, arg=None, data=None, throw=True):
+        requested.append((method, arg))
+        return served[method]
+
+    reader.request_get_json = request_get_json
+    transactions = reader.get_transactions(write_key='a_key')
+    assert requested == [
+        ('memos', str(MemoCategory.transaction)), ('transactions', 'a_key')
+    ]
+    assert transactions[0] == record
+    assert transactions[1]['amount'] == '0.5' and set(transactions[1]) == set(record)
@@ -0,0 +1,58 @@
+from predictionserver.servermixins.memoserver import MemoServer
+from predictionserver.futureconventions.memoconventions import (
+    Memo, Activity, ActivityContext
+)
+import time
+
+
+def _memo(k):
+    return Memo(
+        activity=Activity.set, context=ActivityContext.lagged, write_key='memo_key',
+        message='memo ' + str(k)
+    )
+
+
+def _messages(server):
+    return [memo['message'] for memo in server.get_owner_confirms(write_key='memo_key')]
+
+
+def test_buffered_memos_match_unbuffered():
+    unbuffered, buffered = MemoServer(), MemoServer()
+    unbuffered.set_obscurity('memo_test_unbuffered')
+    buffered.set_obscurity('memo_test_buffered')
+    buffered.enable_memo_sink(flush_size=12, background=False)
+    for k in range(25):
+        assert unbuffered.add_memo_as_owner_confirm(memo=_memo(k))
+        assert buffered.add_memo_as_owner_confirm(memo=_memo(k))
+    assert len(_messages(buffered)) == 24
+    assert buffered.flush_memos() == 2  # Old and new locations
+    assert _messages(buffered) == _messages(unbuffered)
+    assert _messages(buffered)[0] == 'memo 24'
+    stats = buffered.get_memo_sink_stats()
+    assert stats['flushes'] == 5 and stats['pending'] == 0
+
+
+def test_confirms_are_sampled_when_busy():
+    server = MemoServer()
+    server.set_obscurity('memo_test')
+    server.enable_memo_sink(confirm_sample_rate=0., sample_above=5, background=False)
+    for k in range(20):
+        server.add_memo_as_owner_confirm(memo=_memo(k))
+        server.add_memo_as_owner_error(memo=_memo(k))
+    server.flush_memos()
+    assert _messages(server) == ['memo ' + str(k) for k in (2, 1, 0)]
+    assert len(server.get_owner_errors(write_key='memo_key')) == 20
+    assert server.get_memo_sink_stats()['sampled_out'] == 17
+
+
+def test_background_flush():
+    server = MemoServer()
+    server.set_obscurity('memo_test')
+    server.enable_memo_sink(flush_seconds=0.05)
+    server.add_memo_as_owner_confirm(memo=_memo(0))
+    deadline = time.time() + 5
+    while not _messages(server) and time.time() < deadline:
+        time.sleep(0.05)
+    assert _messages(server) == ['memo 0']
+    server.enable_memo_sink(enable=False)
+    assert server.memo_sink is None
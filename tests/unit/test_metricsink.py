@@ -0,0 +1,66 @@
+from predictionserver.servermixins.metricserver import (
+    MetricServer, MetricType, MetricGranularity
+)
+import time
+
+
+def _volume(server, name):
+    return server.get_metric(
+        metric=MetricType.volume, granularity=MetricGranularity.name, name=name
+    )
+
+
+def test_accumulated_metrics_match_direct():
+    direct, accumulated = MetricServer(), MetricServer()
+    direct.set_obscurity('metric_test_direct')
+    accumulated.set_obscurity('metric_test_accumulated')
+    accumulated.enable_metric_sink(flush_size=10, background=False)
+    for server in (direct, accumulated):
+        for k in range(40):
+            server.incr_metric(metric=MetricType.volume, granularity=MetricGranularity.name,
+                               amount=0.5, name='stream_' + str(k % 2) + '.json')
+        server.set_metric(metric=MetricType.count, granularity=MetricGranularity.name,
+                          value=7, name='stream_0.json')
+        server.incr_metric(metric=MetricType.count, granularity=MetricGranularity.name,
+                           amount=1, name='stream_0.json')
+    assert _volume(accumulated, 'stream_0.json') == 0
+    assert accumulated.flush_metrics() == 3
+    for name in ('stream_0.json', 'stream_1.json'):
+        assert _volume(accumulated, name) == _volume(direct, name) == 10
+    assert accumulated.get_stream_volumes() == direct.get_stream_volumes()
+    assert accumulated.get_metric(
+        metric=MetricType.count, granularity=MetricGranularity.name, name='stream_0.json'
+    ) == 8
+    stats = accumulated.get_metric_sink_stats()
+    assert stats['updates'] == 42 and stats['fields_written'] == 3
+    assert stats['pending'] == 0 and stats['staleness_bound'] is None
+
+
+def test_flushed_when_full_and_when_disabled():
+    server = MetricServer()
+    server.set_obscurity('metric_test')
+    server.enable_metric_sink(flush_size=2, background=False)
+    server.incr_metric(metric=MetricType.volume, granularity=MetricGranularity.name,
+                       amount=1, name='a.json')
+    server.incr_metric(metric=MetricType.volume, granularity=MetricGranularity.name,
+                       amount=1, name='b.json')
+    assert _volume(server, 'a.json') == 1
+    server.incr_metric(metric=MetricType.volume, granularity=MetricGranularity.name,
+                       amount=1, name='a.json')
+    server.enable_metric_sink(enable=False)
+    assert _volume(server, 'a.json') == 2 and server.metric_sink is None
+
+
+def test_background_flush():
+    server = MetricServer()
+    server.set_obscurity('metric_test_background')
+    server.enable_metric_sink(flush_seconds=0.05)
+    server.incr_metric(metric=MetricType.volume, granularity=MetricGranularity.name,
+                       amount=3, name='c.json')
+    assert server.get_metric_sink_stats()['staleness_bound'] == 0.0625
+    deadline = time.time() + 5
+    while not _volume(server, 'c.json') and time.time() < deadline:
+        time.sleep(0.05)
+    assert _volume(server, 'c.json') == 3
+    assert server.get_metric_sink_stats()['max_staleness'] < 5
+    server.enable_metric_sink(enable=False)
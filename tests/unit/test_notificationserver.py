@@ -0,0 +1,48 @@
+from predictionserver.servermixins.notificationserver import NotificationServer
+from predictionserver.servermixins.asyncbaseserver import AsyncBaseServer
+import asyncio
+import threading
+import time
+
+
+def _publish(server, delay=0.1):
+    time.sleep(delay)
+    pipe = server.client.pipeline()
+    pipe = server._pipe_value_notification(
+        pipe=pipe, name='die.json', value=3.0, epoch_seconds=1.5
+    )
+    pipe = server._pipe_value_notification(
+        pipe=pipe, name='coin.json', value=1, epoch_seconds=1.5
+    )
+    pipe = server._pipe_messages_notification(
+        pipe=pipe, subscriber='mine.json', messages={'die.json': 3.0}
+    )
+    pipe.execute()
+
+
+def test_listen_filters_channels():
+    server = NotificationServer()
+    publisher = threading.Thread(target=_publish, args=(server,))
+    publisher.start()
+    received = list(server.listen(names=['die.json'], subscribers=['mine.json'],
+                                  timeout=0.3))
+    publisher.join()
+    assert received == [
+        {"kind": "value", "name": "die.json", "value": "3.0", "time": 1.5},
+        {"kind": "messages", "name": "mine.json", "messages": {"die.json": "3.0"}}
+    ]
+
+
+def test_alisten_everything():
+    server = AsyncBaseServer()
+
+    async def consume():
+        publisher = asyncio.get_running_loop().run_in_executor(None, _publish, server)
+        received = [notification async for notification in server.alisten(timeout=0.3)]
+        await publisher
+        return received
+
+    received = asyncio.run(consume())
+    assert [(n["kind"], n["name"]) for n in received] == [
+        ("value", "die.json"), ("value", "coin.json"), ("messages", "mine.json")
+    ]
@@ -0,0 +1,90 @@
+from predictionserver.servermixins.promisedaemon import PromiseDaemon
+from predictionserver.servermixins.scenarioserver import ScenarioServer
+import fakeredis
+import time
+
+
+def _connected(cls, server):
+    instance = cls()
+    instance.client = fakeredis.FakeStrictRedis(server=server, decode_responses=True)
+    instance.set_obscurity('promise_test')
+    return instance
+
+
+def _promise_copies(producer, num, due):
+    pipe = producer.client.pipeline()
+    for k in range(num):
+        source = 'copy_' + str(k)
+        destination = producer.delayed_name(name='stream_' + str(k) + '.json', delay=70)
+        pipe.set(name=source, value=str(k))
+        pipe = producer._pipe_promise(
+            pipe=pipe,
+            promise=producer._copy_promise(source=source, destination=destination),
+            destination=destination,
+            due=due
+        )
+    pipe.execute()
+
+
+def test_claims_are_exclusive_across_shards():
+    server = fakeredis.FakeServer()
+    producer = _connected(ScenarioServer, server)
+    _promise_copies(producer, num=40, due=int(time.time()) - 1)
+    daemon_1 = _connected(PromiseDaemon, server)
+    daemon_2 = _connected(PromiseDaemon, server)
+    shards = list(range(daemon_1._PROMISE_SHARDS))
+    report_1 = daemon_1.admin_promises(with_report=True, shards=shards[::2])
+    report_2 = daemon_2.admin_promises(with_report=True, shards=shards[1::2])
+    destinations_1 = set(record['destination'] for record in report_1)
+    destinations_2 = set(record['destination'] for record in report_2)
+    assert not destinations_1 & destinations_2
+    assert len(destinations_1 | destinations_2) == 40
+    assert daemon_1.admin_promises() == 0
+
+
+def test_promises_wait_until_due_and_expire_after_grace():
+    server = fakeredis.FakeServer()
+    producer = _connected(ScenarioServer, server)
+    daemon = _connected(PromiseDaemon, server)
+    now = int(time.time())
+    _promise_copies(producer, num=3, due=now + 60)
+    assert daemon.admin_promises() == 0
+    assert sum(producer.client.zcard(producer._promise_queue_name(shard=shard))
+               for shard in range(producer._PROMISE_SHARDS)) == 3
+    stale = now - 10 * producer._DELAY_GRACE
+    claimed = daemon._claim_promises(
+        promise_queues=[daemon._promise_queue_name(shard=shard)
+                        for shard in range(daemon._PROMISE_SHARDS)],
+        epoch_seconds=now + 60
+    )
+    assert len(claimed) == 3
+    _promise_copies(producer, num=3, due=stale)
+    assert daemon.admin_promises() == 0
+
+
+def test_legacy_promises_are_moved_to_shards():
+    server = fakeredis.FakeServer()
+    producer = _connected(ScenarioServer, server)
+    daemon = _connected(PromiseDaemon, server)
+    now = int(time.time())
+    destinations = [producer.delayed_name(name=name, delay=70)
+                    for name in ['due.json', 'later.json']]
+    for k, (destination, due) in enumerate(zip(destinations, [now - 1, now + 60])):
+        producer.client.set('copy_' + str(k), str(k))
+        producer.client.sadd(
+            producer._legacy_promise_queue_name(epoch_seconds=due),
+            producer._copy_promise(source='copy_' + str(k), destination=destination)
+        )
+    report = daemon.admin_promises(with_report=True)
+    assert [record['destination'] for record in report] == destinations[:1]
+    assert producer.client.get(destinations[0]) == '0'
+    assert not producer.client.exists(
+        producer._legacy_promise_queue_name(epoch_seconds=now + 60)
+    )
+    queue = producer._promise_queue_name(
+        shard=producer._promise_shard(destination=destinations[1])
+    )
+    assert producer.client.zrange(queue, 0, -1, withscores=True) == [
+        (producer._copy_promise(source='copy_1', destination=destinations[1]), now + 60)
+    ]
+    assert daemon._drain_legacy_promises(epoch_seconds=now) == 0
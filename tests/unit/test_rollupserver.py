@@ -0,0 +1,49 @@
+from predictionserver.servermixins.rollupserver import RollupServer
+from predictionserver.futureconventions.laggedconventions import RollupResolution
+import numpy as np
+
+
+def _roll(server, name, points):
+    pipe = server.client.pipeline()
+    for t, value in points:
+        server._pipe_rollup(pipe=pipe, name=name, t=t, value=value, ttl=600)
+    return pipe.execute()
+
+
+def test_rollup_aggregates():
+    server = RollupServer()
+    server.enable_rollups()
+    day = 1700006400.  # Midnight
+    done = _roll(server, 'x.json', [
+        (day + 10, 3.0), (day + 20, '1.0'), (day + 50, 2.0), (day + 70, 5.0),
+        (day + 3700, 4.0), (day + 3710, None)
+    ])
+    assert done == [1, 1, 1, 1, 1, 0]
+
+    minutes = server.get_rollup('x.json', resolution='minute')
+    assert minutes['time'] == [day, day + 60, day + 3660]
+    assert minutes['count'] == [3, 1, 1]
+    assert minutes['sum'] == [6.0, 5.0, 4.0]
+    assert minutes['min'] == [1.0, 5.0, 4.0] and minutes['max'] == [3.0, 5.0, 4.0]
+    assert minutes['last'] == [2.0, 5.0, 4.0]
+
+    hours = server.get_rollup('x.json', resolution=RollupResolution.hour, as_array=True)
+    assert isinstance(hours['sum'], np.ndarray)
+    assert list(hours['count']) == [4, 1] and list(hours['max']) == [5.0, 4.0]
+    days = server.get_rollup('x.json', resolution='day')
+    assert days['count'] == [5] and days['last'] == [4.0]
+
+    later = server.get_rollup('x.json', resolution='minute', start=day + 65, end=day + 3600)
+    assert later['time'] == [day + 60]
+    assert server.get_rollup('y.json')['count'] == []
+    assert 0 < server.client.ttl(server.rollup_name('x.json', 'minute')) <= 600
+
+
+def test_rollup_retention():
+    server = RollupServer()
+    server.enable_rollups()
+    server._ROLLUP_RETENTION[RollupResolution.minute] = 3
+    _roll(server, 'x.json', [(60. * k, float(k)) for k in range(10)])
+    minutes = server.get_rollup('x.json', resolution='minute')
+    assert minutes['last'] == [7.0, 8.0, 9.0]
+    assert len(server.get_rollup('x.json', resolution='hour')['time']) == 1
@@ -0,0 +1,53 @@
+from predictionserver.futureconventions.samplers import exponential_bootstrap, \
+    exponential_bootstrap_many, weighted_random_sample, WeightedRandomGenerator
+import numpy as np
+
+
+def test_weighted_random_sample():
+    rng = np.random.default_rng(5)
+    ndx = weighted_random_sample(weights=[1., 0., 3.], num=20000, rng=rng)
+    assert isinstance(ndx, list) and set(ndx) == {0, 2}
+    assert abs(np.mean(np.array(ndx) == 2) - 0.75) < 0.02
+    drawn = weighted_random_sample(weights=[1., 1.], num=12, population=['a', 'b'])
+    assert isinstance(drawn, list) and len(drawn) == 12 and set(drawn) <= {'a', 'b'}
+    wrg = WeightedRandomGenerator(weights=[0., 0., 2.], rng=rng)
+    assert wrg() == 2 and WeightedRandomGenerator(weights=[1., 0.])() == 0
+
+
+def test_global_seed_reproducible():
+    lagged = list(np.random.default_rng(1).standard_normal(200))
+    samples = list()
+    for _ in range(2):
+        np.random.seed(17)
+        samples.append((
+            exponential_bootstrap(lagged=lagged, decay=0.005, num=25),
+            exponential_bootstrap_many(lagged=lagged, decay=0.005, num=25, size=2),
+            weighted_random_sample(weights=[1., 2., 3.], num=10)
+        ))
+    assert samples[0][0] == samples[1][0] and samples[0][2] == samples[1][2]
+    assert np.array_equal(samples[0][1], samples[1][1])
+
+
+def test_exponential_bootstrap_reproducible():
+    lagged = list(np.random.default_rng(1).standard_normal(200))
+    samples = [exponential_bootstrap(lagged=lagged, decay=0.005, num=225,
+                                     rng=np.random.default_rng(11)) for _ in range(2)]
+    assert len(samples[0]) == 225
+    assert samples[0] == samples[1]
+
+
+def test_exponential_bootstrap_many():
+    rng = np.random.default_rng(3)
+    lagged = list(rng.standard_normal(100))
+    samples = exponential_bootstrap_many(
+        lagged=lagged, decay=0.005, num=225, size=4, as_process=False, rng=rng
+    )
+    assert samples.shape == (4, 225)
+    assert not np.array_equal(samples[0], samples[1])
+    assert np.abs(samples - np.array(lagged)[:, None, None]).min(axis=0).max() < 0.05
+    # A random walk is sampled by differences, from the most recent value
+    walk = list(np.cumsum(rng.standard_normal(500))[::-1])
+    samples = exponential_bootstrap_many(lagged=walk, decay=0.005, num=50, size=2,
+                                         rng=rng)
+    assert samples.shape == (2, 50)
+    assert np.abs(np.median(samples) - walk[0]) < 1.5
@@ -0,0 +1,56 @@
+from predictionserver.utilities.scenarioindex import ScenarioIndex
+import fakeredis
+import random
+
+
+def _random_mapping(rng, num):
+    return dict(
+        (str(rng.randint(0, 224)).zfill(8) + '::' + rng.choice('abcdef'),
+         round(rng.gauss(0, 1), rng.choice([1, 2, 8])))
+        for _ in range(num)
+    )
+
+
+def test_around_matches_redis():
+    client = fakeredis.FakeStrictRedis(decode_responses=True)
+    rng = random.Random(7)
+    half_widths = [0.5 * window for window in [1e-3, 1e-2, 1e-1, 1, 10]]
+    for _ in range(25):
+        client.delete('z')
+        mapping = _random_mapping(rng, num=rng.randint(0, 300))
+        if mapping:
+            client.zadd('z', mapping)
+        index = ScenarioIndex()
+        index.load('z', items=client.zrange('z', 0, -1, withscores=True), version=0)
+        values = [round(rng.gauss(0, 1), 1) for _ in range(4)]
+        for limit in [None, 5]:
+            ups, dns = index.around('z', values=values, half_widths=half_widths,
+                                    limit=limit)
+            kwargs = dict() if limit is None else {'start': 0, 'num': limit}
+            for value, up, dn in zip(values, ups, dns):
+                for h, u, d in zip(half_widths, up, dn):
+                    assert u == client.zrangebyscore('z', min=value, max=value + h,
+                                                     **kwargs)
+                    assert d == client.zrevrangebyscore('z', max=value, min=value - h,
+                                                        **kwargs)
+
+
+def test_insert_remove_and_versions():
+    index = ScenarioIndex()
+    assert index.around('z', values=[0.], half_widths=[1.]) == ([[[]]], [[[]]])
+    index.load('z', items=[('00000001::a', 0.5), ('00000002::b', -0.5)], version=3)
+    assert index.is_fresh('z', version='3', card=2)
+    assert not index.is_fresh('z', version='4')
+
+    index.insert('z', mapping={'00000001::a': -0.2, '00000003::c': 0.1}, version=4)
+    assert index.is_fresh('z', version=4, card=3)
+    ups, dns = index.around('z', values=[0.], half_widths=[1.])
+    assert ups == [[['00000003::c']]]
+    assert dns == [[['00000001::a', '00000002::b']]]
+
+    index.remove('z', tickets=['00000002::b'], version=5)
+    assert index.card('z') == 2
+
+    # Somebody else wrote in between, so the local copy is discarded
+    index.insert('z', mapping={'00000004::d': 0.}, version=7)
+    assert 'z' not in index
@@ -0,0 +1,169 @@
+from predictionserver.servermixins.scenarioserver import ScenarioServer
+from predictionserver.futureconventions.memoconventions import MemoCategory, MemoGranularity
+from predictionserver.serverhabits.memohabits import MemoImplementation
+from collections import Counter, defaultdict
+import numpy as np
+import math
+import pytest
+
+
+def _record(k):
+    return {
+        'settlement_time': '2026-01-01 00:00:00', 'amount': 0.5 * k, 'budget': 1,
+        'stream': 'die.json', 'delay': 70, 'value': 3.0, 'window': 0.01, 'mass': 0.1,
+        'density': 10., 'average': 2.5, 'reliable': 1, 'submissions_count': 225,
+        'submissions_close': 9, 'stream_owner_code': 'owner', 'recipient_code': 'code'
+    }
+
+
+@pytest.mark.parametrize('scripting', [True, False])
+@pytest.mark.parametrize('compact', [True, False])
+def test_transaction_logs_appended_once_per_log(scripting, compact):
+    server = ScenarioServer()
+    server.set_obscurity('transactions_test')
+    server.capabilities = {'scripting': scripting}
+    records = [_record(k) for k in range(3)]
+    if compact:
+        records = [server.compact_transaction(record) for record in records]
+    logs = {'transactions::all': [0, 1, 2], 'transactions::key': [1, 2]}
+    pipe = server.client.pipeline()
+    server._pipe_transaction_logs(pipe=pipe, records=records, transaction_logs=logs)
+    assert len(pipe) == (1 if scripting else 7)
+    pipe.execute()
+    for log_name, ndxs in logs.items():
+        logged = [server.expand_transaction(fields)
+                  for _, fields in server.client.xrange(log_name)]
+        assert [float(record['amount']) for record in logged] == [0.5 * k for k in ndxs]
+        assert logged[0]['stream'] == 'die.json'
+        assert 0 < server.client.ttl(log_name) <= server.TRANSACTIONS_TTL
+
+
+def _settlement_server(seed):
+    """ Samples for two streams: several owners, one owner, and nobody """
+    server = ScenarioServer()
+    server.set_obscurity('settlement_test_' + str(seed))
+    server.DELAYS = [70, 310]
+    rng = np.random.default_rng(seed)
+    owners_by_horizon = {
+        ('die.json', 70): ['key_0', 'key_1', 'key_2', 'key_3'],
+        ('die.json', 310): ['key_1', 'key_2', 'key_3'],
+        ('coin.json', 70): ['key_0'],
+        ('coin.json', 310): []
+    }
+    for (name, delay), owners in owners_by_horizon.items():
+        for owner in owners:
+            values = np.sort(rng.standard_normal(server.num_predictions))
+            server.client.zadd(server._samples_name(name=name, delay=delay), mapping={
+                server._format_scenario(owner, k): float(v) for k, v in enumerate(values)
+            })
+            server.client.sadd(server._sample_owners_name(name=name, delay=delay), owner)
+    return server
+
+
+def _settle_horizon_by_horizon(server, names, values, budgets):
+    """ The per-horizon loop that _msettle replaced, as a reference """
+    half_winners = int(math.ceil(server.NUM_WINNERS))
+    percentiles = dict((name, dict()) for name in names)
+    balances, volumes, performances = Counter(), Counter(), defaultdict(Counter)
+    for name, value, budget in zip(names, values, budgets):
+        for delay_ndx, delay in enumerate(server.DELAYS):
+            samples_name = server._samples_name(name=name, delay=delay)
+            pool = server.client.zcard(samples_name)
+            participants = server.client.smembers(
+                server._sample_owners_name(name=name, delay=delay)
+            )
+            windows = [(
+                server.client.zrangebyscore(
+                    samples_name, min=value, max=value + 0.5 * w, start=0, num=half_winners
+                ),
+                server.client.zrevrangebyscore(
+                    samples_name, max=value, min=value - 0.5 * w, start=0, num=half_winners
+                )
+            ) for w in server._WINDOWS]
+            percentiles[name][delay_ndx] = 0.5
+            if pool and len(participants) >= 1:
+                scenarios = list()
+                for up, dn in windows:
+                    if len(scenarios) < 10:
+                        scenarios = dn + up
+                percentiles[name][delay_ndx] = server._zmean_scenarios_percentile(
+                    percentile_scenarios=scenarios
+                )
+            if pool and len(participants) > 1:
+                winners = next(up for up, _ in windows if up)
+                payments = Counter(dict((p, -1.0) for p in participants))
+                reward = (1.0 * pool / server.num_predictions) / len(winners)
+                for ticket in winners:
+                    payments[server._scenario_owner(ticket)] += reward
+                horizon = server.horizon_name(name=name, delay=delay)
+                for recipient, amount in payments.items():
+                    balances[recipient] += budget * amount
+                    volumes[horizon] += abs(budget * amount)
+                    performances[recipient][horizon] += budget * amount
+    return percentiles, balances, volumes, performances
+
+
+def _as_floats(mapping):
+    return dict((k, float(v)) for k, v in mapping.items())
+
+
+def test_msettle_matches_horizon_by_horizon():
+    names, values, budgets = ['die.json', 'coin.json'], [0.1, -0.2], [1.0, 3.0]
+    server = _settlement_server(seed=7)
+    percentiles, balances, volumes, performances = _settle_horizon_by_horizon(
+        server=server, names=names, values=values, budgets=budgets
+    )
+    result = server._msettle(names=names, values=values, budgets=budgets,
+                             with_percentiles=True, write_keys=['sponsor_key'] * 2,
+                             with_copulas=False)
+    for name in names:
+        assert result['percentiles'][name] == pytest.approx(percentiles[name])
+    assert _as_floats(server.client.hgetall(server._BALANCES())) == \
+        pytest.approx(dict(balances))
+    assert _as_floats(server.client.hgetall(server.VOLUMES)) == pytest.approx(dict(volumes))
+    assert set(performances) == {'key_0', 'key_1', 'key_2', 'key_3'}
+    for recipient, performance in performances.items():
+        logged = server.client.hgetall(server.performance_name(write_key=recipient))
+        assert _as_floats(logged) == pytest.approx(dict(performance))
+    assert abs(sum(balances.values())) < 1e-9
+
+
+def test_transactions_read_back_expanded():
+    names, values, budgets = ['die.json', 'coin.json'], [0.1, -0.2], [1.0, 3.0]
+    read_back = dict()
+    for compact in [True, False]:
+        server = _settlement_server(seed=7)
+        server.enable_compact_transactions(compact)
+        server._msettle(names=names, values=values, budgets=budgets,
+                        with_percentiles=False, write_keys=['sponsor_key'] * 2,
+                        with_copulas=False)
+        read_back[compact] = [
+            server.get_transactions(),
+            server.get_transactions(write_key='key_1'),
+            server.get_transactions(write_key='key_1', name='die.json', delay=310)
+        ]
+    for compact_log, log in zip(read_back[True], read_back[False]):
+        assert len(compact_log) == len(log) > 0
+        for compact_record, record in zip(compact_log, log):
+            assert list(compact_record) == list(server.TRANSACTION_FIELDS)
+            assert set(record) == set(server.TRANSACTION_FIELDS)
+            assert compact_record['stream'] == record['stream']
+            assert str(compact_record['delay']) == record['delay']
+            assert compact_record['amount'] == pytest.approx(float(record['amount']))
+    assert {record['stream'] for record in read_back[True][2]} == {'die.json'}
+
+
+def test_stream_memos_are_expanded():
+    server = ScenarioServer()
+    server.set_obscurity('memos_test')
+    server.MEMO_IMPLEMENTATIONS[MemoCategory.transaction] = \
+        MemoImplementation.redis_stream
+    location = server.memo_location(
+        category=MemoCategory.transaction, granularity=MemoGranularity.write_key,
+        write_key='key_0'
+    )
+    for k in range(3):
+        server.client.xadd(location, fields=server.compact_transaction(_record(k)))
+    transactions = server.get_owner_transactions(write_key='key_0')
+    assert [record['amount'] for record in transactions] == [1.0, 0.5, 0.0]
+    assert transactions[0] == dict(_record(2))
@@ -0,0 +1,58 @@
+from predictionserver.futureconventions.settlementconventions import (
+    SettlementConventions
+)
+from predictionserver.futureconventions.statsconventions import StatsConventions
+
+
+def test_first_sufficient_window():
+    counts = [[0, 3, 12], [11, 0, 0], [1, 2, 3]]
+    windows = SettlementConventions.first_sufficient_window(counts=counts, minimum=10)
+    assert list(windows) == [2, 0, 2]
+    windows = SettlementConventions.first_sufficient_window(counts=counts, minimum=1)
+    assert list(windows) == [1, 0, 0]
+
+
+def test_segment_zmean_percentiles():
+    # Owner 0 appears twice in segment 0, so only the last ticket counts
+    segments = [0, 0, 0, 2]
+    owners = [0, 1, 0, 1]
+    percentiles = [0.1, 0.7, 0.3, 1.5]
+    prctls = SettlementConventions.segment_zmean_percentiles(
+        segments=segments, owners=owners, percentiles=percentiles, num_segments=3
+    )
+    assert abs(prctls[0] - StatsConventions.zmean_percentile([0.3, 0.7])) < 1e-12
+    assert prctls[1] == 0.5
+    assert prctls[2] == 0.5
+
+
+def test_game_payments_zero_sum():
+    horizons, owners, amounts, leaked = SettlementConventions.game_payments(
+        pools=[450, 450],
+        participant_horizons=[0, 0, 1, 1],
+        participant_owners=[0, 1, 0, 1],
+        winner_horizons=[0, 0],
+        winner_owners=[1, 1],
+        carryover=[False, False],
+        reserve=2,
+        num_predictions=225
+    )
+    assert not leaked.any()
+    assert list(horizons) == [0, 0]
+    assert list(owners) == [0, 1]
+    assert list(amounts) == [-1.0, 1.0]
+
+
+def test_game_payments_carryover_and_leakage():
+    horizons, owners, amounts, leaked = SettlementConventions.game_payments(
+        pools=[450, 675],
+        participant_horizons=[0, 0, 1, 1],
+        participant_owners=[0, 1, 0, 1],
+        winner_horizons=[1],
+        winner_owners=[3],
+        carryover=[True, False],
+        reserve=2,
+        num_predictions=225
+    )
+    assert list(leaked) == [False, True]
+    payments = dict(zip(zip(horizons, owners), amounts))
+    assert payments == {(0, 0): -1.0, (0, 1): -1.0, (0, 2): 2.0, (1, 0): 0.0, (1, 1): 0.0}
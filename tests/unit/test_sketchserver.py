@@ -0,0 +1,39 @@
+from predictionserver.servermixins.sketchserver import SketchServer
+import numpy as np
+
+
+def _sketched(values, lag_len=999):
+    server = SketchServer()
+    server.enable_sketches()
+    pipe = server.client.pipeline()
+    for value in values:
+        server._pipe_sketch(pipe=pipe, name='x.json', value=value, lag_len=lag_len, ttl=60)
+    server._pipe_sketch(pipe=pipe, name='x.json', value=None, lag_len=lag_len, ttl=60)
+    assert pipe.execute()[-1] == 0
+    return server
+
+
+def test_sketch_values_match_lagged_values():
+    np.random.seed(3)
+    for values in [np.random.randn(1500), 10 + np.cumsum(np.random.randn(1500))]:
+        server = _sketched(values)
+        sketched = sorted(server.get_sketch_values('x.json'))
+        lagged = sorted(server.cdf_values(list(values[::-1]), num=20))
+        assert len(sketched) == len(lagged)
+        assert np.max(np.abs(np.array(sketched) - np.array(lagged))) < 0.05
+
+
+def test_sketch_generations():
+    server = _sketched(np.random.randn(250), lag_len=99)
+    current = server.client.hgetall(server.sketch_name('x.json'))
+    previous = server.client.hgetall(server.sketch_name('x.json', generation=1))
+    assert int(current['n']) == 50 and int(previous['n']) == 100
+    assert server.get_sketch_values('y.json') is None
+
+
+def test_discrete_sketch_values():
+    levels = [1.0, 2.0, 3.0, 2.0] * 50
+    server = _sketched(levels)
+    assert sorted(server.get_sketch_values('x.json')) == sorted(
+        server.cdf_values(levels[::-1], num=20)
+    )
@@ -0,0 +1,43 @@
+from predictionserver.futureconventions.statsconventions import StatsConventions
+import numpy as np
+
+
+def _monotone_envelope(ys):
+    ys_monotone_1 = list(np.maximum.accumulate(np.array(ys)))
+    ys_monotone_2 = list(np.minimum.accumulate(np.array(list(reversed(ys)))))
+    return [0.5 * (y1 + y2) for y1, y2 in zip(ys_monotone_1, reversed(ys_monotone_2))]
+
+
+def test_monotone_envelopes():
+    np.random.seed(13)
+    ys = np.sort(np.random.rand(6, 12), axis=1) + 0.1 * np.random.randn(6, 12)
+    ys[np.random.rand(6, 12) < 0.3] = np.nan
+    ys[0, :] = np.nan
+    smoothed = StatsConventions.monotone_envelopes(ys)
+    assert smoothed.shape == ys.shape
+    assert np.array_equal(np.isnan(smoothed), np.isnan(ys))
+    for row, smoothed_row in zip(ys, smoothed):
+        valid = ~np.isnan(row)
+        if valid.any():
+            assert np.allclose(smoothed_row[valid], _monotone_envelope(row[valid]))
+            assert all(np.diff(smoothed_row[valid]) >= 0)
+
+
+def test_zmean_percentile_arrays():
+    assert StatsConventions.zmean_percentile([]) == 0.5
+    assert abs(StatsConventions.zmean_percentile([0.2, 0.8]) - 0.5) < 1e-12
+    ps = np.array([0.1, 0.3, 0.6, 0.9, 0.75])
+    assert abs(
+        StatsConventions.zmean_percentile(ps) - StatsConventions.zmean_percentile(list(ps))
+    ) < 1e-12
+
+
+def test_segment_zmean_percentile():
+    segments = [0, 2, 0, 2, 2]
+    ps = [0.1, 0.3, 0.6, 0.9, 0.75]
+    prctls = StatsConventions.segment_zmean_percentile(
+        segments=segments, ps=ps, num_segments=4, default=0.5
+    )
+    assert abs(prctls[0] - StatsConventions.zmean_percentile([0.1, 0.6])) < 1e-12
+    assert abs(prctls[2] - StatsConventions.zmean_percentile([0.3, 0.9, 0.75])) < 1e-12
+    assert prctls[1] == 0.5 and prctls[3] == 0.5
@@ -0,0 +1,246 @@
+from predictionserver.servermixins.streamserver import StreamServer
+from predictionserver.servermixins.subscriptionserver import StandaloneSubscriptionServer
+from redis.client import NEVER_DECODE
+import fakeredis
+import pytest
+import json
+import re
+import time
+
+OWNER = 'e9943640aadaf4970d3b39c735ef708c'
+INTRUDER = 'f206ae48faa09e3b5b5187160be2c815'
+NOW = 1700006415.25
+
+
+def _stream_server(scripted, monkeypatch):
+    monkeypatch.setattr(time, 'time', lambda: NOW)
+    server = StreamServer()
+    server.client = fakeredis.FakeStrictRedis(
+        server=fakeredis.FakeServer(), decode_responses=True
+    )
+    server.set_obscurity('streams_test')
+    server.enable_packed_lags()
+    server.enable_rollups()
+    server.enable_sketches()
+    server.enable_notifications()
+    server.enable_scripted_writes(scripted)
+    server.capabilities = {'scripting': scripted, 'streams': True, 'hset_mapping': True}
+    # Two existing streams, one of them with subscribers
+    server._pipelined_set(
+        names=['die.json', 'coin.json'], values=[3.0, 1.0],
+        write_keys=[OWNER, OWNER], budgets=[1., 1.]
+    )
+    server.client.sadd(server.subscribers_name('die.json'), 'mine.json', 'yours.json')
+    return server
+
+
+def _snapshot(server):
+    """ Every key with its type, contents and ttl, with random copy names hidden """
+    def anonymous(s):
+        return re.sub(server._PROMISED() + '[0-9a-f]{8}', server._PROMISED(), s)
+
+    client = server.client
+    contents = {
+        'string': lambda key: client.execute_command('GET', key, **{NEVER_DECODE: True}),
+        'list': lambda key: client.lrange(key, 0, -1),
+        'set': lambda key: sorted(client.smembers(key)),
+        'hash': client.hgetall,
+        'zset': lambda key: sorted(
+            (anonymous(member), score)
+            for member, score in client.zrange(key, 0, -1, withscores=True)
+        )
+    }
+    return sorted(
+        (anonymous(key), kind, contents[kind](key), client.ttl(key))
+        for key, kind in ((key, client.type(key)) for key in client.keys())
+    )
+
+
+def _write(server, names, values, write_keys):
+    """ Apply a batch and also collect whatever was published meanwhile """
+    pubsub = server.client.pubsub()
+    pubsub.psubscribe(server.notifications_channel('*'))
+    pubsub.get_message(timeout=0.1)
+    log = server._pipelined_set(
+        names=names, values=values, write_keys=write_keys,
+        budgets=[1. for _ in names]
+    )
+    published = list()
+    message = pubsub.get_message(timeout=0.1)
+    while message is not None:
+        published.append((message['channel'], json.loads(message['data'])))
+        message = pubsub.get_message(timeout=0.1)
+    pubsub.close()
+    return log, published
+
+
+@pytest.mark.parametrize('names,values,write_keys', [
+    (['die.json'], [4.0], [OWNER]),
+    (['die.json', 'coin.json'], [5.0, 0.0], [OWNER, INTRUDER]),
+    (['die.json', 'new.json', 'coin.json'], [2.0, 7.5, 1.0], [OWNER, OWNER, OWNER]),
+    (['new.json', 'die.json', 'die.json'], [1.0, 6.0, 2.0], [OWNER, INTRUDER, OWNER])
+])
+def test_scripted_set_existing_matches_pipelined(monkeypatch, names, values, write_keys):
+    scripted = _stream_server(scripted=True, monkeypatch=monkeypatch)
+    pipelined = _stream_server(scripted=False, monkeypatch=monkeypatch)
+    scripted_log, scripted_published = _write(scripted, names, values, write_keys)
+    pipelined_log, pipelined_published = _write(pipelined, names, values, write_keys)
+
+    # Same outcome for each write, in the same order
+    def outcomes(log):
+        executed = sorted((ex['ndx'], ex['name'], ex['new']) for ex in log['executed'])
+        rejected = sorted((rj['ndx'], rj['official_write_key_ends_in'])
+                          for rj in log['rejected'])
+        return executed, rejected
+
+    assert outcomes(scripted_log) == outcomes(pipelined_log)
+    num_rejected = sum(wk == INTRUDER for wk in write_keys)
+    assert len(scripted_log['rejected']) == num_rejected
+
+    # Same values, ttls, lags, rollups, sketches, promise shards, mailboxes and errors
+    assert _snapshot(scripted) == _snapshot(pipelined)
+    assert scripted.get_lagged_values('die.json') == pipelined.get_lagged_values('die.json')
+    assert scripted.client.hgetall(scripted.messages_name('mine.json')) == {
+        'die.json': str(values[max(k for k, name in enumerate(names)
+                                   if name == 'die.json' and write_keys[k] == OWNER)])
+    }
+
+    # Same notifications, though not necessarily in the same order
+    def as_sorted(published):
+        return sorted(json.dumps(p, sort_keys=True) for p in published)
+
+    assert as_sorted(scripted_published) == as_sorted(pipelined_published)
+    assert len(scripted_published) >= len(names) - num_rejected
+
+
+def test_scripted_set_existing_outcomes(monkeypatch):
+    server = _stream_server(scripted=True, monkeypatch=monkeypatch)
+    ndxs = [0, 1, 2, 3]
+    names = ['die.json', 'coin.json', 'new.json', 'doc.json']
+    values = ['4.0', '0.0', '7.5', json.dumps({'not': 'lags'})]
+    write_keys = [OWNER, INTRUDER, OWNER, OWNER]
+    executed, rejected, ignored_ndxs, names, values, write_keys = \
+        server._scripted_set_existing(
+            ndxs=ndxs, names=names, values=values, write_keys=write_keys,
+            budgets=[1., 1., 1., 1.]
+        )
+    # ok
+    assert [(ex['name'], ex['result']) for ex in executed] == [('die.json', 'ok')]
+    assert server.client.get('die.json') == '4.0'
+    assert server.client.get(executed[0]['copy']) == '4.0'
+    # subscribers are left for _propagate_to_subscribers()
+    assert server.client.hget(server.messages_name('yours.json'), 'die.json') is None
+    # rejected, with an error for the intruder
+    assert [(rj['name'], rj['official_write_key_ends_in']) for rj in rejected] == [
+        ('coin.json', OWNER[-4:])
+    ]
+    assert server.client.get('coin.json') == '1.0'
+    errors = server.client.lrange(server.errors_name(write_key=INTRUDER), 0, -1)
+    assert [json.loads(error)['name'] for error in errors] == ['coin.json']
+    # new streams and values that are not lags are left for the pipelined path
+    assert ignored_ndxs == [2, 3]
+    assert names == ['new.json', 'doc.json'] and write_keys == [OWNER, OWNER]
+    assert server.client.get('new.json') is None
+
+
+class _SubscribableStreamServer(StreamServer, StandaloneSubscriptionServer):
+    pass
+
+
+def _server_with_subscribers():
+    server = _SubscribableStreamServer()
+    server.client = fakeredis.FakeStrictRedis(
+        server=fakeredis.FakeServer(), decode_responses=True
+    )
+    server.set_obscurity('fanout_test')
+    server.client.sadd(server.subscribers_name('a.json'), 'm1.json', 'm2.json')
+    server.client.sadd(server.subscribers_name('b.json'), 'm1.json')
+    return server
+
+
+@pytest.mark.parametrize('hset_mapping', [True, False])
+def test_fan_out_one_hset_per_mailbox(hset_mapping):
+    server = _server_with_subscribers()
+    server.capabilities = {'hset_mapping': hset_mapping}
+    executed = server._fan_out(
+        names=['a.json', 'b.json', 'c.json', 'a.json'], values=[1.0, 2.0, 3.0, 4.0]
+    )
+    assert sorted(executed, key=lambda ex: ex['mailbox_name']) == [
+        {'mailbox_name': server.messages_name('m1.json'),
+         'senders': ['a.json', 'b.json'], 'result': 2},
+        {'mailbox_name': server.messages_name('m2.json'),
+         'senders': ['a.json'], 'result': 1}
+    ]
+    assert server.client.hgetall(server.messages_name('m1.json')) == {
+        'a.json': '4.0', 'b.json': '2.0'
+    }
+    assert server.client.hgetall(server.messages_name('m2.json')) == {'a.json': '4.0'}
+    stats = server.get_fanout_stats()
+    assert stats['batches'] == 1 and stats['senders'] == 3
+    assert stats['messages'] == 3 and stats['mailboxes'] == 2
+
+
+def test_lookup_subscribers_through_index():
+    server = _server_with_subscribers()
+    assert server._lookup_subscribers(sources=['a.json', 'c.json']) == {
+        'a.json': {'m1.json', 'm2.json'}, 'c.json': set()
+    }
+    server.enable_subscriber_index(ttl=60.)
+    for _ in range(2):
+        assert server._lookup_subscribers(sources=['a.json', 'b.json']) == {
+            'a.json': {'m1.json', 'm2.json'}, 'b.json': {'m1.json'}
+        }
+    stats = server.get_fanout_stats()
+    assert stats['subscriber_lookups'] == 4
+    assert stats['cache_hits'] == 2 and stats['cache_misses'] == 2
+
+    # Subscriptions made elsewhere go unnoticed until the ttl, those made here do not
+    server.client.sadd(server.subscribers_name('b.json'), 'm4.json')
+    assert server._lookup_subscribers(sources=['b.json'])['b.json'] == {'m1.json'}
+    server._subscribe_implementation(name='m3.json', source='b.json')
+    assert server._lookup_subscribers(sources=['b.json'])['b.json'] == {
+        'm1.json', 'm3.json', 'm4.json'
+    }
+    pipe = server._unsubscribe_pipe(
+        pipe=server.client.pipeline(), name='m1.json', sources=['a.json', 'b.json']
+    )
+    pipe.execute()
+    assert server._lookup_subscribers(sources=['a.json', 'b.json']) == {
+        'a.json': {'m2.json'}, 'b.json': {'m3.json', 'm4.json'}
+    }
+    assert server.get_fanout_stats()['subscriber_lookups'] == 7
+
+
+def test_background_fan_out_failures_are_counted(caplog):
+    server = _server_with_subscribers()
+    server.capabilities = {'hset_mapping': True}
+    server.enable_background_fanout()
+
+    def failing_fan_out(names, values):
+        raise ConnectionError('redis went away')
+
+    assert server._propagate_to_subscribers(names=['a.json'], values=[1.0]) == []
+    server._fan_out = failing_fan_out
+    assert server._propagate_to_subscribers(names=['b.json'], values=[2.0]) == []
+    server.enable_background_fanout(False)
+    stats = server.get_fanout_stats()
+    assert stats['batches'] == 1 and stats['failures'] == 1
+    assert 'redis went away' in caplog.text
+    assert server.client.hgetall(server.messages_name('m1.json')) == {'a.json': '1.0'}
+
+
+def test_scripted_writes_fan_out_through_the_index(monkeypatch):
+    server = _stream_server(scripted=True, monkeypatch=monkeypatch)
+    server.enable_subscriber_index(ttl=60.)
+    before = server.get_fanout_stats()
+    for value in [4.0, 5.0]:
+        log = server._pipelined_set(
+            names=['die.json'], values=[value], write_keys=[OWNER], budgets=[1.]
+        )
+        assert [ex['result'] for ex in log['executed']] == ['ok']
+    assert server.client.hgetall(server.messages_name('mine.json')) == {'die.json': '5.0'}
+    stats = server.get_fanout_stats()
+    assert stats['batches'] - before['batches'] == 2
+    assert stats['mailboxes'] - before['mailboxes'] == 4
+    assert stats['subscriber_lookups'] - before['subscriber_lookups'] == 1
+    assert stats['cache_hits'] == 1
@@ -0,0 +1,55 @@
+from predictionserver.utilities.subscriberindex import SubscriberIndex
+import threading
+import time
+
+
+def test_lookup_expiry_and_invalidation():
+    index = SubscriberIndex(ttl=0.05, max_sources=2)
+    index.put(source='a.json', subscribers=['x.json', 'y.json'])
+    found, missing = index.lookup(sources=['a.json', 'b.json'])
+    assert found == {'a.json': {'x.json', 'y.json'}} and missing == ['b.json']
+    index.put(source='b.json', subscribers=[])
+    index.lookup(sources=['a.json'])
+    index.put(source='c.json', subscribers=['z.json'])
+    assert len(index) == 2 and index.lookup(sources=['b.json'])[1] == ['b.json']
+    index.invalidate(sources=['c.json'])
+    assert index.lookup(sources=['c.json'])[1] == ['c.json']
+    time.sleep(0.06)
+    assert index.lookup(sources=['a.json'])[1] == ['a.json']
+    assert index.hits == 2 and index.misses == 4
+
+
+def test_put_skipped_after_invalidation():
+    index = SubscriberIndex(ttl=60.)
+    generation = index.generation
+    index.invalidate(sources=['a.json'])  # e.g. a subscription made during the read
+    index.put(source='a.json', subscribers=['x.json'], generation=generation)
+    assert index.lookup(sources=['a.json'])[1] == ['a.json']
+    index.put(source='a.json', subscribers=['x.json', 'y.json'],
+              generation=index.generation)
+    assert index.lookup(sources=['a.json'])[0] == {'a.json': {'x.json', 'y.json'}}
+
+
+def test_shared_between_threads():
+    index = SubscriberIndex(ttl=60., max_sources=20)
+    sources = [str(k) + '.json' for k in range(50)]
+    errors = list()
+
+    def churn(offset):
+        try:
+            for k in range(2000):
+                source = sources[(offset + k) % len(sources)]
+                generation = index.generation
+                if index.lookup(sources=[source])[1]:
+                    index.put(source=source, subscribers=['m.json'], generation=generation)
+                if k % 50 == 0:
+                    index.invalidate(sources=[source])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=churn, args=(7 * n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [] and len(index) <= 20